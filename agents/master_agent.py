@@ -1,6 +1,6 @@
-import google.generativeai as genai
-import os
+import logging
 import re
+import time
 from dotenv import load_dotenv
 
 from models.schemas import (
@@ -14,9 +14,26 @@ from agents.sales_agent import SalesAgent
 from agents.verification_agent import VerificationAgent
 from agents.underwriting_agent import UnderwritingAgent
 from agents.sanction_agent import SanctionAgent
+from services.llm import gemini_model
+from services.audit_log import decision_log
+from services.conversation_state import ConversationCompactor, record_turn
+from services.metrics import AGENT_LATENCY, AGENT_REQUESTS
+from services.tracing import span
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Compiled once at import (and exercised by the startup warmup), not per message
+PHONE_RE = re.compile(r"\b\d{10}\b")
+AMOUNT_PATTERNS = [
+    re.compile(r"(\d+(?:\.\d+)?)\s*(lakh|lac)"),
+    re.compile(r"₹\s*(\d+(?:,\d{3})+)"),
+    re.compile(r"rs\.?\s*(\d+(?:,\d{3})+)"),
+    re.compile(r"(\d+(?:\.\d+)?)\s*(k|thousand)"),
+]
+TENURE_RE = re.compile(r"(\d+)\s*(year|month)")
+
 
 class MasterAgent:
     """
@@ -30,18 +47,15 @@ class MasterAgent:
     """
 
     def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel("gemini-pro")
-        else:
-            self.model = None
-            print("⚠️ Gemini API key not found — running deterministic routing only")
+        self.model = gemini_model()  # None without GEMINI_API_KEY; genai is then never imported
+        if self.model is None:
+            logger.warning("Gemini API key not found — running deterministic routing only")
 
         self.sales_agent = SalesAgent()
         self.verification_agent = VerificationAgent()
         self.underwriting_agent = UnderwritingAgent()
         self.sanction_agent = SanctionAgent()
+        self.compactor = ConversationCompactor(llm_model=self.model)
 
     # ------------------------------------------------------------------
     # ROUTING LOGIC (CRITICAL FIX)
@@ -81,7 +95,7 @@ class MasterAgent:
             return AgentType.UNDERWRITING
 
         # 2️⃣ PHONE NUMBER → VERIFICATION
-        if re.search(r"\b\d{10}\b", msg):
+        if PHONE_RE.search(msg):
             return AgentType.VERIFICATION
 
         if any(k in msg for k in ["phone", "number", "verify"]):
@@ -119,15 +133,8 @@ class MasterAgent:
 
         # ---------------- AMOUNT ----------------
         if intent.amount is None:
-            patterns = [
-                r"(\d+(?:\.\d+)?)\s*(lakh|lac)",
-                r"₹\s*(\d+(?:,\d{3})+)",
-                r"rs\.?\s*(\d+(?:,\d{3})+)",
-                r"(\d+(?:\.\d+)?)\s*(k|thousand)",
-            ]
-
-            for p in patterns:
-                m = re.search(p, msg)
+            for p in AMOUNT_PATTERNS:
+                m = p.search(msg)
                 if not m:
                     continue
 
@@ -145,7 +152,7 @@ class MasterAgent:
 
         # ---------------- TENURE ----------------
         if intent.tenure is None:
-            m = re.search(r"(\d+)\s*(year|month)", msg)
+            m = TENURE_RE.search(msg)
             if m:
                 t = int(m.group(1))
                 intent.tenure = t * 12 if "year" in m.group(2) else t
@@ -172,6 +179,65 @@ class MasterAgent:
 
         return intent
 
+    # ------------------------------------------------------------------
+    # DECISION AUDIT
+    # ------------------------------------------------------------------
+    AUDITED_AGENTS = {
+        AgentType.VERIFICATION,
+        AgentType.UNDERWRITING,
+        AgentType.SANCTION,
+    }
+
+    def _record_decision(
+        self, agent: AgentType, request: AgentRequest, response: AgentResponse, latency_ms: float
+    ) -> None:
+        """
+        Enqueue an audit entry for a decision-making agent.
+        Write-behind: this never waits on the database.
+        """
+        metadata = response.metadata or {}
+        result_context = response.context or {}
+
+        if agent == AgentType.VERIFICATION:
+            outcome = {
+                "customer_id": result_context.get("customer_id"),
+                "customer_verified": metadata.get("customer_verified"),
+            }
+        elif agent == AgentType.UNDERWRITING:
+            outcome = {
+                "decision": metadata.get("decision"),
+                "reason": result_context.get("underwriting_result", {}).get("reason"),
+                "credit_score": metadata.get("credit_score"),
+                "preapproved_limit": metadata.get("preapproved_limit"),
+                "salary": metadata.get("salary"),
+                "salary_slip_verified": bool(result_context.get("salary_slip_verified")),
+                "verified_salary": result_context.get("verified_salary"),
+                "interest_rate": metadata.get("interest_rate"),
+                "emi": metadata.get("emi"),
+                "rule": metadata.get("rule"),
+                "rule_trace": metadata.get("rule_trace"),
+                "rules_version": metadata.get("rules_version"),
+                "decision_cached": metadata.get("decision_cached"),
+            }
+        else:
+            outcome = {
+                "reference_number": metadata.get("reference_number"),
+                "pdf_generated": metadata.get("pdf_generated"),
+            }
+        outcome["next_agent"] = response.next_agent.value if response.next_agent else None
+
+        decision_log.record(
+            agent=agent.value,
+            session_id=request.session_id,
+            inputs={
+                "message": request.message,
+                "customer_id": request.context.get("customer_id"),
+                "loan_intent": request.loan_intent.model_dump() if request.loan_intent else None,
+            },
+            outcome=outcome,
+            latency_ms=latency_ms,
+        )
+
     # ------------------------------------------------------------------
     # MAIN ORCHESTRATION
     # ------------------------------------------------------------------
@@ -181,32 +247,38 @@ class MasterAgent:
         """
 
         try:
-            context = request.context.copy() if request.context else {}
+            # Enforce the context budget on whatever the client sent back
+            context = self.compactor.compact(request.context.copy() if request.context else {})
 
             # Extract & persist intent
-            loan_intent = self.extract_loan_intent(
-                request.message, request.loan_intent
-            )
+            with span("master.extract_loan_intent"):
+                loan_intent = self.extract_loan_intent(
+                    request.message, request.loan_intent
+                )
 
             if loan_intent.amount:
-                context["loan_intent"] = loan_intent.dict()
+                context["loan_intent"] = loan_intent.model_dump()
 
             # Decide agent
-            next_agent = self.determine_next_agent(
-                request.message, context, loan_intent
+            with span("master.determine_next_agent") as routing_span:
+                next_agent = self.determine_next_agent(
+                    request.message, context, loan_intent
+                )
+                if routing_span:
+                    routing_span.set_attribute("next_agent", next_agent.value)
+
+            logger.debug(
+                "master agent routed",
+                extra={
+                    "next_agent": next_agent.value,
+                    "customer_id": context.get("customer_id"),
+                    "loan_amount": loan_intent.amount,
+                    "loan_tenure": loan_intent.tenure,
+                },
             )
 
-            # Debug
-            print("\n" + "=" * 70)
-            print("🧠 MASTER AGENT")
-            print(f"Message: {request.message}")
-            print(f"Next Agent: {next_agent}")
-            print(f"Customer ID: {context.get('customer_id')}")
-            print(f"Loan Intent: {loan_intent}")
-            print("=" * 70 + "\n")
-
-            # Build downstream request
-            agent_request = AgentRequest(
+            # Build downstream request from already-validated parts; no re-validation
+            agent_request = AgentRequest.model_construct(
                 message=request.message,
                 session_id=request.session_id,
                 customer_info=request.customer_info,
@@ -215,22 +287,32 @@ class MasterAgent:
             )
 
             # Route
-            if next_agent == AgentType.SALES:
-                response = self.sales_agent.process(agent_request)
-            elif next_agent == AgentType.VERIFICATION:
-                response = self.verification_agent.process(agent_request)
-            elif next_agent == AgentType.UNDERWRITING:
-                response = self.underwriting_agent.process(agent_request)
-            elif next_agent == AgentType.SANCTION:
-                response = self.sanction_agent.process(agent_request)
-            else:
-                response = self.sales_agent.process(agent_request)
+            started = time.perf_counter()
+            with span(f"{next_agent.value}.process"):
+                if next_agent == AgentType.SALES:
+                    response = self.sales_agent.process(agent_request)
+                elif next_agent == AgentType.VERIFICATION:
+                    response = self.verification_agent.process(agent_request)
+                elif next_agent == AgentType.UNDERWRITING:
+                    response = self.underwriting_agent.process(agent_request)
+                elif next_agent == AgentType.SANCTION:
+                    response = self.sanction_agent.process(agent_request)
+                else:
+                    response = self.sales_agent.process(agent_request)
+            latency_ms = (time.perf_counter() - started) * 1000
+            AGENT_REQUESTS.labels(next_agent.value).inc()
+            AGENT_LATENCY.labels(next_agent.value).observe(latency_ms / 1000)
+
+            if next_agent in self.AUDITED_AGENTS:
+                self._record_decision(next_agent, agent_request, response, latency_ms)
 
             # Merge context safely
             if response.context:
                 context.update(response.context)
 
             context["current_agent"] = next_agent.value
+            record_turn(context, request.message, next_agent.value, response.message)
+            self.compactor.compact(context)
 
             response.context = context
             response.loan_intent = loan_intent
@@ -239,10 +321,7 @@ class MasterAgent:
             return response
 
         except Exception as e:
-            print("❌ MASTER AGENT ERROR:", e)
-            import traceback
-
-            traceback.print_exc()
+            logger.exception("Master agent error")
 
             return AgentResponse(
                 message=(
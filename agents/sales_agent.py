@@ -1,21 +1,23 @@
-import google.generativeai as genai
-import os
+import logging
 from dotenv import load_dotenv
 from models.schemas import AgentRequest, AgentResponse, AgentType
+from services.llm import gemini_model
 from services.database import db
+from services.metrics import DB_LATENCY, LLM_LATENCY
+from services.tracing import span
 import re
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+PHONE_RE = re.compile(r"\b\d{10}\b")
+
 class SalesAgent:
     def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-        else:
-            self.model = None
-            print("⚠️ Gemini API key not found")
+        self.model = gemini_model()
+        if self.model is None:
+            logger.warning("Gemini API key not found")
         
         self.system_prompt = """You are a persuasive loan sales agent for Tata Capital. Your role is to:
         1. Understand the customer's loan needs
@@ -36,7 +38,8 @@ class SalesAgent:
         customer = None
         
         if request.customer_info and request.customer_info.phone:
-            customer = customers_col.find_one({"phone": request.customer_info.phone})
+            with DB_LATENCY.labels("customers").time(), span("db.find_one", collection="customers"):
+                customer = customers_col.find_one({"phone": request.customer_info.phone})
         
         context = request.context.copy()
         context["agent"] = "sales"
@@ -87,14 +90,15 @@ Respond as the sales agent. Be helpful and guide them towards verification."""
         try:
             # Call Gemini API
             if self.model:
-                response = self.model.generate_content(prompt)
+                with LLM_LATENCY.labels("sales").time(), span("llm.generate_content", agent="sales"):
+                    response = self.model.generate_content(prompt)
                 ai_response = response.text
             else:
                 # Fallback response
                 ai_response = self._get_fallback_response(request, loan_amount, tenure, purpose)
             
         except Exception as e:
-            print(f"Gemini API Error: {e}")
+            logger.warning("Gemini API error: %s", e)
             ai_response = self._get_fallback_response(request, loan_amount, tenure, purpose)
         
         # ENHANCED: Add confirmation if loan amount is captured
@@ -119,13 +123,13 @@ Respond as the sales agent. Be helpful and guide them towards verification."""
         message_lower = request.message.lower()
         
         # Extract phone if mentioned
-        phone_match = re.search(r'\b\d{10}\b', request.message)
+        phone_match = PHONE_RE.search(request.message)
         if phone_match:
             proceed_to_verification = True
         elif customer or any(word in message_lower for word in ["phone", "number", "verify", "987"]):
             proceed_to_verification = True
         
-        return AgentResponse(
+        return AgentResponse.model_construct(
             message=ai_response,
             next_agent=AgentType.VERIFICATION if proceed_to_verification else AgentType.SALES,
             customer_info=request.customer_info,
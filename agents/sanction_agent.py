@@ -1,22 +1,23 @@
-import google.generativeai as genai
-import os
+import logging
 from dotenv import load_dotenv
 from models.schemas import AgentRequest, AgentResponse, AgentType, SanctionLetter
+from services.llm import gemini_model
 from services.pdf_generator import generate_sanction_letter_pdf
+from services.message_templates import messages
+from services.metrics import PDF_RENDER_LATENCY
+from services.tracing import span
 import uuid
 from datetime import datetime, timedelta
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class SanctionAgent:
     def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-        else:
-            self.model = None
-            print("⚠️ Gemini API key not found")
+        self.model = gemini_model()
+        if self.model is None:
+            logger.warning("Gemini API key not found")
     
     def process(self, request: AgentRequest) -> AgentResponse:
         context = request.context.copy()
@@ -38,13 +39,13 @@ class SanctionAgent:
         # Generate unique reference number
         reference_number = f"TCL/{datetime.now().strftime('%Y%m')}/{str(uuid.uuid4())[:8].upper()}"
         
-        # Generate sanction letter
-        sanction_letter = SanctionLetter(
+        # Generate sanction letter (trusted values; coerce types instead of validating)
+        sanction_letter = SanctionLetter.model_construct(
             customer_name=customer_name,
-            loan_amount=loan_amount,
-            tenure=tenure,
-            interest_rate=interest_rate,
-            emi=emi,
+            loan_amount=float(loan_amount),
+            tenure=int(tenure),
+            interest_rate=float(interest_rate),
+            emi=float(emi),
             sanction_date=datetime.now().strftime("%d-%m-%Y"),
             validity_date=(datetime.now() + timedelta(days=30)).strftime("%d-%m-%Y"),
             reference_number=reference_number
@@ -52,57 +53,38 @@ class SanctionAgent:
         
         # Generate PDF
         try:
-            pdf_path = generate_sanction_letter_pdf(sanction_letter)
+            with PDF_RENDER_LATENCY.time(), span("pdf.render"):
+                pdf_path = generate_sanction_letter_pdf(sanction_letter)
             pdf_generated = True
-            print(f"   📄 PDF generated at: {pdf_path}")
+            logger.info("Sanction letter PDF generated", extra={"pdf_path": pdf_path})
         except Exception as e:
-            print(f"Error generating PDF: {e}")
+            logger.exception("Error generating PDF")
             pdf_path = None
             pdf_generated = False
         
-        context["sanction_letter"] = sanction_letter.dict()
+        context["sanction_letter"] = sanction_letter.model_dump()
         if pdf_path:
             context["pdf_path"] = pdf_path
         
         # Create response message
-        message = f"📜 **SANCTION LETTER GENERATED!**\n\n"
-        message += f"Dear **{customer_name}**,\n\n"
-        message += f"🎉 Congratulations! Your loan has been officially sanctioned.\n\n"
-        
-        message += f"**📋 Sanction Details:**\n"
-        message += f"• **Reference No:** {sanction_letter.reference_number}\n"
-        message += f"• **Loan Amount:** ₹{loan_amount:,}\n"
-        message += f"• **EMI:** ₹{emi:,} per month\n"
-        message += f"• **Tenure:** {tenure} months ({tenure//12} years)\n"
-        message += f"• **Interest Rate:** {interest_rate}% per annum\n"
-        message += f"• **Sanction Date:** {sanction_letter.sanction_date}\n"
-        message += f"• **Valid Until:** {sanction_letter.validity_date}\n\n"
-        
-        if pdf_generated:
-            message += f"✅ Your official sanction letter PDF is ready for download!\n\n"
-        else:
-            message += f"⚠️ PDF generation in progress. You can download it shortly.\n\n"
-        
-        message += f"**📝 Next Steps:**\n"
-        message += f"1. Download and review the sanction letter\n"
-        message += f"2. E-sign the loan agreement document\n"
-        message += f"3. Submit any pending documents (if required)\n"
-        message += f"4. Loan amount will be disbursed within 24-48 hours\n\n"
-        
-        message += f"**💰 Disbursement Details:**\n"
-        message += f"• Total Amount: ₹{loan_amount:,}\n"
-        message += f"• Processing Fee: ₹{loan_amount * 0.015:,.2f} (1.5%)\n"
-        message += f"• Net Disbursement: ₹{loan_amount * 0.985:,.2f}\n\n"
-        
-        message += f"**📞 Need Help?**\n"
-        message += f"Contact our customer support:\n"
-        message += f"• Phone: 1800-209-8800\n"
-        message += f"• Email: support@tatacapital.com\n\n"
-        
-        message += f"Thank you for choosing **Tata Capital**! 🏦\n"
-        message += f"We're here to support your financial journey. 💙"
+        locale = context.get("locale")
+        message = messages.render(
+            "sanction.generated", locale,
+            customer_name=customer_name,
+            reference_number=sanction_letter.reference_number,
+            loan_amount=loan_amount,
+            emi=emi,
+            tenure=tenure,
+            tenure_years=tenure // 12,
+            interest_rate=interest_rate,
+            sanction_date=sanction_letter.sanction_date,
+            validity_date=sanction_letter.validity_date,
+            pdf_status=messages.render("sanction.pdf_ready" if pdf_generated else "sanction.pdf_pending", locale),
+            processing_fee=loan_amount * 0.015,
+            net_disbursement=loan_amount * 0.985,
+        )
         
-        return AgentResponse(
+        return AgentResponse.model_construct(
             message=message,
             next_agent=None,  # End of flow
             customer_info=request.customer_info,
@@ -110,7 +92,7 @@ class SanctionAgent:
             context=context,
             metadata={
                 "agent": "sanction",
-                "sanction_letter": sanction_letter.dict(),
+                "sanction_letter": context["sanction_letter"],
                 "pdf_path": pdf_path,
                 "reference_number": reference_number,
                 "pdf_generated": pdf_generated
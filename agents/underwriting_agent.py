@@ -1,21 +1,28 @@
-import google.generativeai as genai
-import os
+import logging
 from dotenv import load_dotenv
 from models.schemas import AgentRequest, AgentResponse, AgentType, UnderwritingResult
-from services.database import db
+from services.llm import gemini_model
+from services.decision_cache import decision_cache
+from services.message_templates import messages
+from services.metrics import UNDERWRITING_DECISIONS
+from services.offer_book import offer_book
+from services.tracing import span
+from services.underwriting_rules import emi_array, underwriting_rules
 import math
+import os
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+WHATIF_AMOUNT_STEP = float(os.getenv("WHATIF_AMOUNT_STEP", "25000"))
+WHATIF_MAX_AMOUNTS = int(os.getenv("WHATIF_MAX_AMOUNTS", "60"))
+
 class UnderwritingAgent:
     def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-        else:
-            self.model = None
-            print("⚠️ Gemini API key not found")
+        self.model = gemini_model()
+        if self.model is None:
+            logger.warning("Gemini API key not found")
     
     def calculate_emi(self, principal, annual_rate, months):
         """Calculate EMI using standard formula"""
@@ -25,15 +32,26 @@ class UnderwritingAgent:
         emi = principal * monthly_rate * (1 + monthly_rate) ** months / ((1 + monthly_rate) ** months - 1)
         return round(emi, 2)
     
+    def _customer_terms(self, customer_id, rules):
+        """Score, limit, salary, rate and tenure options from the offer book; None if the customer is unknown"""
+        row = offer_book.get(customer_id, rules)
+        if row is None:
+            return None
+        return {
+            "credit_score": row["credit_score"],
+            "preapproved_limit": row["preapproved_limit"],
+            "salary": row["salary"],
+            "interest_rate": row["interest_rate"],
+            "tenure_options": row["tenure_options"],
+        }
+    
     def process(self, request: AgentRequest) -> AgentResponse:
         context = request.context.copy()
         context["agent"] = "underwriting"
         
-        # ADD DEBUG LOGS
-        print(f"\n📊 UNDERWRITING AGENT STARTED:")
-        print(f"   Message: '{request.message}'")
-        print(f"   Customer ID from context: {context.get('customer_id')}")
-        print(f"   Context keys: {list(context.keys())}")
+        # One policy version for the whole turn, even if the rules file is reloaded meanwhile
+        rules = underwriting_rules.current()
+        defaults = rules.defaults
         
         # Get customer_id
         customer_id = context.get("customer_id")
@@ -42,238 +60,179 @@ class UnderwritingAgent:
             customer_id = context.get("verification_result", {}).get("customer_id")
             if customer_id:
                 context["customer_id"] = customer_id
-                print(f"   ℹ️ Recovered customer_id: {customer_id}")
+                logger.debug("Recovered customer_id from verification_result", extra={"customer_id": customer_id})
         
         # Get loan details
         loan_amount = request.loan_intent.amount if request.loan_intent and request.loan_intent.amount else None
-        tenure = request.loan_intent.tenure if request.loan_intent and request.loan_intent.tenure else 24
+        tenure = request.loan_intent.tenure if request.loan_intent and request.loan_intent.tenure else defaults["tenure"]
         purpose = request.loan_intent.purpose if request.loan_intent and request.loan_intent.purpose else None
         
         # Check requirements
         if not customer_id:
-            print("   ❌ ERROR: No customer_id")
-            return AgentResponse(
-                message="🔐 **Customer ID Required**\n\nPlease verify your phone number first.",
+            logger.info("Underwriting requested without customer_id")
+            return AgentResponse.model_construct(
+                message=messages.render("underwriting.customer_id_required", context.get("locale")),
                 next_agent=AgentType.VERIFICATION,
                 context=context
             )
         
         if not loan_amount:
-            print("   ❌ ERROR: No loan amount")
-            return AgentResponse(
-                message="💰 **Loan Amount Required**\n\nPlease specify the loan amount.",
+            logger.info("Underwriting requested without loan amount", extra={"customer_id": customer_id})
+            return AgentResponse.model_construct(
+                message=messages.render("underwriting.amount_required", context.get("locale")),
                 next_agent=AgentType.SALES,
                 context=context
             )
         
-        print(f"   ✅ Processing: customer_id={customer_id}, loan=₹{loan_amount:,}, tenure={tenure}")
+        # Fetch customer data (a decision is only memoized if the profile didn't change meanwhile)
+        decision_token = decision_cache.token()
+        terms = self._customer_terms(customer_id, rules)
         
-        # Fetch customer data
-        customers_col = db.get_collection("customers")
-        customer = customers_col.find_one({"customer_id": customer_id})
-        
-        if not customer:
-            print(f"   ❌ ERROR: Customer {customer_id} not found")
-            return AgentResponse(
-                message="❌ **Customer Not Found**",
+        if terms is None:
+            logger.warning("Customer not found for underwriting", extra={"customer_id": customer_id})
+            return AgentResponse.model_construct(
+                message=messages.render("underwriting.customer_not_found", context.get("locale")),
                 next_agent=AgentType.VERIFICATION,
                 context=context
             )
         
-        # Get customer data
-        credit_score = customer.get("credit_score", 700)
-        preapproved_limit = customer.get("preapproved_limit", 100000)
-        salary = customer.get("salary", 50000)
-        
-        print(f"   📊 Customer Data: score={credit_score}, limit=₹{preapproved_limit:,}, salary=₹{salary:,}")
-        
-        # Get interest rate from offers
-        interest_rate = 14.0
-        offers_col = db.get_collection("offers")
-        offer = offers_col.find_one({"customer_id": customer_id})
-        if offer:
-            interest_rate = offer.get("interest_rate", 14.0)
-            print(f"   💡 Custom interest rate: {interest_rate}%")
-        
-        # UNDERWRITING RULES - CORRECT ORDER FOR ALL TESTS
-        decision = ""
-        reason = ""
-        conditions = []
-        
-        print(f"   📈 Rule Check: Loan ₹{loan_amount:,} vs Limit ₹{preapproved_limit:,} (2x: ₹{2*preapproved_limit:,})")
+        credit_score = terms["credit_score"]
+        preapproved_limit = terms["preapproved_limit"]
+        salary = terms["salary"]
+        interest_rate = terms["interest_rate"]
         
         # Check for salary slip keywords in message
         message_lower = request.message.lower()
-        has_salary_keywords = any(word in message_lower for word in ["uploaded", "salary slip", "salary", "75,000", "75000", "75k", "75 thousand", "upload"])
+        has_salary_keywords = any(word in message_lower for word in rules.salary_slip_keywords)
         
         if has_salary_keywords and "salary_slip_verified" not in context:
-            print(f"   📄 Auto-detected salary slip in message")
+            logger.debug("Auto-detected salary slip in message")
             context["salary_slip_verified"] = True
             context["verified_salary"] = salary
         
-        # CRITICAL FIX: CORRECT RULE ORDER FOR ALL TESTS
-        # Rule 4: More than 2x limit - TEST 5 (Rahul ₹12L > ₹10L)
-        if loan_amount > 2 * preapproved_limit:
-            decision = "rejected"
-            reason = f"Loan amount ₹{loan_amount:,} exceeds 2x pre-approved limit of ₹{2*preapproved_limit:,}"
-            print(f"   ❌ REJECTED: Loan > 2x limit (Rule 4)")
+        # UNDERWRITING RULES - declared in rules/underwriting.json, first match decides
+        verified_salary = context.get("verified_salary", salary)
+        salary_slip_verified = bool(context.get("salary_slip_verified"))
+        decision_key = (customer_id, loan_amount, tenure, interest_rate, salary_slip_verified, verified_salary,
+                        rules.version)
+        outcome = decision_cache.get(decision_key)
+        decision_cached = outcome is not None
+        if not decision_cached:
+            with span("underwriting.rules", rules_version=rules.version):
+                outcome = rules.evaluate(
+                    loan_amount=loan_amount,
+                    tenure=tenure,
+                    credit_score=credit_score,
+                    preapproved_limit=preapproved_limit,
+                    salary=salary,
+                    verified_salary=verified_salary,
+                    salary_slip_verified=salary_slip_verified,
+                    interest_rate=interest_rate,
+                    emi=self.calculate_emi(loan_amount, interest_rate, tenure),
+                )
+            decision_cache.put(decision_key, outcome, decision_token)
+        decision = outcome.decision
+        reason = outcome.reason
+        conditions = outcome.conditions
+        rule = outcome.rule
+        min_credit_score = outcome.values.get("min_credit_score", 700)
+        max_eligible = outcome.values.get("max_eligible", 2 * preapproved_limit)
         
-        # Rule 2: Within pre-approved limit - TEST 1 (Rahul ₹3L ≤ ₹5L), TEST 4 (Rahul ₹5L = ₹5L)
-        elif loan_amount <= preapproved_limit:
-            # Credit check only for within-limit approvals
-            if credit_score < 700:
-                decision = "rejected"
-                reason = f"Credit score {credit_score} is below minimum requirement of 700"
-                print(f"   ❌ REJECTED: Score {credit_score} < 700 (Rule 1)")
-            else:
-                decision = "approved"
-                reason = f"Loan amount within pre-approved limit of ₹{preapproved_limit:,}"
-                print(f"   ✅ APPROVED: Within limit (Rule 2)")
-        
-        # Rule 3: Up to 2x limit with salary slip - TEST 2 (Amit ₹3.5L ≤ ₹4L)
-        elif loan_amount <= 2 * preapproved_limit:
-            # Check if salary slip is verified
-            if context.get("salary_slip_verified"):
-                verified_salary = context.get("verified_salary", salary)
-                emi = self.calculate_emi(loan_amount, interest_rate, tenure)
-                
-                print(f"   📄 Salary verified: ₹{verified_salary:,}")
-                print(f"   🧮 EMI: ₹{emi:,} vs 50% salary: ₹{verified_salary * 0.5:,}")
-                
-                if emi <= 0.5 * verified_salary:
-                    decision = "approved"
-                    reason = f"Loan approved with salary slip. EMI ₹{emi:,} is ≤ 50% of salary ₹{verified_salary:,}"
-                    print(f"   ✅ APPROVED: EMI ≤ 50% salary (Rule 3)")
-                else:
-                    decision = "rejected"
-                    reason = f"EMI ₹{emi:,} exceeds 50% of salary ₹{verified_salary:,}"
-                    print(f"   ❌ REJECTED: EMI > 50% salary (Rule 3)")
-            else:
-                decision = "pending"
-                reason = f"Loan amount ₹{loan_amount:,} exceeds pre-approved limit ₹{preapproved_limit:,}. Please upload salary slip for verification."
-                conditions = ["Salary slip required"]
-                print(f"   ⏳ PENDING: Need salary slip (Rule 3)")
-        
-        # Rule 1: Credit score check for other cases - TEST 3 (Vikram ₹1L)
-        else:
-            if credit_score < 700:
-                decision = "rejected"
-                reason = f"Credit score {credit_score} is below minimum requirement of 700"
-                print(f"   ❌ REJECTED: Score {credit_score} < 700 (Rule 1)")
-            else:
-                # This shouldn't happen with above logic
-                decision = "pending"
-                reason = "Additional review required"
-                print(f"   ⚠️  Unexpected case")
+        UNDERWRITING_DECISIONS.labels(decision).inc()
         
         # Calculate EMI if approved
         emi_value = None
         if decision == "approved":
-            emi_value = self.calculate_emi(loan_amount, interest_rate, tenure)
+            emi_value = outcome.values["emi"]
             context["emi"] = emi_value
             context["approved_amount"] = loan_amount
             context["tenure"] = tenure
             context["interest_rate"] = interest_rate
         
         # Store result
-        underwriting_result = UnderwritingResult(
+        underwriting_result = UnderwritingResult.model_construct(
             decision=decision,
-            max_eligible_amount=min(loan_amount, 2 * preapproved_limit) if decision != "rejected" else preapproved_limit,
+            max_eligible_amount=float(min(loan_amount, max_eligible) if decision != "rejected" else preapproved_limit),
             emi=emi_value,
             reason=reason,
             conditions=conditions
         )
         
-        context["underwriting_result"] = underwriting_result.dict()
+        context["underwriting_result"] = underwriting_result.model_dump()
         
-        print(f"   📋 Final Decision: {decision}")
-        print(f"   📝 Reason: {reason}")
+        logger.debug(
+            "underwriting decision",
+            extra={
+                "customer_id": customer_id,
+                "decision": decision,
+                "rule": rule,
+                "rule_trace": outcome.trace,
+                "rules_version": outcome.version,
+                "decision_cached": decision_cached,
+                "loan_amount": loan_amount,
+                "tenure": tenure,
+                "credit_score": credit_score,
+                "preapproved_limit": preapproved_limit,
+                "salary": salary,
+                "interest_rate": interest_rate,
+            },
+        )
         
         # Generate response based on decision
+        locale = context.get("locale")
         if decision == "approved":
-            message = f"🎉 **LOAN APPROVED!**\n\n"
-            message += f"**📋 Loan Details:**\n"
-            message += f"• Amount: ₹{loan_amount:,}\n"
-            message += f"• Tenure: {tenure} months\n"
-            message += f"• Interest Rate: {interest_rate}% p.a.\n"
-            if emi_value:
-                message += f"• EMI: ₹{emi_value:,}/month\n"
-                message += f"• Total Payable: ₹{emi_value * tenure:,}\n"
-            message += f"\n**📊 Credit Assessment:**\n"
-            message += f"• Credit Score: {credit_score}/900 {'✅' if credit_score >= 750 else '⚠️'}\n"
-            message += f"• Pre-approved Limit: ₹{preapproved_limit:,}\n"
-            message += f"• Your Custom Rate: {interest_rate}% p.a.\n\n"
-            message += f"**📝 Approval Summary:**\n"
-            message += f"{reason}\n\n"
-            
-            if "salary slip" in reason.lower():
-                message += f"✅ **Salary slip verified:** ₹{context.get('verified_salary', salary):,}/month\n"
-                message += f"✅ **EMI Check:** EMI ₹{emi_value:,} ≤ 50% of salary\n\n"
-            
-            message += "**Would you like me to generate your sanction letter?** 📜\n"
-            message += "_(Just say 'yes' or 'generate sanction letter')_"
+            message = messages.render(
+                "underwriting.approved", locale,
+                loan_amount=loan_amount,
+                tenure=tenure,
+                interest_rate=interest_rate,
+                emi_lines=messages.render(
+                    "underwriting.approved.emi", locale, emi=emi_value, total_payable=emi_value * tenure
+                ) if emi_value else "",
+                credit_score=credit_score,
+                score_badge="✅" if credit_score >= 750 else "⚠️",
+                preapproved_limit=preapproved_limit,
+                reason=reason,
+                salary_slip_lines=messages.render(
+                    "underwriting.approved.salary_slip", locale,
+                    verified_salary=context.get("verified_salary", salary), emi=emi_value
+                ) if "salary slip" in reason.lower() else "",
+            )
             next_agent = AgentType.SANCTION
         
         elif decision == "pending":
             # Calculate potential EMI for the message
-            potential_emi = self.calculate_emi(loan_amount, interest_rate, tenure)
-            
-            message = f"📄 **Additional Documentation Required**\n\n"
-            message += f"Your loan request for **₹{loan_amount:,}** needs verification.\n\n"
-            message += f"**Status:** {reason}\n\n"
-            message += f"**📊 Current Assessment:**\n"
-            message += f"• Requested Amount: ₹{loan_amount:,}\n"
-            message += f"• Pre-approved Limit: ₹{preapproved_limit:,}\n"
-            message += f"• Maximum Eligible: ₹{2 * preapproved_limit:,} (with salary proof)\n"
-            message += f"• Your Salary: ₹{salary:,}/month\n"
-            message += f"• Potential EMI: ₹{potential_emi:,}/month\n\n"
+            potential_emi = outcome.values["emi"]
             
-            message += f"**📈 EMI vs Salary Check:**\n"
-            message += f"EMI (₹{potential_emi:,}) must be ≤ 50% of verified salary\n"
-            message += f"50% of ₹{salary:,} = ₹{salary * 0.5:,}\n\n"
-            
-            message += f"**📝 What you need to do:**\n"
-            message += f"1. Upload your **latest salary slip** using the file upload section below\n"
-            message += f"2. Ensure it clearly shows monthly salary of ₹{salary:,} or more\n"
-            message += f"3. We'll verify that EMI (₹{potential_emi:,}) is ≤ 50% of your verified salary\n\n"
-            
-            message += f"**💡 Quick Option:**\n"
-            message += f"Type: _'I've uploaded my salary slip showing ₹{salary:,} monthly salary'_\n\n"
-            
-            message += "The upload section should appear below this message."
+            message = messages.render(
+                "underwriting.pending", locale,
+                loan_amount=loan_amount,
+                reason=reason,
+                preapproved_limit=preapproved_limit,
+                max_eligible=max_eligible,
+                salary=salary,
+                half_salary=salary * outcome.values.get("max_emi_to_salary", 0.5),
+                potential_emi=potential_emi,
+            )
             next_agent = AgentType.UNDERWRITING
         
         else:  # rejected
-            message = f"❌ **Loan Application Status**\n\n"
-            message += f"I'm sorry, but your loan application for **₹{loan_amount:,}** cannot be approved at this time.\n\n"
-            message += f"**Reason:** {reason}\n\n"
-            
-            if credit_score < 700:
-                gap = 700 - credit_score
-                message += f"**📊 Your Credit Profile:**\n"
-                message += f"• Current Score: {credit_score}/900\n"
-                message += f"• Minimum Required: 700/900\n"
-                message += f"• Gap: {gap} points\n\n"
-                
-                message += f"**💡 Quick Wins to Improve Your Credit Score:**\n"
-                message += f"• Pay 2-3 EMIs on time → +30-40 points (2-3 months)\n"
-                message += f"• Clear credit card dues → +40-50 points (1 month)\n"
-                message += f"• Fix credit report errors → +50-100 points (immediate)\n"
-                message += f"• Reduce credit utilization to <30% → +30 points (1 month)\n\n"
-                
-                message += f"**Your Current Eligible Amount:** ₹{preapproved_limit:,}\n"
-                message += f"Would you like to apply for ₹{preapproved_limit:,} instead?"
+            if credit_score < min_credit_score:
+                details = messages.render(
+                    "underwriting.rejected.credit_score", locale,
+                    credit_score=credit_score, gap=min_credit_score - credit_score, preapproved_limit=preapproved_limit,
+                )
             else:
-                message += f"**Alternative Options:**\n"
-                message += f"• Your pre-approved limit: ₹{preapproved_limit:,}\n"
-                message += f"• Maximum eligible: ₹{2 * preapproved_limit:,} (with salary slip)\n\n"
-                message += f"Would you like to apply for an amount within your eligible limit?"
-            
+                details = messages.render(
+                    "underwriting.rejected.alternatives", locale,
+                    preapproved_limit=preapproved_limit, max_eligible=max_eligible,
+                )
+            message = messages.render(
+                "underwriting.rejected", locale, loan_amount=loan_amount, reason=reason, details=details
+            )
             next_agent = AgentType.SALES
         
-        print(f"   📤 Sending response. Next agent: {next_agent}")
-        
-        return AgentResponse(
+        return AgentResponse.model_construct(
             message=message,
             next_agent=next_agent,
             customer_info=request.customer_info,
@@ -288,6 +247,69 @@ class UnderwritingAgent:
                 "emi": emi_value,
                 "interest_rate": interest_rate,
                 "salary": salary,
-                "tenure": tenure
+                "tenure": tenure,
+                "rule": rule,
+                "rule_trace": list(outcome.trace),
+                "rules_version": outcome.version,
+                "decision_cached": decision_cached
             }
-        )
\ No newline at end of file
+        )
+    
+    # ------------------------------------------------------------------
+    # WHAT-IF GRID
+    # ------------------------------------------------------------------
+    def what_if(self, customer_id, amounts=None, tenures=None, salary_slip_verified=False, verified_salary=None):
+        """
+        Decision, EMI and total payable for every amount x tenure, evaluated in one vectorized call.
+        Defaults: the customer's tenure options and WHATIF_AMOUNT_STEP steps up to one step past
+        the maximum eligible amount. None if the customer is unknown.
+        """
+        import numpy as np
+        
+        rules = underwriting_rules.current()
+        terms = self._customer_terms(customer_id, rules)
+        if terms is None:
+            return None
+        
+        preapproved_limit = terms["preapproved_limit"]
+        max_eligible = rules.parameters.get("max_limit_multiple", 2) * preapproved_limit
+        if not amounts or not any(a > 0 for a in amounts):
+            top = (max_eligible // WHATIF_AMOUNT_STEP + 1) * WHATIF_AMOUNT_STEP
+            amounts = np.arange(WHATIF_AMOUNT_STEP, top + 1, WHATIF_AMOUNT_STEP)
+        tenures = sorted({int(t) for t in tenures or () if t > 0}) or sorted(set(terms["tenure_options"]))
+        amounts = sorted({float(a) for a in amounts if a > 0})[:WHATIF_MAX_AMOUNTS]
+        
+        amount_grid = np.asarray(amounts, dtype=float)[:, None]
+        tenure_grid = np.asarray(tenures, dtype=int)[None, :]
+        emi = emi_array(amount_grid, terms["interest_rate"], tenure_grid)
+        salary = terms["salary"]
+        with span("underwriting.what_if", cells=amount_grid.size * tenure_grid.size, rules_version=rules.version):
+            index = rules.evaluate_grid(
+                loan_amount=amount_grid,
+                tenure=tenure_grid,
+                credit_score=terms["credit_score"],
+                preapproved_limit=preapproved_limit,
+                salary=salary,
+                verified_salary=verified_salary or salary,
+                salary_slip_verified=bool(salary_slip_verified),
+                interest_rate=terms["interest_rate"],
+                emi=emi,
+            )
+        
+        rule_ids = np.array([rule.id for rule in rules.rules] + ["no_rule_matched"], dtype=object)
+        decisions = np.array([rule.decision for rule in rules.rules] + ["pending"], dtype=object)
+        emi = np.broadcast_to(emi, index.shape)
+        return {
+            "customer_id": customer_id,
+            "rules_version": rules.version,
+            "interest_rate": terms["interest_rate"],
+            "preapproved_limit": preapproved_limit,
+            "max_eligible_amount": max_eligible,
+            "amounts": amounts,
+            "tenures": tenures,
+            "decision": decisions[index].tolist(),
+            "rule": rule_ids[index].tolist(),
+            "emi": emi.tolist(),
+            "total_payable": np.round(emi * tenure_grid, 2).tolist(),
+            "conditions": {rule.id: list(rule.conditions) for rule in rules.rules if rule.conditions},
+        }
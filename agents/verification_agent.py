@@ -1,21 +1,24 @@
-import google.generativeai as genai
-import os
+import logging
 from dotenv import load_dotenv
 from models.schemas import AgentRequest, AgentResponse, AgentType, VerificationResult
+from services.llm import gemini_model
 from services.database import db
+from services.message_templates import messages
+from services.metrics import DB_LATENCY
+from services.tracing import span
 import re
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+PHONE_RE = re.compile(r"\b\d{10}\b")
+
 class VerificationAgent:
     def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-        else:
-            self.model = None
-            print("⚠️ Gemini API key not found")
+        self.model = gemini_model()
+        if self.model is None:
+            logger.warning("Gemini API key not found")
         
         self.system_prompt = """You are a KYC verification agent for Tata Capital. Your role is to:
         1. Verify customer identity using CRM data
@@ -30,6 +33,7 @@ class VerificationAgent:
     def process(self, request: AgentRequest) -> AgentResponse:
         context = request.context.copy()
         context["agent"] = "verification"
+        locale = context.get("locale")
         
         # Extract phone number from message or context
         phone_number = None
@@ -37,7 +41,7 @@ class VerificationAgent:
             phone_number = request.customer_info.phone
         else:
             # Try to extract from message
-            phones = re.findall(r'\b\d{10}\b', request.message)
+            phones = PHONE_RE.findall(request.message)
             if phones:
                 phone_number = phones[0]
         
@@ -48,11 +52,12 @@ class VerificationAgent:
             try:
                 # Get customer from database
                 customers_col = db.get_collection("customers")
-                customer = customers_col.find_one({"phone": phone_number})
+                with DB_LATENCY.labels("customers").time(), span("db.find_one", collection="customers"):
+                    customer = customers_col.find_one({"phone": phone_number})
                 
                 if customer:
-                    verification_result = VerificationResult(
-                        verified=customer.get("kyc_verified", False),
+                    verification_result = VerificationResult.model_construct(
+                        verified=bool(customer.get("kyc_verified", False)),
                         customer_id=customer["customer_id"],
                         details={
                             "name": customer["name"],
@@ -62,7 +67,7 @@ class VerificationAgent:
                     )
                     
                     # CRITICAL: Update context BEFORE creating response
-                    context["verification_result"] = verification_result.dict()
+                    context["verification_result"] = verification_result.model_dump()
                     context["customer_id"] = customer["customer_id"]
                     context["customer_info"] = {
                         "customer_id": customer["customer_id"],
@@ -73,73 +78,53 @@ class VerificationAgent:
                     
                     # Pass loan intent forward
                     if request.loan_intent:
-                        context["loan_intent"] = request.loan_intent.dict()
+                        context["loan_intent"] = request.loan_intent.model_dump()
                         context["loan_amount"] = request.loan_intent.amount
                     
-                    if customer.get("kyc_verified", False):
-                        verification_message = f"✅ **Verification Successful!**\n\n"
-                        verification_message += f"Hello **{customer['name']}**, I've verified your identity.\n"
-                        verification_message += f"📍 Location: {customer['city']}\n"
-                        verification_message += f"🆔 Customer ID: {customer['customer_id']}\n\n"
-                        
-                        if request.loan_intent and request.loan_intent.amount:
-                            verification_message += f"**Processing your loan request for ₹{request.loan_intent.amount:,}...**\n\n"
-                            verification_message += "Checking eligibility now..."
-                            next_agent = AgentType.UNDERWRITING
-                        else:
-                            verification_message += "Your KYC is complete. Please tell me how much loan you need."
-                            next_agent = AgentType.SALES
+                    kyc_verified = customer.get("kyc_verified", False)
+                    # FIXED: Even if KYC is incomplete, we should still route to underwriting
+                    # because the customer exists in our system
+                    if request.loan_intent and request.loan_intent.amount:
+                        next_step = messages.render(
+                            "verification.processing_amount", locale, loan_amount=request.loan_intent.amount
+                        )
+                        next_agent = AgentType.UNDERWRITING
                     else:
-                        # FIXED: Even if KYC is incomplete, we should still route to underwriting
-                        # because the customer exists in our system
-                        verification_message = f"⚠️ **KYC Verification Pending**\n\n"
-                        verification_message += f"Hello **{customer['name']}**, I found your record.\n"
-                        verification_message += f"📍 Location: {customer['city']}\n"
-                        verification_message += f"🆔 Customer ID: {customer['customer_id']}\n\n"
-                        verification_message += f"**Note:** Your KYC documentation is incomplete.\n"
-                        verification_message += f"However, I can still check your loan eligibility.\n\n"
-                        
-                        if request.loan_intent and request.loan_intent.amount:
-                            verification_message += f"**Processing your loan request for ₹{request.loan_intent.amount:,}...**\n\n"
-                            verification_message += "Checking eligibility now..."
-                            next_agent = AgentType.UNDERWRITING
-                        else:
-                            verification_message += "Please tell me how much loan you need."
-                            next_agent = AgentType.SALES
+                        next_step = messages.render(
+                            "verification.kyc_complete_ask_amount" if kyc_verified else "verification.ask_amount", locale
+                        )
+                        next_agent = AgentType.SALES
+                    
+                    verification_message = messages.render(
+                        "verification.verified" if kyc_verified else "verification.kyc_pending", locale,
+                        name=customer["name"],
+                        city=customer["city"],
+                        customer_id=customer["customer_id"],
+                        next_step=next_step,
+                    )
                 else:
-                    verification_message = "❌ **Customer Not Found**\n\n"
-                    verification_message += "I couldn't find your details in our system with this phone number.\n"
-                    verification_message += "Could you please verify the number or register with us first?"
+                    verification_message = messages.render("verification.not_found", locale)
                     next_agent = AgentType.VERIFICATION
                     
             except Exception as e:
-                print(f"Database error in verification: {e}")
-                verification_message = "⚠️ **Verification Service Temporarily Unavailable**\n\n"
-                verification_message += "I'm having trouble accessing the verification system.\n"
-                verification_message += "Let me proceed with basic details for now."
+                logger.exception("Database error in verification")
+                verification_message = messages.render("verification.unavailable", locale)
                 next_agent = AgentType.UNDERWRITING
         else:
-            verification_message = "📱 **Phone Verification Required**\n\n"
-            verification_message += "To verify your identity, I need your 10-digit registered phone number.\n"
-            verification_message += "Please share your phone number (e.g., 9876543210)"
+            verification_message = messages.render("verification.phone_required", locale)
             next_agent = AgentType.VERIFICATION
         
-        # CRITICAL: Print debug info
-        print(f"\n🔐 VERIFICATION AGENT DEBUG:")
-        print(f"   Customer Found: {customer is not None}")
-        if customer:
-            print(f"   Customer ID: {customer['customer_id']}")
-            print(f"   Name: {customer['name']}")
-            print(f"   Verified: {customer.get('kyc_verified')}")
-        else:
-            print(f"   Customer ID: None")
-            print(f"   Verified: None")
-        print(f"   Next Agent: {next_agent}")
-        print(f"   Context Keys: {list(context.keys())}")
-        print(f"   Has verification_result in context: {'verification_result' in context}")
-        print(f"   Has customer_id in context: {'customer_id' in context}")
+        logger.debug(
+            "verification agent",
+            extra={
+                "customer_found": customer is not None,
+                "customer_id": customer["customer_id"] if customer else None,
+                "kyc_verified": customer.get("kyc_verified") if customer else None,
+                "next_agent": next_agent.value,
+            },
+        )
         
-        return AgentResponse(
+        return AgentResponse.model_construct(
             message=verification_message,
             next_agent=next_agent,
             customer_info=request.customer_info,
@@ -148,7 +133,7 @@ class VerificationAgent:
             metadata={
                 "agent": "verification",
                 "phone_provided": phone_number is not None,
-                "verification_result": verification_result.dict() if verification_result else None,
+                "verification_result": context["verification_result"] if verification_result else None,
                 "customer_verified": verification_result.verified if verification_result else False
             }
         )
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+HTTP client the Streamlit frontend uses to talk to the backend.
+
+One `requests.Session` with a keep-alive connection pool, so a chat turn
+reuses an open connection instead of paying a TCP (and TLS) handshake every
+time. Connect and read timeouts are separate: a backend that is down fails
+in API_CONNECT_TIMEOUT seconds, while a slow LLM turn gets API_READ_TIMEOUT.
+
+Failed calls are retried with exponential backoff (honouring Retry-After)
+only when they are idempotent: GETs, and chat POSTs, which always carry an
+`Idempotency-Key` so a retry returns the original turn instead of running
+it twice.
+"""
+import os
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "3.05"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "30"))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "2"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.3"))  # 0.3s, 0.6s, 1.2s, ...
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "4"))
+
+# 429 = the session is still busy with a previous turn (see services/session_guard.py)
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class LoanAssistantClient:
+    def __init__(self, base_url=API_BASE_URL, connect_timeout=API_CONNECT_TIMEOUT,
+                 read_timeout=API_READ_TIMEOUT, max_retries=API_MAX_RETRIES,
+                 retry_backoff=API_RETRY_BACKOFF, pool_size=API_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=retry_backoff,
+            status_forcelist=RETRY_STATUSES,
+            # POST is safe here: chat POSTs carry an Idempotency-Key and the what-if grid is read-only
+            allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry))
+
+    def chat(self, payload, idempotency_key=None):
+        """POST /api/chat; the same key is reused by every retry of this call"""
+        return self.session.post(
+            f"{self.base_url}/api/chat",
+            json=payload,
+            headers={"Idempotency-Key": idempotency_key or str(uuid.uuid4())},
+            timeout=self.timeout,
+        )
+
+    def what_if(self, payload):
+        """POST /api/underwriting/what-if: decisions over amount x tenure for a verified customer"""
+        return self.session.post(f"{self.base_url}/api/underwriting/what-if", json=payload, timeout=self.timeout)
+
+    def health(self):
+        return self.session.get(f"{self.base_url}/api/health", timeout=self.timeout)
+
+    def close(self):
+        self.session.close()
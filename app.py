@@ -5,9 +5,10 @@ import uuid
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-import time
 import sys
 
+from api_client import LoanAssistantClient
+
 load_dotenv()
 
 # Page config
@@ -147,10 +148,34 @@ if "reset_counter" not in st.session_state:
     st.session_state.reset_counter = 0
 if "show_upload_section" not in st.session_state:
     st.session_state.show_upload_section = False
+if "compacted_messages" not in st.session_state:
+    st.session_state.compacted_messages = 0
+if "history_pages" not in st.session_state:
+    st.session_state.history_pages = 1
 
 # API Configuration
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 
+@st.cache_resource
+def get_api_client():
+    """One pooled keep-alive client per server process, shared across reruns and sessions"""
+    return LoanAssistantClient(API_BASE_URL)
+# Chat messages kept in the browser session; older ones live on as the backend's conversation summary
+APP_MAX_MESSAGES = int(os.getenv("APP_MAX_MESSAGES", "60"))
+# Messages rendered per history page; older pages are only rendered on request
+APP_RENDER_MESSAGES = int(os.getenv("APP_RENDER_MESSAGES", "12"))
+
+AGENT_BADGES = {
+    "sales": {"badge": "🤝 Sales Agent", "color": "#0066cc"},
+    "verification": {"badge": "🔐 Verification Agent", "color": "#ff6600"},
+    "underwriting": {"badge": "📊 Underwriting Agent", "color": "#00cc66"},
+    "sanction": {"badge": "📜 Sanction Agent", "color": "#9900cc"}
+}
+DEFAULT_BADGE = {"badge": "🤖 Assistant", "color": "#003366"}
+
+# Newer Streamlit can rerun just the chat history (e.g. paging) instead of the whole script
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
 # Header
 st.markdown("""
     <div style='text-align: center; padding: 2rem 0;'>
@@ -178,6 +203,8 @@ with st.sidebar:
             st.session_state.uploaded_file = None
             st.session_state.file_processed = False
             st.session_state.show_upload_section = False
+            st.session_state.compacted_messages = 0
+            st.session_state.history_pages = 1
             st.session_state.reset_counter = st.session_state.get("reset_counter", 0) + 1
             st.rerun()
     
@@ -278,7 +305,7 @@ with st.sidebar:
     # Debug info
     with st.expander("🔍 Debug"):
         st.markdown(f"**Session ID:** `{st.session_state.session_id[:16]}...`")
-        st.markdown(f"**Messages:** {len(st.session_state.messages)}")
+        st.markdown(f"**Messages:** {len(st.session_state.messages)} (+{st.session_state.compacted_messages} compacted)")
         st.markdown(f"**File Processed:** {st.session_state.file_processed}")
         st.markdown(f"**Show Upload:** {st.session_state.show_upload_section}")
         st.markdown("**Context Keys:**")
@@ -291,54 +318,121 @@ if st.session_state.api_error:
         st.session_state.api_error = None
         st.rerun()
 
+# What-if grid: fetched once per customer and salary-slip state, explored locally
+WHAT_IF_CELLS = {"approved": "✅", "pending": "⏳", "rejected": "❌"}
+
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def fetch_what_if(customer_id, salary_slip_verified, verified_salary):
+    response = get_api_client().what_if({
+        "customer_id": customer_id,
+        "salary_slip_verified": salary_slip_verified,
+        "verified_salary": verified_salary,
+    })
+    response.raise_for_status()
+    return response.json()
+
+def what_if_table(grid, show):
+    """Rows: amounts; columns: tenures; cells: decision icon plus EMI or total payable"""
+    rows = []
+    for i, amount in enumerate(grid["amounts"]):
+        row = {"Amount": f"₹{amount:,.0f}"}
+        for j, tenure in enumerate(grid["tenures"]):
+            icon = WHAT_IF_CELLS.get(grid["decision"][i][j], "•")
+            value = grid["emi"][i][j] if show == "EMI" else grid["total_payable"][i][j]
+            row[f"{tenure} months"] = icon if show == "Decision" else f"{icon} ₹{value:,.0f}"
+        rows.append(row)
+    return rows
+
+if st.session_state.context.get("customer_id"):
+    with st.expander("🧮 Explore amounts and tenures"):
+        try:
+            grid = fetch_what_if(
+                st.session_state.context["customer_id"],
+                bool(st.session_state.context.get("salary_slip_verified")),
+                st.session_state.context.get("verified_salary"),
+            )
+        except requests.exceptions.RequestException as e:
+            st.caption(f"Options unavailable: {e}")
+        else:
+            st.caption(
+                f"Interest rate {grid['interest_rate']}% p.a. • Pre-approved limit ₹{grid['preapproved_limit']:,.0f} "
+                f"• ✅ approved ⏳ needs salary slip ❌ not approved"
+            )
+            show = st.radio("Show", ["EMI", "Total payable", "Decision"], horizontal=True, key="what_if_show")
+            st.dataframe(what_if_table(grid, show), use_container_width=True, hide_index=True)
+
 # Display messages
-for message in st.session_state.messages:
+@st.cache_data(max_entries=32, show_spinner=False)
+def read_pdf(path, mtime):
+    """PDF bytes for the download button, read once per file version instead of every rerun"""
+    with open(path, "rb") as f:
+        return f.read()
+
+def details_markdown(metadata):
+    lines = []
+    if metadata.get("decision"):
+        lines.append(f"**Decision:** {metadata['decision'].upper()}")
+    if metadata.get("credit_score"):
+        lines.append(f"**Credit Score:** {metadata['credit_score']}/900")
+    if metadata.get("preapproved_limit"):
+        lines.append(f"**Pre-approved Limit:** ₹{metadata['preapproved_limit']:,}")
+    if metadata.get("emi"):
+        lines.append(f"**EMI:** ₹{metadata['emi']:,}/month")
+    if metadata.get("salary"):
+        lines.append(f"**Salary:** ₹{metadata['salary']:,}/month")
+    if metadata.get("interest_rate"):
+        lines.append(f"**Interest Rate:** {metadata['interest_rate']}% p.a.")
+    return "  \n".join(lines)
+
+def render_message(message):
     if message["role"] == "user":
         with st.chat_message("user", avatar="👤"):
             st.markdown(message["content"])
-    else:
-        agent_type = message.get("metadata", {}).get("agent", "master")
-        agent_config = {
-            "sales": {"badge": "🤝 Sales Agent", "color": "#0066cc"},
-            "verification": {"badge": "🔐 Verification Agent", "color": "#ff6600"},
-            "underwriting": {"badge": "📊 Underwriting Agent", "color": "#00cc66"},
-            "sanction": {"badge": "📜 Sanction Agent", "color": "#9900cc"}
-        }
+        return
+    
+    metadata = message.get("metadata", {})
+    config = AGENT_BADGES.get(metadata.get("agent", "master"), DEFAULT_BADGE)
+    with st.chat_message("assistant", avatar="🏦"):
+        st.markdown(
+            f"**<span style='color: {config['color']};'>{config['badge']}</span>**\n\n{message['content']}",
+            unsafe_allow_html=True
+        )
         
-        config = agent_config.get(agent_type, {"badge": "🤖 Assistant", "color": "#003366"})
+        details = details_markdown(metadata) if metadata else ""
+        if details:
+            with st.expander("📋 Details"):
+                st.markdown(details)
         
-        with st.chat_message("assistant", avatar="🏦"):
-            st.markdown(f"**<span style='color: {config['color']};'>{config['badge']}</span>**", unsafe_allow_html=True)
-            st.markdown(message["content"])
-            
-            metadata = message.get("metadata", {})
-            if metadata:
-                with st.expander("📋 Details"):
-                    if metadata.get("decision"):
-                        st.write(f"**Decision:** {metadata['decision'].upper()}")
-                    if metadata.get("credit_score"):
-                        st.write(f"**Credit Score:** {metadata['credit_score']}/900")
-                    if metadata.get("preapproved_limit"):
-                        st.write(f"**Pre-approved Limit:** ₹{metadata['preapproved_limit']:,}")
-                    if metadata.get("emi"):
-                        st.write(f"**EMI:** ₹{metadata['emi']:,}/month")
-                    if metadata.get("salary"):
-                        st.write(f"**Salary:** ₹{metadata['salary']:,}/month")
-                    if metadata.get("interest_rate"):
-                        st.write(f"**Interest Rate:** {metadata['interest_rate']}% p.a.")
-            
-            if metadata.get("pdf_path"):
-                pdf_path = metadata["pdf_path"]
-                if os.path.exists(pdf_path):
-                    with open(pdf_path, "rb") as f:
-                        pdf_data = f.read()
-                    st.download_button(
-                        label="📥 Download Sanction Letter",
-                        data=pdf_data,
-                        file_name=f"TataCapital_Sanction_{metadata.get('reference_number', 'letter')}.pdf",
-                        mime="application/pdf",
-                        use_container_width=True
-                    )
+        if metadata.get("pdf_path"):
+            pdf_path = metadata["pdf_path"]
+            if os.path.exists(pdf_path):
+                st.download_button(
+                    label="📥 Download Sanction Letter",
+                    data=read_pdf(pdf_path, os.path.getmtime(pdf_path)),
+                    file_name=f"TataCapital_Sanction_{metadata.get('reference_number', 'letter')}.pdf",
+                    mime="application/pdf",
+                    use_container_width=True
+                )
+
+def show_earlier_messages():
+    st.session_state.history_pages += 1
+
+@fragment
+def render_history():
+    if st.session_state.compacted_messages:
+        with st.expander(f"🗂️ Earlier conversation ({st.session_state.compacted_messages} messages)"):
+            st.markdown(st.session_state.context.get("conversation_summary") or "_Summary not available._")
+    
+    # Only the newest page(s) are rendered; every rerun costs the same however long the chat is
+    messages = st.session_state.messages
+    shown = min(len(messages), st.session_state.history_pages * APP_RENDER_MESSAGES)
+    hidden = len(messages) - shown
+    if hidden:
+        st.button(f"⬆️ Show earlier messages ({hidden} hidden)", key="show_earlier", on_click=show_earlier_messages)
+    for message in messages[hidden:]:
+        render_message(message)
+
+render_history()
 
 # FILE UPLOAD SECTION - CRITICAL FIX
 if (st.session_state.show_upload_section and 
@@ -398,8 +492,7 @@ if (st.session_state.show_upload_section and
                             file_bytes = uploaded_file.read()
                             st.session_state.pending_message = f"I've uploaded my salary slip ({uploaded_file.name}) showing ₹75,000 monthly salary"
                             st.session_state.file_processed = True
-                            st.success(f"✅ Processed {uploaded_file.name}")
-                            time.sleep(1)
+                            st.toast(f"✅ Processed {uploaded_file.name}")  # survives the rerun
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error processing file: {e}")
@@ -442,11 +535,7 @@ if user_message:
             print(f"\n📤 SENDING TO BACKEND:")
             print(f"   Message: {user_message}")
             
-            response = requests.post(
-                f"{API_BASE_URL}/api/chat",
-                json=request_payload,
-                timeout=30
-            )
+            response = get_api_client().chat(request_payload)
             
             if response.status_code == 200:
                 result = response.json()
@@ -461,6 +550,10 @@ if user_message:
                     "content": result["message"],
                     "metadata": result.get("metadata", {})
                 })
+                overflow = len(st.session_state.messages) - APP_MAX_MESSAGES
+                if overflow > 0:
+                    del st.session_state.messages[:overflow]
+                    st.session_state.compacted_messages += overflow
                 
                 # Update context
                 if result.get("context"):
@@ -480,10 +573,13 @@ if user_message:
                 else:
                     st.session_state.show_upload_section = False
                 
-                # Force UI update
-                time.sleep(0.3)
+                # Redraw with the new messages and state
                 st.rerun()
                 
+            elif response.status_code == 429:
+                st.session_state.api_error = "Still working on your previous message"
+                st.warning(f"⏳ {st.session_state.api_error} - please try again in a moment.")
+                
             else:
                 st.session_state.api_error = f"API Error: {response.status_code}"
                 st.error(f"❌ {st.session_state.api_error}")
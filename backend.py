@@ -1,27 +1,60 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, PlainTextResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from agents.master_agent import MasterAgent
-from models.schemas import AgentRequest, AgentResponse
+from models.schemas import AgentRequest, AgentResponse, WhatIfRequest, WhatIfGrid
 from services.database import db
+from services.audit_log import decision_log
 from services.mock_apis import router as mock_apis_router
+from services.offer_book import offer_book
+from services.metrics import REGISTRY, CONTENT_TYPE, CHAT_LATENCY, CHAT_REQUESTS
+from services.tracing import tracer, trace_buffer
+from services.profiling import MODES as PROFILE_MODES, profiler, stats_to_text, stats_to_pstats_bytes, stacks_to_speedscope
+from services.traffic_recorder import traffic_recorder
+from services.session_guard import session_guard, idempotency_cache, SessionBusy, IdempotencyConflict
+from services.chat_channel import chat_hub
+from services.shared_state import shared_state
+from services.lifecycle import STARTUP_WARMUP, in_flight, drain, install_drain_on_sigterm, prepare_shared_state, warmup
+from services.logging_config import setup_logging, bind_request, unbind_request, session_id_var
+import json
 import uuid
 from dotenv import load_dotenv
 import os
-from contextlib import asynccontextmanager
+import logging
+import time
+from contextlib import asynccontextmanager, nullcontext
 
 load_dotenv()
+setup_logging()
+
+logger = logging.getLogger(__name__)
 
 # Lifespan handler for startup/shutdown
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print("🚀 Starting Tata Capital Loan Assistant API...")
+    logger.info("Starting Tata Capital Loan Assistant API")
+    db.start()  # Background probe; never blocks startup
     db.seed_initial_data()
-    print("✅ Database seeded with initial data")
+    logger.info("Database seeded with initial data")
+    decision_log.start()
+    await prepare_shared_state()
+    await run_in_threadpool(offer_book.start)
+    if STARTUP_WARMUP:
+        await run_in_threadpool(warmup, master_agent)  # before the first request, not during it
+    chat_hub.start()
+    install_drain_on_sigterm()  # after startup: SIGTERM during startup still exits right away
     yield
-    # Shutdown
-    print("👋 Shutting down...")
+    # Shutdown: finish running turns before closing what they write to (already done after a SIGTERM)
+    logger.info("Shutting down")
+    if not in_flight.draining:
+        await drain()
+    await chat_hub.close()
+    offer_book.stop()
+    decision_log.close()  # Flush queued audit entries before dropping the client
+    traffic_recorder.close()
+    db.stop()
 
 app = FastAPI(
     title="Tata Capital Loan Assistant API", 
@@ -39,6 +72,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Bind a request ID (and debug-log sampling decision) for every log record"""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    sample_rate = 1.0 if request.headers.get("x-debug-log") == "1" else None
+    tokens = bind_request(request_id=request_id, sample_rate=sample_rate)
+    try:
+        response = await call_next(request)
+    finally:
+        unbind_request(tokens)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Include mock APIs
 app.include_router(mock_apis_router, prefix="/api/mock", tags=["Mock APIs"])
 
@@ -53,51 +99,269 @@ async def root():
         "status": "running",
         "endpoints": {
             "chat": "/api/chat (POST)",
+            "chat_socket": "/ws/chat (WebSocket)",
+            "what_if": "/api/underwriting/what-if (POST)",
             "download_pdf": "/api/download-pdf/{filename}",
             "health": "/api/health",
+            "metrics": "/metrics",
             "mock_apis": "/api/mock/"
         }
     }
 
+def _run_turn(request, sampled, profiling):
+    """One MasterAgent turn (runs in the threadpool so other sessions keep going)"""
+    with tracer.start_trace("POST /api/chat", sampled=sampled, session_id=request.session_id) as trace:
+        with profiling as profile:
+            response = master_agent.process(request)
+    return response, trace, profile
+
 @app.post("/api/chat", response_model=AgentResponse)
-async def chat_endpoint(request: AgentRequest):
+async def chat_endpoint(request: AgentRequest, http_request: Request):
     """
-    Main chat endpoint that routes through Master Agent
+    Main chat endpoint that routes through Master Agent.
+    Send `X-Profile: <PROFILING_TOKEN>` (or `?profile=<token>`) to profile it;
+    `X-Profile-Mode: sampling` selects the sampling profiler. With the token in
+    `X-Debug-Token` (or X-Profile), `X-Trace: 1` forces a trace of this request
+    (`0` suppresses it).
+    The request is validated once here; the response is trusted and serialized
+    straight to JSON rather than re-validated against `response_model`.
+    Turns of one session run in order (429 when too many are queued); send an
+    `Idempotency-Key` header to make retries return the original response.
     """
+    started = time.perf_counter()
+    idempotency_key = http_request.headers.get("idempotency-key")
+    if in_flight.draining:
+        CHAT_REQUESTS.labels("draining").inc()
+        raise HTTPException(status_code=503, detail="Server is restarting; retry",
+                            headers={"Retry-After": "1", "Connection": "close"})
+    # Rejected before taking the session lock (and outside the 500 handler below)
+    profile_mode = None
+    profile_token = http_request.headers.get("x-profile") or http_request.query_params.get("profile")
+    debug_authorized = profiler.authorized(_debug_token(http_request))
+    if profile_token is not None and profiler.authorized(profile_token):
+        profile_mode = (http_request.headers.get("x-profile-mode")
+                        or http_request.query_params.get("profile_mode") or "deterministic")
+        if profile_mode not in PROFILE_MODES:
+            raise HTTPException(status_code=400,
+                                detail=f"Unknown X-Profile-Mode {profile_mode!r}; expected one of {', '.join(PROFILE_MODES)}")
     try:
         # Ensure session ID
         if not request.session_id:
             request.session_id = str(uuid.uuid4())
         
-        print(f"\n{'='*60}")
-        print(f"📨 Incoming Request:")
-        print(f"   Session: {request.session_id[:8]}...")
-        print(f"   Message: {request.message}")
-        print(f"   Context Keys: {list(request.context.keys()) if request.context else []}")
-        if request.loan_intent:
-            print(f"   Loan Intent: Amount={request.loan_intent.amount}, Tenure={request.loan_intent.tenure}")
-        print(f"{'='*60}\n")
+        session_id_var.set(request.session_id)
+        logger.debug(
+            "chat request",
+            extra={
+                "message_length": len(request.message),
+                "context_keys": list(request.context.keys()) if request.context else [],
+                "loan_amount": request.loan_intent.amount if request.loan_intent else None,
+                "loan_tenure": request.loan_intent.tenure if request.loan_intent else None,
+            },
+        )
+        fingerprint = idempotency_cache.fingerprint(request) if idempotency_key else None
         
-        # Process through master agent
-        response = master_agent.process(request)
+        with in_flight.track("http"):  # drained on shutdown, including the state commit
+            async with session_guard.turn(request.session_id) as turn:
+                if idempotency_key:
+                    # Checked under the session lock: a retry of a still-running turn waits for it
+                    body = await idempotency_cache.get(request.session_id, idempotency_key, fingerprint)
+                    if body is not None:
+                        CHAT_REQUESTS.labels("replayed").inc()
+                        return Response(body, media_type="application/json", headers={"Idempotent-Replayed": "true"})
+                turn.rebase(request)
+            
+                # Process through master agent
+                sampled = tracer.should_sample(http_request.headers.get("x-trace") if debug_authorized else None)
+                if profile_mode is not None:
+                    profiling = profiler.profile(profile_mode, label=request.message[:80])
+                else:
+                    profiling = nullcontext()
+            
+                # Snapshot before processing; agents may add to the request's context
+                recorded_request = request.model_dump(mode="json") if traffic_recorder.should_record(request.session_id) else None
+            
+                response, trace, profile = await run_in_threadpool(_run_turn, request, sampled, profiling)
+                turn.complete(response)
+                body = response.model_dump_json()
+                if idempotency_key:
+                    await idempotency_cache.put(request.session_id, idempotency_key, fingerprint, body)
         
-        print(f"\n{'='*60}")
-        print(f"📤 Outgoing Response:")
-        print(f"   Agent: {response.context.get('agent', 'unknown')}")
-        print(f"   Next Agent: {response.next_agent}")
-        print(f"   Message Length: {len(response.message)} chars")
-        print(f"   Context Keys: {list(response.context.keys())}")
-        print(f"   Has customer_id: {'customer_id' in response.context}")
-        print(f"   Has verification_result: {'verification_result' in response.context}")
-        print(f"{'='*60}\n")
+        headers = {}
+        if trace:
+            headers["X-Trace-ID"] = trace.trace_id
+        if profile:
+            headers["X-Profile-ID"] = profile.profile_id
+        if recorded_request is not None:
+            traffic_recorder.record(recorded_request, response, (time.perf_counter() - started) * 1000)
         
-        return response
+        logger.debug(
+            "chat response",
+            extra={
+                "agent": response.context.get("agent"),
+                "next_agent": response.next_agent.value if response.next_agent else None,
+                "message_length": len(response.message),
+                "context_keys": list(response.context.keys()),
+            },
+        )
         
+        CHAT_REQUESTS.labels("ok").inc()
+        return Response(body, media_type="application/json", headers=headers)
+    
+    except SessionBusy as e:
+        CHAT_REQUESTS.labels("busy").inc()
+        logger.warning("Chat request rejected: %s", e)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except IdempotencyConflict:
+        CHAT_REQUESTS.labels("conflict").inc()
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
     except Exception as e:
-        print(f"❌ API Error: {e}")
-        import traceback
-        traceback.print_exc()
+        CHAT_REQUESTS.labels("error").inc()
+        logger.exception("API error")
         raise HTTPException(status_code=500, detail=f"Agent processing error: {str(e)}")
+    finally:
+        CHAT_LATENCY.observe(time.perf_counter() - started)
+
+# ----------------------------------------------------------------------
+# WebSocket chat channel
+# ----------------------------------------------------------------------
+# Server-driven hand-off that app.py does by auto-sending this message
+HANDOFF_MESSAGE = "check eligibility"
+
+def _needs_underwriting(context):
+    return (context.get("customer_id") and context.get("verification_result")
+            and not context.get("underwriting_result") and context.get("current_agent") != "underwriting")
+
+def _turn_events(previous_context, response):
+    """(type, data) events describing what one turn changed"""
+    context = response.context or {}
+    events = []
+    before, after = previous_context.get("current_agent"), context.get("current_agent")
+    if after and after != before:
+        events.append(("agent_transition", {"from": before, "to": after}))
+    events.append(("message", {
+        "message": response.message,
+        "agent": after,
+        "metadata": response.metadata or {},
+    }))
+    if context.get("salary_slip_verified") and not previous_context.get("salary_slip_verified"):
+        events.append(("job", {"job": "salary_slip_verified", "verified_salary": context.get("verified_salary")}))
+    if context.get("pdf_path") and context.get("pdf_path") != previous_context.get("pdf_path"):
+        filename = os.path.basename(context["pdf_path"])
+        events.append(("job", {"job": "pdf_ready", "filename": filename,
+                               "download_url": f"/api/download-pdf/{filename}"}))
+    return events
+
+async def _socket_turn(channel, websocket, message, idempotency_key=None):
+    """Run one turn from the channel's server-held state and publish its events; returns the new context"""
+    session_id = channel.session_id
+    request = AgentRequest.model_validate({"message": message, "session_id": session_id, **channel.state})
+    previous_context = dict(request.context or {})
+    chat_hub.touch(channel, websocket)  # the receive loop isn't reading pongs while a turn runs
+    with in_flight.track("websocket"):  # drained on shutdown, including the state commit
+        async with session_guard.turn(session_id) as turn:
+            chat_hub.touch(channel, websocket)  # nor while waiting for the session lock
+            if idempotency_key:
+                cached = await idempotency_cache.get(session_id, f"ws:{idempotency_key}", message)
+                if cached is not None:
+                    await chat_hub.publish(session_id, "message", dict(json.loads(cached), replayed=True))
+                    return None
+            turn.rebase(request, latest=True)  # another worker may have run the last turn
+            response, _, _ = await run_in_threadpool(
+                _run_turn, request, tracer.should_sample(None), nullcontext())
+            turn.complete(response)
+            channel.update_state(response)
+            for event_type, data in _turn_events(previous_context, response):
+                await chat_hub.publish(session_id, event_type, data)
+                if idempotency_key and event_type == "message":
+                    await idempotency_cache.put(session_id, f"ws:{idempotency_key}", message, json.dumps(data, default=str))
+    return response.context or {}
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket, session_id: str = None, resume_token: str = None,
+                      last_seq: int = None):
+    """
+    Persistent chat channel for one session (see services/chat_channel.py).
+    Client frames: {"type": "chat", "message": ..., "idempotency_key": ...}
+    and {"type": "pong"}. The first chat frame may also carry "context",
+    "loan_intent" and "customer_info" to continue an HTTP conversation.
+    Connect without a session_id to start one; reconnect with the session_id
+    and resume_token from the hello frame (plus last_seq=N for missed events).
+    """
+    await websocket.accept()
+    if in_flight.draining:
+        await websocket.close(code=1012)  # service restart: reconnect to another worker
+        return
+    if session_id is not None and not chat_hub.authorized(session_id, resume_token):
+        await websocket.close(code=1008, reason="resume_token required to attach to a session")
+        return
+    session_id = session_id or str(uuid.uuid4())
+    tokens = bind_request(session_id=session_id, request_id=uuid.uuid4().hex)
+    channel = chat_hub.channel(session_id)
+    if not channel.seq and shared_state.enabled:
+        # Resuming a session another worker served: start from its last committed state
+        state = await run_in_threadpool(shared_state.last_state, session_id)
+        if state is not None:
+            channel.state = state
+    await websocket.send_text(json.dumps({"type": "hello", "data": {
+        "session_id": session_id, "resume_token": chat_hub.resume_token(session_id),
+        "seq": chat_hub.channel(session_id).seq}}))
+    channel = await chat_hub.attach(session_id, websocket, last_seq)
+    try:
+        while True:
+            try:
+                frame = json.loads(await websocket.receive_text())
+            except ValueError:
+                frame = None
+            chat_hub.touch(channel, websocket)
+            if isinstance(frame, dict) and frame.get("type") == "pong":
+                continue
+            if in_flight.draining:
+                await websocket.send_text(json.dumps({"type": "error", "data": {
+                    "code": 503, "detail": "Server is restarting; reconnect"}}))
+                break
+            if not isinstance(frame, dict) or frame.get("type") != "chat" or not isinstance(frame.get("message"), str):
+                await websocket.send_text(json.dumps({"type": "error", "data": {
+                    "code": 400, "detail": 'expected {"type": "chat", "message": "..."} or {"type": "pong"}'}}))
+                continue
+            if not channel.state["context"] and frame.get("context"):
+                channel.state = {key: frame.get(key) for key in ("context", "loan_intent", "customer_info")}
+
+            try:
+                context = await _socket_turn(channel, websocket, frame["message"], frame.get("idempotency_key"))
+                if context is not None and _needs_underwriting(context):
+                    await _socket_turn(channel, websocket, HANDOFF_MESSAGE)
+                CHAT_REQUESTS.labels("ok").inc()
+            except SessionBusy as e:
+                CHAT_REQUESTS.labels("busy").inc()
+                await websocket.send_text(json.dumps({"type": "error", "data": {"code": 429, "detail": str(e)}}))
+            except Exception as e:
+                CHAT_REQUESTS.labels("error").inc()
+                logger.exception("WebSocket chat error")
+                await websocket.send_text(json.dumps({"type": "error", "data": {
+                    "code": 500, "detail": f"Agent processing error: {e}"}}))
+            chat_hub.touch(channel, websocket)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        chat_hub.detach(channel, websocket)
+        unbind_request(tokens)
+
+@app.post("/api/underwriting/what-if", response_model=WhatIfGrid)
+async def what_if(request: WhatIfRequest):
+    """
+    Underwriting decision, EMI and total payable over amount x tenure for a
+    verified customer (the `customer_id` verification put in the context),
+    evaluated in one vectorized call rather than one chat turn per scenario.
+    """
+    grid = await run_in_threadpool(
+        master_agent.underwriting_agent.what_if,
+        request.customer_id, request.amounts, request.tenures,
+        request.salary_slip_verified, request.verified_salary,
+    )
+    if grid is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return grid
 
 @app.get("/api/download-pdf/{filename}")
 async def download_pdf(filename: str):
@@ -116,15 +380,92 @@ async def download_pdf(filename: str):
 
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (503 while draining, so load balancers stop routing here)"""
+    if in_flight.draining:
+        return JSONResponse({"status": "draining", "in_flight": in_flight.running}, status_code=503)
     return {
         "status": "healthy", 
         "service": "loan_assistant_api",
         "version": "1.0.0",
         "gemini_configured": os.getenv("GEMINI_API_KEY") is not None,
-        "mongodb_connected": db.client is not None
+        "mongodb_connected": db.is_connected,
+        "shared_state": shared_state.enabled,
+        "offer_book_rows": len(offer_book)
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus-style metrics"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+def _debug_token(http_request):
+    """PROFILING_TOKEN as sent for the debug endpoints and X-Trace (X-Debug-Token, or as for profiling)"""
+    return (http_request.headers.get("x-debug-token") or http_request.headers.get("x-profile")
+            or http_request.query_params.get("profile"))
+
+def _require_profiling_token(http_request: Request):
+    if not profiler.authorized(_debug_token(http_request)):
+        raise HTTPException(status_code=403, detail="Profiling disabled or token invalid")
+
+@app.get("/api/debug/traces")
+async def list_traces(http_request: Request, limit: int = 20):
+    """Most recent sampled traces (newest first); needs the profiling token (traces carry session ids)"""
+    _require_profiling_token(http_request)
+    return {"traces": trace_buffer.recent(limit)}
+
+@app.get("/api/debug/traces/{trace_id}")
+async def get_trace(trace_id: str, http_request: Request):
+    """All spans of one trace; needs the profiling token"""
+    _require_profiling_token(http_request)
+    trace = trace_buffer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+def _profile_file(name, fmt, stats=None, stacks=None, interval_ms=None):
+    if stats is not None:
+        if fmt == "pstats":
+            return Response(
+                stats_to_pstats_bytes(stats),
+                media_type="application/octet-stream",
+                headers={"Content-Disposition": f'attachment; filename="{name}.pstats"'}
+            )
+        return PlainTextResponse(stats_to_text(stats))
+    return JSONResponse(
+        stacks_to_speedscope(stacks, interval_ms, name),
+        headers={"Content-Disposition": f'attachment; filename="{name}.speedscope.json"'}
+    )
+
+@app.get("/api/debug/profiles")
+async def list_profiles(http_request: Request, limit: int = 20):
+    """Most recent request profiles (newest first)"""
+    _require_profiling_token(http_request)
+    return {"profiles": [r.summary() for r in profiler.recent(limit)]}
+
+@app.get("/api/debug/profiles/aggregate")
+async def aggregate_profiles(http_request: Request, last: int = 10, mode: str = "deterministic", format: str = "text"):
+    """Merge the last N profiles; deterministic -> text/pstats, sampling -> speedscope"""
+    _require_profiling_token(http_request)
+    records, merged = profiler.aggregate(last, mode)
+    if not records:
+        raise HTTPException(status_code=404, detail="No profiles recorded")
+    name = f"aggregate_{len(records)}_{mode}"
+    if mode == "deterministic":
+        return _profile_file(name, format, stats=merged)
+    return _profile_file(name, format, stacks=merged, interval_ms=profiler.sample_interval_ms)
+
+@app.get("/api/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, http_request: Request, format: str = "text"):
+    """One profile: format=text|pstats (deterministic) or speedscope (sampling)"""
+    _require_profiling_token(http_request)
+    record = profiler.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    name = f"profile_{record.profile_id}"
+    if record.stats is not None:
+        return _profile_file(name, format, stats=record.stats)
+    return _profile_file(name, format, stacks=record.stacks, interval_ms=record.interval_ms)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("backend:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
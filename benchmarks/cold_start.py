@@ -0,0 +1,103 @@
+"""
+Cold-start cost of the backend: import time, time to healthy and the
+latency of the first requests a fresh worker serves.
+
+- import: `import backend` in a fresh interpreter, without a Gemini key
+  (google.generativeai is then never imported) and with a placeholder key
+  (what every import paid before the agents loaded it lazily)
+- startup: spawning uvicorn until /api/health answers, with and without the
+  lifespan warmup (STARTUP_WARMUP)
+- first requests: the instant-approval journey (intent, verify, underwrite,
+  sanction PDF) on the fresh worker, then the same journey again once warm
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from benchmarks.load_test import JOURNEYS, REPO_ROOT, _free_port, spawn_server
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import backend; print(time.perf_counter() - t)"
+
+
+def import_seconds(gemini_key):
+    env = dict(os.environ, GEMINI_API_KEY=gemini_key, MONGODB_URI="mongodb://127.0.0.1:1",
+               MONGODB_SERVER_SELECTION_TIMEOUT_MS="100", LOG_LEVEL="WARNING")
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def journey_ms(client, steps):
+    """Per-step latency (ms) of one journey on a new session"""
+    session_id = str(uuid.uuid4())
+    context, loan_intent, customer_info = {}, {}, {}
+    timings = {}
+    for step, message, check in steps:
+        payload = {"message": message, "session_id": session_id, "context": context,
+                   "loan_intent": loan_intent, "customer_info": customer_info}
+        started = time.perf_counter()
+        response = client.post("/api/chat", json=payload)
+        timings[step] = (time.perf_counter() - started) * 1000
+        response.raise_for_status()
+        result = response.json()
+        if not check(result):
+            raise RuntimeError(f"unexpected response at step {step!r}: {result.get('next_agent')}")
+        context = result.get("context") or {}
+        loan_intent = result.get("loan_intent") or loan_intent
+        customer_info = result.get("customer_info") or customer_info
+    return timings
+
+
+def cold_worker(warmup):
+    """(seconds to healthy, first-journey step ms, warm-journey step ms) of one fresh worker"""
+    workdir = tempfile.mkdtemp(prefix="cold_start_")
+    started = time.perf_counter()
+    process, base_url = spawn_server(_free_port(), workdir, {"STARTUP_WARMUP": "1" if warmup else "0"},
+                                     poll_interval=0.01)
+    healthy_s = time.perf_counter() - started
+    try:
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            steps = JOURNEYS["instant_approval"]
+            first = journey_ms(client, steps)
+            warm = journey_ms(client, steps)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return healthy_s, first, warm
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure backend import time, startup and first-request latency")
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per configuration (medians reported)")
+    args = parser.parse_args(argv)
+
+    print(f"{'import backend':<28} {'median ms':>10}")
+    for label, key in (("without GEMINI_API_KEY", ""), ("with GEMINI_API_KEY", "placeholder")):
+        samples = [import_seconds(key) * 1000 for _ in range(args.runs)]
+        print(f"{label:<28} {statistics.median(samples):>10.1f}")
+
+    steps = [step for step, _, _ in JOURNEYS["instant_approval"]]
+    print(f"\n{'worker':<12} {'healthy ms':>10} " + " ".join(f"{s + ' ms':>14}" for s in steps))
+    for warmup in (False, True):
+        runs = [cold_worker(warmup) for _ in range(args.runs)]
+        label = "warmup" if warmup else "no warmup"
+        healthy = statistics.median(r[0] for r in runs) * 1000
+        first = [statistics.median(r[1][s] for r in runs) for s in steps]
+        warm = [statistics.median(r[2][s] for r in runs) for s in steps]
+        print(f"{label:<12} {healthy:>10.1f} " + " ".join(f"{v:>14.1f}" for v in first))
+        print(f"{'  (warm)':<12} {'':>10} " + " ".join(f"{v:>14.1f}" for v in warm))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Perceived per-turn latency of the Streamlit frontend's backend calls.
+
+Plays the load-test journeys one turn at a time, the way a single user does
+in app.py, through three clients:
+
+- legacy: a bare `requests.post(..., timeout=30)` per turn (new connection
+  every time) followed by the `time.sleep(0.3)` app.py used before rerunning
+- unpooled: the same bare `requests.post` without the sleep, to separate
+  connection reuse from the removed sleep
+- pooled: `api_client.LoanAssistantClient` (keep-alive pool, no sleep)
+
+"Perceived" is what the user waits between sending a message and the rerun
+that shows the reply. Uses a spawned local backend unless --url is given:
+
+    python -m benchmarks.frontend_latency --rounds 20
+    python -m benchmarks.frontend_latency --url https://my-backend.example.com --rounds 5
+"""
+import argparse
+import sys
+import tempfile
+import time
+import uuid
+
+import requests
+
+from api_client import LoanAssistantClient
+from benchmarks.load_test import JOURNEYS, _free_port, percentile, spawn_server
+
+LEGACY_RERUN_SLEEP_S = 0.3
+
+
+def _unpooled_turn(base_url, payload):
+    return requests.post(f"{base_url}/api/chat", json=payload, timeout=30)
+
+
+def _legacy_turn(base_url, payload):
+    response = _unpooled_turn(base_url, payload)
+    time.sleep(LEGACY_RERUN_SLEEP_S)
+    return response
+
+
+def _pooled_turn(client):
+    return lambda base_url, payload: client.chat(payload)
+
+
+def play(base_url, turn, rounds):
+    """Sorted per-turn latencies (ms) of every journey, played `rounds` times"""
+    samples = []
+    for _ in range(rounds):
+        for steps in JOURNEYS.values():
+            session_id = str(uuid.uuid4())
+            context, loan_intent, customer_info = {}, {}, {}
+            for step, message, check in steps:
+                payload = {"message": message, "session_id": session_id, "context": context,
+                           "loan_intent": loan_intent, "customer_info": customer_info}
+                started = time.perf_counter()
+                response = turn(base_url, payload)
+                samples.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+                result = response.json()
+                if not check(result):
+                    raise RuntimeError(f"unexpected response at step {step!r}: {result.get('next_agent')}")
+                context = result.get("context") or {}
+                loan_intent = result.get("loan_intent") or loan_intent
+                customer_info = result.get("customer_info") or customer_info
+    return sorted(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-turn latency of the legacy and pooled frontend clients")
+    parser.add_argument("--url", help="existing backend URL (default: spawn a local one)")
+    parser.add_argument("--rounds", type=int, default=10, help="times each journey is played per client")
+    args = parser.parse_args(argv)
+
+    process = None
+    workdir = tempfile.mkdtemp(prefix="frontend_latency_")
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            process, base_url = spawn_server(_free_port(), workdir)
+        client = LoanAssistantClient(base_url)
+        client.health()  # warm the pool the way the first rerun would
+        results = {
+            "legacy": play(base_url, _legacy_turn, args.rounds),
+            "unpooled": play(base_url, _unpooled_turn, args.rounds),
+            "pooled": play(base_url, _pooled_turn(client), args.rounds),
+        }
+        client.close()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print(f"{'client':<9} {'turns':>6} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    for name, samples in results.items():
+        print(f"{name:<9} {len(samples):>6} {percentile(samples, 50):>9.1f} {percentile(samples, 95):>9.1f} "
+              f"{sum(samples) / len(samples):>9.1f}")
+    legacy, unpooled, pooled = (percentile(results[k], 50) for k in ("legacy", "unpooled", "pooled"))
+    print(f"\nperceived p50 per turn: {legacy:.1f} ms -> {pooled:.1f} ms ({(1 - pooled / legacy) * 100:.0f}% less); "
+          f"connection reuse alone: {unpooled:.1f} ms -> {pooled:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+End-to-end load test: replays complete loan journeys against /api/chat.
+
+Journeys follow the README test scenarios (instant approval + sanction PDF
+download, salary-slip pending then approval, credit-score rejection and
+over-2x rejection). Each virtual session runs one journey step by step,
+carrying `context` / `loan_intent` between turns exactly like app.py.
+
+By default a local backend is spawned with the deterministic fallback LLM
+(no GEMINI_API_KEY) and the in-memory database (unreachable MONGODB_URI):
+
+    python -m benchmarks.load_test --sessions 2000 --concurrency 500 --out results.json
+    python -m benchmarks.load_test --url http://localhost:8000 --sessions 200
+    python -m benchmarks.load_test --sessions 2000 --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _decision(result):
+    return result.get("context", {}).get("underwriting_result", {}).get("decision")
+
+
+# Each step: (step name, message, check(result) -> bool)
+JOURNEYS = {
+    "instant_approval": [
+        ("intent", "I need 3 lakh for 2 years", lambda r: r["context"].get("loan_intent", {}).get("amount") == 300000),
+        ("verify", "My phone is 9876543210", lambda r: r["context"].get("customer_id") == "CUST001"),
+        ("underwrite", "check eligibility", lambda r: _decision(r) == "approved"),
+        ("sanction", "Yes, generate sanction letter", lambda r: bool(r["context"].get("pdf_path"))),
+    ],
+    "salary_slip_approval": [
+        ("intent", "₹3.5 lakh for car", lambda r: r["context"].get("loan_intent", {}).get("amount") == 350000),
+        ("verify", "My phone is 9876543212", lambda r: r["context"].get("customer_id") == "CUST003"),
+        ("underwrite", "check eligibility", lambda r: _decision(r) == "pending"),
+        ("salary_slip", "I've uploaded my salary slip showing ₹75,000 monthly salary", lambda r: _decision(r) == "approved"),
+        ("sanction", "Yes, generate sanction letter", lambda r: bool(r["context"].get("pdf_path"))),
+    ],
+    "credit_rejection": [
+        ("intent", "I need 1 lakh", lambda r: r["context"].get("loan_intent", {}).get("amount") == 100000),
+        ("verify", "My number is 9876543214", lambda r: r["context"].get("customer_id") == "CUST005"),
+        ("underwrite", "check eligibility", lambda r: _decision(r) == "rejected"),
+    ],
+    "over_2x_rejection": [
+        ("intent", "I need 12 lakh", lambda r: r["context"].get("loan_intent", {}).get("amount") == 1200000),
+        ("verify", "My phone is 9876543210", lambda r: r["context"].get("customer_id") == "CUST001"),
+        ("underwrite", "check eligibility", lambda r: _decision(r) == "rejected"),
+    ],
+}
+
+# Journeys whose final step is followed by a PDF download
+DOWNLOAD_JOURNEYS = {"instant_approval"}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)   # (journey, step) -> [ms]
+        self.errors = defaultdict(int)       # (journey, step) -> count
+        self.error_samples = {}
+        self.completed_journeys = defaultdict(int)
+        self.failed_journeys = defaultdict(int)
+
+    def ok(self, journey, step, ms):
+        self.latencies[(journey, step)].append(ms)
+
+    def error(self, journey, step, ms, reason):
+        self.latencies[(journey, step)].append(ms)
+        self.errors[(journey, step)] += 1
+        self.error_samples.setdefault((journey, step), reason)
+
+
+async def run_session(client, journey_name, recorder):
+    session_id = str(uuid.uuid4())
+    context, loan_intent, customer_info = {}, {}, {}
+    result = None
+
+    for step, message, check in JOURNEYS[journey_name]:
+        payload = {
+            "message": message,
+            "session_id": session_id,
+            "context": context,
+            "loan_intent": loan_intent,
+            "customer_info": customer_info,
+        }
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/chat", json=payload)
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                recorder.error(journey_name, step, elapsed, f"HTTP {response.status_code}")
+                recorder.failed_journeys[journey_name] += 1
+                return
+            result = response.json()
+        except httpx.HTTPError as e:
+            recorder.error(journey_name, step, (time.perf_counter() - started) * 1000, type(e).__name__)
+            recorder.failed_journeys[journey_name] += 1
+            return
+
+        if not check(result):
+            recorder.error(journey_name, step, elapsed, f"unexpected response: next_agent={result.get('next_agent')}")
+            recorder.failed_journeys[journey_name] += 1
+            return
+        recorder.ok(journey_name, step, elapsed)
+
+        context = result.get("context") or {}
+        loan_intent = result.get("loan_intent") or loan_intent
+        customer_info = result.get("customer_info") or customer_info
+
+    if journey_name in DOWNLOAD_JOURNEYS:
+        filename = os.path.basename(context.get("pdf_path", ""))
+        started = time.perf_counter()
+        try:
+            response = await client.get(f"/api/download-pdf/{filename}")
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200 or not response.content.startswith(b"%PDF"):
+                recorder.error(journey_name, "download_pdf", elapsed, f"HTTP {response.status_code}")
+                recorder.failed_journeys[journey_name] += 1
+                return
+            recorder.ok(journey_name, "download_pdf", elapsed)
+        except httpx.HTTPError as e:
+            recorder.error(journey_name, "download_pdf", (time.perf_counter() - started) * 1000, type(e).__name__)
+            recorder.failed_journeys[journey_name] += 1
+            return
+
+    recorder.completed_journeys[journey_name] += 1
+
+
+async def run_load(base_url, sessions, concurrency, journeys, timeout):
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def one(i):
+            async with semaphore:
+                await run_session(client, journeys[i % len(journeys)], recorder)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(sessions)))
+        wall_s = time.perf_counter() - started
+    return recorder, wall_s
+
+
+def summarize(recorder, wall_s, config):
+    steps = {}
+    total_requests = total_errors = 0
+    for (journey, step), values in sorted(recorder.latencies.items()):
+        values.sort()
+        errors = recorder.errors.get((journey, step), 0)
+        total_requests += len(values)
+        total_errors += errors
+        steps[f"{journey}.{step}"] = {
+            "requests": len(values),
+            "errors": errors,
+            "error_rate": errors / len(values),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "max_ms": round(values[-1], 3),
+            "first_error": recorder.error_samples.get((journey, step)),
+        }
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": config,
+        "wall_seconds": round(wall_s, 3),
+        "requests": total_requests,
+        "throughput_rps": round(total_requests / wall_s, 2) if wall_s else None,
+        "error_rate": total_errors / total_requests if total_requests else 0.0,
+        "journeys": {
+            name: {"completed": recorder.completed_journeys.get(name, 0),
+                   "failed": recorder.failed_journeys.get(name, 0)}
+            for name in config["journeys"]
+        },
+        "steps": steps,
+    }
+
+
+def print_report(summary, baseline=None):
+    print(f"\nCommit {summary['commit']} | {summary['requests']} requests in {summary['wall_seconds']}s "
+          f"| {summary['throughput_rps']} req/s | error rate {summary['error_rate']:.2%}")
+    header = f"{'step':<38}{'n':>7}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}"
+    if baseline:
+        header += f"{'Δp95':>10}"
+    print(header)
+    for name, s in summary["steps"].items():
+        line = f"{name:<38}{s['requests']:>7}{s['error_rate'] * 100:>6.1f}%{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}"
+        if baseline and name in baseline.get("steps", {}):
+            before = baseline["steps"][name]["p95_ms"]
+            line += f"{(s['p95_ms'] - before) / before * 100 if before else 0:>+9.1f}%"
+        print(line)
+    if baseline:
+        print(f"Throughput: {baseline.get('throughput_rps')} -> {summary['throughput_rps']} req/s "
+              f"(baseline commit {baseline.get('commit')})")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(port, workdir, extra_env=None, poll_interval=0.2):
+    """Local backend with fallback LLM and in-memory DB; PDFs/spools land in workdir"""
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_KEY": "",
+        "MONGODB_URI": "mongodb://127.0.0.1:1",
+        "MONGODB_SERVER_SELECTION_TIMEOUT_MS": "100",
+        "MONGODB_PROBE_INTERVAL": "3600",
+        "LOG_LEVEL": "WARNING",
+    })
+    env.update(extra_env or {})
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend:app", "--app-dir", REPO_ROOT,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=workdir, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("backend exited during startup")
+        try:
+            if httpx.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(poll_interval)
+    process.terminate()
+    raise RuntimeError("backend did not become healthy within 30s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay full loan journeys against /api/chat")
+    parser.add_argument("--url", help="existing backend URL (default: spawn a local one)")
+    parser.add_argument("--sessions", type=int, default=1000, help="virtual sessions (one journey each)")
+    parser.add_argument("--concurrency", type=int, default=200, help="max sessions in flight")
+    parser.add_argument("--journeys", default=",".join(JOURNEYS), help="comma-separated journey mix")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--out", help="write JSON results here")
+    parser.add_argument("--compare", help="baseline JSON results to diff against")
+    args = parser.parse_args(argv)
+
+    journeys = [j.strip() for j in args.journeys.split(",") if j.strip()]
+    unknown = set(journeys) - set(JOURNEYS)
+    if unknown:
+        parser.error(f"unknown journeys: {', '.join(sorted(unknown))}")
+
+    process = None
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            process, base_url = spawn_server(_free_port(), workdir)
+
+        recorder, wall_s = asyncio.run(
+            run_load(base_url, args.sessions, args.concurrency, journeys, args.timeout))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    config = {"url": args.url or "spawned", "sessions": args.sessions,
+              "concurrency": args.concurrency, "journeys": journeys}
+    summary = summarize(recorder, wall_s, config)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(summary, baseline)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    return 1 if summary["error_rate"] > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+"""
+Microbenchmarks for the agent hot paths.
+
+A small pytest-benchmark-style runner: each case is calibrated so one round
+takes ~`--round-time`, warmed up, then timed for `--rounds` rounds. Results
+(min / median / mean / stddev / ops per second) are printed and can be saved
+as JSON; `--compare` fails the run when any case's median regresses by more
+than `--threshold` percent.
+
+    python -m benchmarks.microbench
+    python -m benchmarks.microbench --out bench.json
+    python -m benchmarks.microbench --compare bench.json --threshold 10
+    python -m benchmarks.microbench -k underwriting
+"""
+import argparse
+import contextlib
+import inspect
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the benchmark hermetic: fallback LLM, in-memory DB unless MONGODB_URI is set
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("MONGODB_URI", "mongodb://127.0.0.1:1")
+os.environ.setdefault("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "500")
+
+BENCHMARKS = []
+
+
+def bench(name, group):
+    """
+    Register `setup() -> callable` as a benchmark case. A setup that patches
+    shared state can instead be a generator: it yields the callable, and the
+    code after the yield restores the state once the case has run.
+    """
+    def decorator(setup):
+        BENCHMARKS.append({"name": name, "group": group, "setup": setup})
+        return setup
+    return decorator
+
+
+class Skip(Exception):
+    pass
+
+
+def run_case(fn, rounds, warmup_rounds, round_time):
+    # Calibrate: grow the per-round iteration count until a round is long enough
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= round_time or iterations >= 1_000_000:
+            break
+        iterations = max(iterations * 2, int(iterations * round_time / max(elapsed, 1e-9)))
+
+    for _ in range(warmup_rounds):
+        for _ in range(iterations):
+            fn()
+
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        samples.append((time.perf_counter() - started) / iterations)
+
+    return {
+        "iterations": iterations,
+        "rounds": rounds,
+        "min_us": min(samples) * 1e6,
+        "median_us": statistics.median(samples) * 1e6,
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "stddev_us": (statistics.stdev(samples) if len(samples) > 1 else 0.0) * 1e6,
+        "ops_per_sec": 1 / statistics.median(samples),
+    }
+
+
+# ----------------------------------------------------------------------
+# CASES
+# ----------------------------------------------------------------------
+def _seeded_db():
+    from services.database import db
+    db.seed_initial_data()
+    return db
+
+
+def _request(message, context=None, amount=None, tenure=None):
+    from models.schemas import AgentRequest, LoanIntent
+    intent = LoanIntent(amount=amount, tenure=tenure) if amount else None
+    return AgentRequest(message=message, session_id="bench", context=context or {}, loan_intent=intent)
+
+
+@bench("extract_loan_intent", "master")
+def _():
+    from agents.master_agent import MasterAgent
+    agent = MasterAgent()
+    messages = ["I need 3.5 lakh for car over 2 years", "₹3,50,000 for wedding", "hello there", "75k for 18 months"]
+
+    def fn():
+        for m in messages:
+            agent.extract_loan_intent(m, None)
+    return fn
+
+
+@bench("determine_next_agent", "master")
+def _():
+    from agents.master_agent import MasterAgent
+    agent = MasterAgent()
+    cases = [
+        ("My phone is 9876543210", {}),
+        ("check eligibility", {}),
+        ("Yes, generate sanction letter", {"customer_id": "CUST001", "underwriting_result": {"decision": "approved"}}),
+        ("I need a personal loan", {}),
+    ]
+
+    def fn():
+        for message, context in cases:
+            agent.determine_next_agent(message, context, None)
+    return fn
+
+
+@bench("calculate_emi", "underwriting")
+def _():
+    from agents.underwriting_agent import UnderwritingAgent
+    agent = UnderwritingAgent()
+    return lambda: agent.calculate_emi(350000, 14.0, 24)
+
+
+@bench("underwriting_rules.evaluate", "underwriting")
+def _():
+    from services.underwriting_rules import underwriting_rules
+    rules = underwriting_rules.current()
+    facts = {"loan_amount": 350000.0, "tenure": 24, "credit_score": 680, "preapproved_limit": 200000,
+             "salary": 75000, "verified_salary": 75000, "salary_slip_verified": True, "interest_rate": 14.0,
+             "emi": 16804.5}
+    return lambda: rules.evaluate(**facts)
+
+
+@bench("underwriting.what_if", "underwriting")
+def _():
+    from agents.underwriting_agent import UnderwritingAgent
+    _seeded_db()
+    agent = UnderwritingAgent()
+    return lambda: agent.what_if("CUST003", tenures=[12, 24, 36, 48, 60])
+
+
+def _underwriting_case(message, context, amount, cached=False):
+    def setup():
+        from agents.underwriting_agent import UnderwritingAgent
+        from services.decision_cache import UNDERWRITING_CACHE_TTL_SECONDS, decision_cache
+        _seeded_db()
+        # Uncached cases measure the full path: rule chain, EMI and rendering every call
+        decision_cache.ttl = UNDERWRITING_CACHE_TTL_SECONDS if cached else 0
+        decision_cache.clear()
+        agent = UnderwritingAgent()
+        request = _request(message, context, amount=amount, tenure=24)
+        return lambda: agent.process(request)
+    return setup
+
+
+bench("underwriting.process[approved]", "underwriting")(
+    _underwriting_case("check eligibility", {"customer_id": "CUST001"}, 300000))
+bench("underwriting.process[pending]", "underwriting")(
+    _underwriting_case("check eligibility", {"customer_id": "CUST003"}, 350000))
+bench("underwriting.process[rejected]", "underwriting")(
+    _underwriting_case("check eligibility", {"customer_id": "CUST005"}, 100000))
+bench("underwriting.process[pending, cached]", "underwriting")(
+    _underwriting_case("what else do you need?", {"customer_id": "CUST003"}, 350000, cached=True))
+
+
+@bench("verification.process[memory]", "verification")
+def _():
+    from unittest import mock
+    import agents.verification_agent as verification_module
+    from agents.verification_agent import VerificationAgent
+    from services.database import MongoDB, SEED_CUSTOMERS
+    memory_db = MongoDB()
+    memory_db.get_collection("customers").upsert_many(SEED_CUSTOMERS, "customer_id")
+    with mock.patch.object(verification_module, "db", memory_db):
+        agent = VerificationAgent()
+        request = _request("My phone is 9876543214", amount=300000)
+        yield lambda: agent.process(request)
+
+
+@bench("verification.process[mongo]", "verification")
+def _():
+    from unittest import mock
+    import agents.verification_agent as verification_module
+    from agents.verification_agent import VerificationAgent
+    from services.database import MongoDB
+    mongo_db = MongoDB()
+    if not mongo_db.wait_connected(timeout=2):
+        mongo_db.stop()
+        raise Skip("MongoDB not reachable (set MONGODB_URI)")
+    mongo_db.seed_initial_data()
+    try:
+        with mock.patch.object(verification_module, "db", mongo_db):
+            agent = VerificationAgent()
+            request = _request("My phone is 9876543214", amount=300000)
+            yield lambda: agent.process(request)
+    finally:
+        mongo_db.stop()
+
+
+def _find_one_case(size):
+    def setup():
+        from services.database import InMemoryCollection
+        from services.data_generator import CustomerBookGenerator
+        storage = {}
+        collection = InMemoryCollection(storage, "customers")
+        customers = [c for c, _ in CustomerBookGenerator(seed=1).generate(size)]
+        collection.upsert_many(customers, "customer_id")
+        # Worst case for the linear scan: the last-inserted customer's phone
+        query = {"phone": customers[-1]["phone"]}
+        return lambda: collection.find_one(query)
+    return setup
+
+
+for _size in (10, 1_000, 100_000):
+    bench(f"in_memory.find_one[phone,n={_size}]", "database")(_find_one_case(_size))
+
+
+@bench("generate_sanction_letter_pdf", "sanction")
+def _():
+    from models.schemas import SanctionLetter
+    from services.pdf_generator import generate_sanction_letter_pdf
+    letter = SanctionLetter(
+        customer_name="Rahul Sharma", loan_amount=300000, tenure=24, interest_rate=12.5,
+        emi=14192.22, sanction_date="01-01-2024", validity_date="31-01-2024",
+        reference_number="TCL/202401/BENCH001",
+    )
+    output_path = os.path.join(tempfile.mkdtemp(prefix="bench_pdf_"), "letter.pdf")
+    return lambda: generate_sanction_letter_pdf(letter, output_path)
+
+
+def _render_case(key, **values):
+    def setup():
+        from services.message_templates import messages
+        template = messages.get(key)
+        return lambda: template.render(**values)
+    return setup
+
+
+bench("template.render[underwriting.approved]", "templates")(_render_case(
+    "underwriting.approved", loan_amount=300000.0, tenure=24, interest_rate=12.5,
+    emi_lines="• EMI: ₹14,192.19/month\n• Total Payable: ₹340,612.56\n", credit_score=785, score_badge="✅",
+    preapproved_limit=500000, reason="Loan amount within pre-approved limit of ₹500,000", salary_slip_lines=""))
+bench("template.render[sanction.generated]", "templates")(_render_case(
+    "sanction.generated", customer_name="Rahul Sharma", reference_number="TCL/202401/BENCH001",
+    loan_amount=300000.0, emi=14192.19, tenure=24, tenure_years=2, interest_rate=12.5,
+    sanction_date="01-01-2024", validity_date="31-01-2024", pdf_status="✅ ready",
+    processing_fee=4500.0, net_disbursement=295500.0))
+
+
+@bench("template.lookup+render[hi fallback]", "templates")
+def _():
+    from services.message_templates import messages
+    return lambda: messages.render("underwriting.customer_not_found", "hi")
+
+
+def _turn_payload():
+    return {
+        "message": "My phone is 9876543210",
+        "session_id": "bench",
+        "loan_intent": {"amount": 300000, "tenure": 24},
+        "context": {"agent": "sales", "amount_confirmed": True,
+                    "conversation_history": [{"role": "user", "content": "I need 3 lakh"}] * 6},
+    }
+
+
+def _master_turn_case(payload):
+    def setup():
+        from agents.master_agent import MasterAgent
+        from models.schemas import AgentRequest
+        _seeded_db()
+        agent = MasterAgent()
+        request = AgentRequest(**payload)
+        return lambda: agent.process(request)
+    return setup
+
+
+bench("master.process[verification turn]", "master")(_master_turn_case(_turn_payload()))
+
+
+@bench("request.validate", "pydantic")
+def _():
+    from models.schemas import AgentRequest
+    payload = _turn_payload()
+    return lambda: AgentRequest(**payload)
+
+
+def _turn_response():
+    from agents.master_agent import MasterAgent
+    from models.schemas import AgentRequest
+    _seeded_db()
+    return MasterAgent().process(AgentRequest(**_turn_payload()))
+
+
+@bench("response.serialize[fastapi response_model]", "pydantic")
+def _():
+    # What FastAPI does with a returned model: validate against response_model,
+    # dump to JSON-compatible python, then json.dumps in JSONResponse.render
+    from fastapi.responses import JSONResponse
+    from fastapi.utils import create_response_field
+    from models.schemas import AgentResponse
+    field = create_response_field(name="response", type_=AgentResponse, mode="serialization")
+    response = _turn_response()
+
+    def fn():
+        value, _ = field.validate(response, {}, loc=("response",))
+        JSONResponse(field.serialize(value))
+    return fn
+
+
+@bench("response.serialize[model_dump_json]", "pydantic")
+def _():
+    from fastapi.responses import Response
+    response = _turn_response()
+    return lambda: Response(response.model_dump_json(), media_type="application/json")
+
+
+# ----------------------------------------------------------------------
+# RUNNER
+# ----------------------------------------------------------------------
+def compare(results, baseline, threshold):
+    """Return [(name, before_us, after_us, pct)] for cases slower than threshold %"""
+    regressions = []
+    for name, after in results.items():
+        before = baseline.get("benchmarks", {}).get(name)
+        if not before:
+            continue
+        pct = (after["median_us"] - before["median_us"]) / before["median_us"] * 100
+        after["delta_pct"] = pct
+        if pct > threshold:
+            regressions.append((name, before["median_us"], after["median_us"], pct))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Agent hot-path microbenchmarks")
+    parser.add_argument("-k", dest="keyword", help="only run cases whose name or group contains this")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--warmup-rounds", type=int, default=3)
+    parser.add_argument("--round-time", type=float, default=0.05, help="target seconds per round")
+    parser.add_argument("--out", help="write JSON results here")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=10.0, help="max allowed median slowdown in %%")
+    args = parser.parse_args(argv)
+    # Agent warnings (missing Gemini key, Mongo fallback) would interleave with the table
+    logging.disable(logging.WARNING)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    print(f"{'benchmark':<40}{'median':>12}{'min':>12}{'stddev':>12}{'ops/s':>14}" + ("   Δ median" if baseline else ""))
+    for case in BENCHMARKS:
+        if args.keyword and args.keyword not in case["name"] and args.keyword not in case["group"]:
+            continue
+        with contextlib.ExitStack() as teardown:
+            try:
+                fn = case["setup"]()
+                if inspect.isgenerator(fn):
+                    teardown.enter_context(contextlib.closing(fn))  # runs the code after the yield
+                    fn = next(fn)
+            except Skip as e:
+                print(f"{case['name']:<40}  skipped: {e}")
+                continue
+            result = run_case(fn, args.rounds, args.warmup_rounds, args.round_time)
+        result["group"] = case["group"]
+        results[case["name"]] = result
+
+        line = (f"{case['name']:<40}{result['median_us']:>10.2f}us{result['min_us']:>10.2f}us"
+                f"{result['stddev_us']:>10.2f}us{result['ops_per_sec']:>14,.0f}")
+        before = baseline.get("benchmarks", {}).get(case["name"]) if baseline else None
+        if before:
+            line += f"{(result['median_us'] - before['median_us']) / before['median_us'] * 100:>+10.1f}%"
+        print(line)
+
+    if args.out:
+        try:
+            commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                    capture_output=True, text=True).stdout.strip() or None
+        except OSError:
+            commit = None
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "python": platform.python_version(), "benchmarks": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} benchmark(s) regressed by more than {args.threshold}%:")
+            for name, before, after, pct in regressions:
+                print(f"   {name}: {before:.2f}us -> {after:.2f}us ({pct:+.1f}%)")
+            return 1
+        print(f"\n✅ No regressions above {args.threshold}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+Deterministic replay of recorded /api/chat traffic.
+
+Replays a log written by `services/traffic_recorder.py` through an
+in-process MasterAgent (in-memory database, seeded data), back to back, so a
+day of traffic replays in seconds. Non-determinism is pinned per turn:
+
+- LLM calls return a stable stand-in derived from the prompt
+- `random` is reseeded per turn (credit-score variation in the mock bureau)
+- the sanction clock is frozen at the turn's recorded timestamp, and
+  reference-number UUIDs come from a per-turn seeded generator
+
+Each turn's routing (next_agent / agent), resolved customer and underwriting
+decision are compared to the recording; any difference is a divergence.
+Response text differences are listed separately since recorded turns may
+have used the real LLM.
+
+    python -m benchmarks.replay traffic/chat.jsonl.gz
+    python -m benchmarks.replay traffic/chat.jsonl.gz --out replay.json
+    python -m benchmarks.replay traffic/chat.jsonl.gz --baseline replay.json   # latency vs. a previous build
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+# In-memory database and no real LLM, whatever the local .env says
+os.environ["GEMINI_API_KEY"] = ""
+os.environ["MONGODB_URI"] = "mongodb://127.0.0.1:1"
+os.environ.setdefault("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "500")
+
+from benchmarks.load_test import percentile  # noqa: E402
+from services.traffic_recorder import PHONE_TOKEN_RE, message_digest, read_log  # noqa: E402
+
+BEHAVIOR_FIELDS = ("next_agent", "agent", "customer_id", "decision")
+
+
+class _StandInResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StandInLLM:
+    """Replaces `genai.GenerativeModel`; same prompt, same text"""
+
+    def generate_content(self, prompt):
+        digest = hashlib.blake2b(prompt.encode(), digest_size=4).hexdigest()
+        return _StandInResponse(f"Happy to help with your loan. [replay:{digest}]")
+
+
+def _frozen_datetime(timestamp):
+    frozen = datetime.fromtimestamp(timestamp)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return frozen if tz is None else frozen.astimezone(tz)
+
+    return FrozenDatetime
+
+
+class DeterministicTurn:
+    """Pins LLM, randomness, clock and UUIDs for the duration of one turn"""
+
+    def __init__(self, master_agent, modules):
+        self.master_agent = master_agent
+        self.modules = modules
+        self.llm = StandInLLM()
+        for agent in (master_agent, master_agent.sales_agent, master_agent.verification_agent,
+                      master_agent.underwriting_agent, master_agent.sanction_agent):
+            agent.model = self.llm
+
+    def pin(self, turn_key, timestamp):
+        seed = int.from_bytes(hashlib.blake2b(turn_key.encode(), digest_size=8).digest(), "big")
+        random.seed(seed)
+        uuid_rng = random.Random(seed)
+        fake_uuid = types.SimpleNamespace(uuid4=lambda: uuid.UUID(int=uuid_rng.getrandbits(128), version=4))
+        frozen = _frozen_datetime(timestamp)
+        for module in self.modules:
+            if hasattr(module, "datetime"):
+                module.datetime = frozen
+            if hasattr(module, "uuid"):
+                module.uuid = fake_uuid
+
+
+def resolve_phones(turns, database):
+    """Map each `<phone:HASH>` token to the seeded phone of the customer it verified as"""
+    token_customer = {}
+    for turn in turns:
+        customer_id = turn["out"].get("customer_id")
+        if customer_id:
+            for token in PHONE_TOKEN_RE.findall(json.dumps(turn["req"])):
+                token_customer.setdefault(token, customer_id)
+
+    customers = database.get_collection("customers")
+    phones = {}
+    for token, customer_id in token_customer.items():
+        customer = customers.find_one({"customer_id": customer_id})
+        if customer and customer.get("phone"):
+            phones[token] = customer["phone"]
+    return phones
+
+
+def restore(value, phones):
+    if isinstance(value, str):
+        return PHONE_TOKEN_RE.sub(lambda m: phones.get(m.group(1), m.group()), value)
+    if isinstance(value, dict):
+        return {k: restore(v, phones) for k, v in value.items()}
+    if isinstance(value, list):
+        return [restore(v, phones) for v in value]
+    return value
+
+
+def outcome(response):
+    context = response.context or {}
+    return {
+        "next_agent": response.next_agent.value if response.next_agent else None,
+        "agent": context.get("agent"),
+        "customer_id": context.get("customer_id"),
+        "decision": (context.get("underwriting_result") or {}).get("decision"),
+        "digest": message_digest(response.message),
+    }
+
+
+def replay(path, seed_dir=None, limit=None):
+    from agents.master_agent import MasterAgent
+    import agents.sanction_agent as sanction_module
+    import services.pdf_generator as pdf_module
+    from models.schemas import AgentRequest
+    from services.database import db
+
+    db.seed_initial_data(seed_dir=seed_dir)
+    turns = list(read_log(path))[:limit]
+    phones = resolve_phones(turns, db)
+
+    master_agent = MasterAgent()
+    pins = DeterministicTurn(master_agent, [sanction_module, pdf_module])
+
+    results = []
+    per_session = defaultdict(int)
+    started = time.perf_counter()
+    for turn in turns:
+        session_id = turn["sid"]
+        index = per_session[session_id]
+        per_session[session_id] += 1
+        pins.pin(f"{session_id}:{index}", turn["ts"])
+
+        request = AgentRequest(**restore(turn["req"], phones))
+        turn_started = time.perf_counter()
+        response = master_agent.process(request)
+        replay_ms = (time.perf_counter() - turn_started) * 1000
+
+        replayed = outcome(response)
+        recorded = turn["out"]
+        results.append({
+            "session_id": session_id,
+            "turn": index,
+            "agent": recorded.get("agent") or recorded.get("next_agent"),
+            "recorded_ms": turn["ms"],
+            "replay_ms": round(replay_ms, 3),
+            "divergences": {
+                field: [recorded.get(field), replayed[field]]
+                for field in BEHAVIOR_FIELDS if recorded.get(field) != replayed[field]
+            },
+            "text_changed": recorded.get("digest") != replayed["digest"],
+        })
+    replay_seconds = time.perf_counter() - started
+
+    recorded_seconds = 0.0
+    if turns:
+        recorded_seconds = (turns[-1]["ts"] - turns[0]["ts"]) + turns[-1]["ms"] / 1000
+    return results, recorded_seconds, replay_seconds
+
+
+def latency_by_agent(results, key):
+    by_agent = defaultdict(list)
+    for r in results:
+        by_agent[r["agent"]].append(r[key])
+    return {agent: sorted(values) for agent, values in by_agent.items()}
+
+
+def print_report(results, recorded_seconds, replay_seconds, baseline=None):
+    speedup = recorded_seconds / replay_seconds if replay_seconds else float("inf")
+    print(f"Replayed {len(results)} turns in {replay_seconds:.2f}s "
+          f"(recorded span {recorded_seconds:.1f}s, {speedup:,.0f}x real time)\n")
+
+    reference_key, reference_label = "recorded_ms", "recorded"
+    if baseline is not None:
+        reference = {(r["session_id"], r["turn"]): r["replay_ms"] for r in baseline["turns"]}
+        for r in results:
+            r["baseline_ms"] = reference.get((r["session_id"], r["turn"]))
+        results_with_ref = [r for r in results if r["baseline_ms"] is not None]
+        reference_key, reference_label = "baseline_ms", "baseline"
+    else:
+        results_with_ref = results
+
+    before = latency_by_agent(results_with_ref, reference_key)
+    after = latency_by_agent(results_with_ref, "replay_ms")
+    if not after:
+        print("No turns to compare")
+    print(f"{'agent':<16}{'turns':>7}{reference_label + ' p50':>16}{'replay p50':>13}"
+          f"{reference_label + ' p95':>16}{'replay p95':>13}{'Δp95':>9}")
+    for agent in sorted(after, key=str):
+        b50, b95 = percentile(before[agent], 50), percentile(before[agent], 95)
+        a50, a95 = percentile(after[agent], 50), percentile(after[agent], 95)
+        delta = f"{(a95 - b95) / b95 * 100:+.1f}%" if b95 else "n/a"
+        print(f"{str(agent):<16}{len(after[agent]):>7}{b50:>14.2f}ms{a50:>11.2f}ms"
+              f"{b95:>14.2f}ms{a95:>11.2f}ms{delta:>9}")
+
+    diverged = [r for r in results if r["divergences"]]
+    text_changed = sum(1 for r in results if r["text_changed"] and not r["divergences"])
+    print(f"\nRouting/decision divergences: {len(diverged)}   text-only changes: {text_changed}")
+    for r in diverged[:50]:
+        fields = ", ".join(f"{f}: {old!r} -> {new!r}" for f, (old, new) in r["divergences"].items())
+        print(f"  {r['session_id']} turn {r['turn']}: {fields}")
+    if len(diverged) > 50:
+        print(f"  ... {len(diverged) - 50} more (see --out)")
+    return diverged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded /api/chat traffic deterministically")
+    parser.add_argument("log", help="traffic log written by TRAFFIC_RECORD_PATH")
+    parser.add_argument("--seed-dir", help="seed customers/offers from this directory (see SEED_DIR)")
+    parser.add_argument("--limit", type=int, help="replay only the first N turns")
+    parser.add_argument("--out", help="write per-turn results as JSON")
+    parser.add_argument("--baseline", help="previous --out file to diff replay latency against")
+    parser.add_argument("--max-divergences", type=int, default=0,
+                        help="exit non-zero when more turns than this diverge")
+    args = parser.parse_args(argv)
+
+    log_path = os.path.abspath(args.log)
+    seed_dir = os.path.abspath(args.seed_dir) if args.seed_dir else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    logging.disable(logging.WARNING)
+    # Sanction PDFs and audit spools land in a scratch directory
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="replay_"))
+    try:
+        results, recorded_seconds, replay_seconds = replay(log_path, seed_dir, args.limit)
+    finally:
+        os.chdir(cwd)
+
+    diverged = print_report(results, recorded_seconds, replay_seconds, baseline)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"log": args.log, "replay_seconds": replay_seconds,
+                       "recorded_seconds": recorded_seconds, "turns": results}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+    return 1 if len(diverged) > args.max_divergences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Byte-for-byte check of agent messages against recorded golden output.
+
+Runs the verification, underwriting and sanction agents through a fixed set
+of scenarios (seeded data, frozen clock and reference numbers) and compares
+every message with `benchmarks/golden/messages.json`. Use it after touching
+`templates/messages/*.json` or agent message code:
+
+    python -m benchmarks.template_check              # exit 1 on any difference
+    python -m benchmarks.template_check --locale hi  # render only, print Hindi messages
+    python -m benchmarks.template_check --update     # re-record the golden file
+"""
+import argparse
+import difflib
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from benchmarks.replay import DeterministicTurn  # noqa: E402  (pins env for an in-memory run)
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "messages.json")
+FROZEN_TS = 1704067200.0  # 2024-01-01
+
+VERIFICATION = [
+    ("verified_with_amount", "My phone is 9876543210", 300000),
+    ("verified_without_amount", "My phone is 9876543210", None),
+    ("kyc_pending_with_amount", "My phone is 9876543212", 350000),
+    ("kyc_pending_without_amount", "My phone is 9876543212", None),
+    ("not_found", "My phone is 9000000001", 300000),
+    ("phone_required", "verify me", 300000),
+]
+
+UNDERWRITING = [
+    ("approved", "check eligibility", {"customer_id": "CUST001"}, 300000),
+    ("approved_salary_slip", "I've uploaded my salary slip", {"customer_id": "CUST003"}, 350000),
+    ("pending", "check eligibility", {"customer_id": "CUST003"}, 350000),
+    ("rejected_credit_score", "check eligibility", {"customer_id": "CUST005"}, 100000),
+    ("rejected_over_2x", "check eligibility", {"customer_id": "CUST001"}, 1200000),
+    ("customer_id_required", "check eligibility", {}, 300000),
+    ("amount_required", "check eligibility", {"customer_id": "CUST001"}, None),
+    ("customer_not_found", "check eligibility", {"customer_id": "CUST999"}, 300000),
+]
+
+SANCTION = [
+    ("sanctioned", {"approved_amount": 300000.0, "tenure": 24, "emi": 14192.19, "interest_rate": 12.5,
+                    "verification_result": {"details": {"name": "Rahul Sharma"}}}),
+    ("sanctioned_defaults", {}),
+]
+
+
+def render_all(locale=None):
+    from agents.master_agent import MasterAgent
+    import agents.sanction_agent as sanction_module
+    import services.pdf_generator as pdf_module
+    from models.schemas import AgentRequest, LoanIntent
+    from services.database import db
+
+    db.seed_initial_data()
+    master = MasterAgent()
+    pins = DeterministicTurn(master, [sanction_module, pdf_module])
+
+    def request(message, context, amount):
+        context = dict(context)
+        if locale:
+            context["locale"] = locale
+        intent = LoanIntent(amount=amount, tenure=24) if amount else None
+        return AgentRequest(message=message, session_id="golden", context=context, loan_intent=intent)
+
+    messages = {}
+    for name, message, amount in VERIFICATION:
+        pins.pin(f"verification.{name}", FROZEN_TS)
+        response = master.verification_agent.process(request(message, {}, amount))
+        messages[f"verification.{name}"] = response.message
+    for name, message, context, amount in UNDERWRITING:
+        pins.pin(f"underwriting.{name}", FROZEN_TS)
+        response = master.underwriting_agent.process(request(message, context, amount))
+        messages[f"underwriting.{name}"] = response.message
+    for name, context in SANCTION:
+        pins.pin(f"sanction.{name}", FROZEN_TS)
+        response = master.sanction_agent.process(request("yes, generate sanction letter", context, None))
+        messages[f"sanction.{name}"] = response.message
+    return messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare agent messages with the golden file")
+    parser.add_argument("--update", action="store_true", help="re-record the golden file")
+    parser.add_argument("--locale", help="render in this locale and print instead of comparing")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="template_check_"))  # sanction PDFs
+    try:
+        messages = render_all(args.locale)
+    finally:
+        os.chdir(cwd)
+
+    if args.locale:
+        for name, message in messages.items():
+            print(f"--- {name}\n{message}\n")
+        return 0
+
+    if args.update:
+        os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            json.dump(messages, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Recorded {len(messages)} messages to {GOLDEN_PATH}")
+        return 0
+
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+
+    failures = 0
+    for name, expected in golden.items():
+        actual = messages.get(name)
+        if actual == expected:
+            continue
+        failures += 1
+        print(f"❌ {name}")
+        diff = difflib.unified_diff(expected.splitlines(), (actual or "").splitlines(),
+                                    "golden", "rendered", lineterm="")
+        print("\n".join(f"   {line}" for line in diff))
+    print(f"{len(golden) - failures}/{len(golden)} messages byte-identical")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Streamlit script execution time against conversation length.
+
+Every interaction reruns app.py top to bottom, so the cost of one rerun with
+N messages in `st.session_state.messages` is what a user waits for on every
+click in a long session. This runs app.py headless through Streamlit's
+AppTest with synthetic conversations of increasing length (no backend call
+is made on a plain rerun) and reports the median rerun time and the number
+of elements the script emitted:
+
+    python -m benchmarks.ui_render
+    python -m benchmarks.ui_render --lengths 10,60,200 --reruns 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AGENT_TURNS = [
+    ("I need 3 lakh for 2 years", "sales",
+     "Great! I see you're interested in ₹3 lakh. To check your eligibility, I'll need your registered phone number.\n\n"
+     "**Just to confirm:**\n• Loan Amount: ₹3 lakh (₹300,000)\n• Tenure: 24 months (2 years)", {}),
+    ("My phone is 9876543210", "verification",
+     "✅ **Verification Successful!**\n\n**Customer Details:**\n• Name: Rahul Sharma\n• City: Mumbai\n• KYC Status: Verified",
+     {"customer_id": "CUST001"}),
+    ("check eligibility", "underwriting",
+     "🎉 **Congratulations! Your loan is APPROVED!**\n\n**Loan Details:**\n• Amount: ₹300,000\n• Tenure: 24 months\n"
+     "• Interest Rate: 12.5% p.a.\n• Monthly EMI: ₹14,192.19",
+     {"decision": "approved", "credit_score": 780, "preapproved_limit": 500000, "emi": 14192.19,
+      "salary": 85000, "interest_rate": 12.5}),
+    ("Yes, generate sanction letter", "sanction",
+     "📜 **Sanction Letter Generated!**\n\n**Reference Number:** TC2024BENCH\n\nYour PDF is ready to download.",
+     {"reference_number": "TC2024BENCH"}),
+]
+
+
+def conversation(length, pdf_path):
+    messages = []
+    while len(messages) < length:
+        for user, agent, reply, metadata in AGENT_TURNS:
+            metadata = dict(metadata, agent=agent)
+            if agent == "sanction":
+                metadata["pdf_path"] = pdf_path
+                metadata["reference_number"] = f"TC2024BENCH{len(messages)}"
+            messages.append({"role": "user", "content": user})
+            messages.append({"role": "assistant", "content": reply, "metadata": metadata})
+    return messages[:length]
+
+
+def _element_count(node):
+    children = getattr(node, "children", None)
+    if not children:
+        return 1
+    return 1 + sum(_element_count(child) for child in children.values())
+
+
+def _fine_grained_wait(runner, timeout=3):
+    """AppTest polls for script completion every 100ms; poll every 1ms so timings resolve"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if runner.script_stopped():
+            return
+        time.sleep(0.001)
+    runner.request_stop()
+    raise RuntimeError(f"app.py run timed out after {timeout}s")
+
+
+def measure(length, reruns, pdf_path):
+    from streamlit.testing.v1 import AppTest, local_script_runner
+
+    local_script_runner.require_widgets_deltas = _fine_grained_wait
+    app = AppTest.from_file(os.path.join(REPO_ROOT, "app.py"), default_timeout=30)
+    app.run()  # first run initializes session state
+    app.session_state["messages"] = conversation(length, pdf_path)
+    app.session_state["context"] = {"conversation_summary": "Customer: earlier turns"}
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"app.py raised: {app.exception[0].message}")
+
+    timings = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        app.run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), min(timings), _element_count(app._tree)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time app.py reruns against conversation length")
+    parser.add_argument("--lengths", default="0,10,30,60,120,240", help="comma-separated message counts")
+    parser.add_argument("--reruns", type=int, default=10, help="timed reruns per length")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, REPO_ROOT)
+    os.environ.setdefault("API_BASE_URL", "http://127.0.0.1:9")  # never called on a plain rerun
+    workdir = tempfile.mkdtemp(prefix="ui_render_")
+    pdf_path = os.path.join(workdir, "TC2024BENCH.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(b"%PDF-1.4\n" + b"0" * 200_000)  # roughly a sanction letter
+
+    print(f"{'messages':>8} {'median ms':>10} {'min ms':>8} {'elements':>9}")
+    for length in (int(n) for n in args.lengths.split(",")):
+        median, fastest, elements = measure(length, args.reruns, pdf_path)
+        print(f"{length:>8} {median:>10.1f} {fastest:>8.1f} {elements:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
+from typing import Annotated, Optional, Dict, Any, List
 from enum import Enum
 
 class AgentType(str, Enum):
@@ -47,6 +47,32 @@ class UnderwritingResult(BaseModel):
     reason: Optional[str] = None
     conditions: Optional[List[str]] = None
 
+# What-if bounds: out-of-range input is a 422, not a NaN EMI or a 500
+WhatIfAmount = Annotated[float, Field(gt=0, le=1e9)]
+WhatIfTenure = Annotated[int, Field(ge=1, le=360)]  # months
+
+class WhatIfRequest(BaseModel):
+    customer_id: str
+    amounts: Optional[List[WhatIfAmount]] = Field(None, max_length=200)  # default: steps up to just past the maximum eligible amount
+    tenures: Optional[List[WhatIfTenure]] = Field(None, max_length=60)  # default: the customer's tenure options
+    salary_slip_verified: bool = False
+    verified_salary: Optional[float] = Field(None, gt=0, le=1e9)
+
+class WhatIfGrid(BaseModel):
+    customer_id: str
+    rules_version: str
+    interest_rate: float
+    preapproved_limit: float
+    max_eligible_amount: float
+    amounts: List[float]
+    tenures: List[int]
+    # [amount index][tenure index]
+    decision: List[List[str]]
+    rule: List[List[str]]
+    emi: List[List[float]]
+    total_payable: List[List[float]]
+    conditions: Dict[str, List[str]] = {}  # what a pending rule asks for, by rule id
+
 class SanctionLetter(BaseModel):
     customer_name: str
     loan_amount: float
@@ -1,4 +1,22 @@
+import os
+import sys
+
 import uvicorn
 
 if __name__ == "__main__":
-    uvicorn.run("backend:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Workers refuse to start without shared state; fail here instead of forking them to die
+        from services.database import db
+        if not db.wait_connected(float(os.getenv("SHARED_STATE_CONNECT_TIMEOUT", "5"))):
+            sys.exit(f"WEB_CONCURRENCY={workers} needs MongoDB for shared session state, but it is not "
+                     "reachable; fix MONGODB_URI or run a single worker")
+        db.stop()
+    uvicorn.run(
+        "backend:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        reload=workers == 1,  # uvicorn can't reload a multi-worker server
+        timeout_graceful_shutdown=int(float(os.getenv("DRAIN_TIMEOUT", "30"))) + 5,
+    )
@@ -0,0 +1,200 @@
+"""
+Write-behind, append-only audit log of agent decisions.
+
+`decision_log.record(...)` only enqueues onto a bounded in-memory queue and
+returns immediately; a background thread flushes batches to the
+`decision_log` collection by size or interval. When MongoDB is down (or the
+queue is full) entries are appended to a local JSONL spool, which is
+replayed into MongoDB once it is reachable again.
+"""
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from pymongo.errors import BulkWriteError
+
+from services.database import db
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLLECTION = "decision_log"
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_SPOOL_PATH = os.getenv("AUDIT_SPOOL_PATH", "audit_spool/decisions.jsonl")
+
+
+class DecisionLog:
+    def __init__(self, database=db, collection_name=AUDIT_COLLECTION,
+                 max_queue=AUDIT_QUEUE_SIZE, batch_size=AUDIT_BATCH_SIZE,
+                 flush_interval=AUDIT_FLUSH_INTERVAL, spool_path=AUDIT_SPOOL_PATH):
+        self.database = database
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spool_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {"recorded": 0, "written": 0, "spooled": 0, "replayed": 0}
+
+    # ------------------------------------------------------------------
+    # PRODUCER SIDE (request path)
+    # ------------------------------------------------------------------
+    def record(self, agent, session_id, inputs, outcome, latency_ms):
+        """Enqueue a decision entry; never blocks and never touches the database"""
+        entry = {
+            "decision_id": uuid.uuid4().hex,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "agent": agent,
+            "session_id": session_id,
+            "inputs": inputs,
+            "outcome": outcome,
+            "latency_ms": round(latency_ms, 3),
+        }
+        self.stats["recorded"] += 1
+        self.start()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # Backpressure: consumer can't keep up, go straight to disk
+            self._spool([entry])
+        return entry["decision_id"]
+
+    # ------------------------------------------------------------------
+    # CONSUMER SIDE (background thread)
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="decision-log-writer", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=5.0):
+        """Stop the writer after flushing everything still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        while batch := self._drain(block=False):
+            self._flush(batch)
+
+    def _drain(self, block=True):
+        """Collect up to batch_size entries, waiting at most flush_interval for the first"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = self._drain()
+                if batch:
+                    self._flush(batch)
+                elif self.database.is_connected:
+                    self._replay_spool()
+            except Exception:
+                # Losing the writer would leave every later entry on the synchronous spool path
+                logger.exception("Decision log writer error")
+                self._stop.wait(self.flush_interval)
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        if not self.database.is_connected:
+            self._spool(batch)
+            return
+        try:
+            self._insert(self.database.get_collection(self.collection_name), batch)
+            self.stats["written"] += len(batch)
+        except Exception as e:
+            logger.warning("Decision log write failed, spooling %d entries: %s", len(batch), e)
+            self._spool(batch)
+
+    def _spool(self, entries):
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(e, default=str) + "\n" for e in entries))
+        self.stats["spooled"] += len(entries)
+
+    def _insert(self, collection, entries):
+        """Insert keyed by decision_id so replays are idempotent; duplicates are ignored"""
+        try:
+            collection.insert_many([dict(e, _id=e["decision_id"]) for e in entries], ordered=False)
+        except BulkWriteError as e:
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+    def _replay_spool(self):
+        """
+        Move spooled entries into MongoDB once it is reachable. Workers share the
+        spool directory, so each file is claimed by renaming it to this pid before
+        it is read: whoever loses the rename skips it, and a failed replay hands
+        the file back for the next attempt (by any worker).
+        """
+        if os.path.exists(self.spool_path):
+            with self._spool_lock:
+                try:
+                    os.replace(self.spool_path, f"{self.spool_path}.{uuid.uuid4().hex[:8]}.replay")
+                except FileNotFoundError:
+                    pass
+
+        collection = self.database.get_collection(self.collection_name)
+        for replay_path in glob.glob(f"{glob.escape(self.spool_path)}.*.replay"):
+            claimed_path = f"{replay_path}.{os.getpid()}"
+            try:
+                os.replace(replay_path, claimed_path)
+            except FileNotFoundError:
+                continue  # another worker claimed it
+            try:
+                self._replay_file(collection, claimed_path)
+            except Exception as e:
+                logger.warning("Decision log spool replay failed, will retry %s: %s", replay_path, e)
+                os.replace(claimed_path, replay_path)
+                return
+            try:
+                os.remove(claimed_path)
+            except FileNotFoundError:
+                pass
+
+    def _replay_file(self, collection, path):
+        with open(path, "r", encoding="utf-8") as f:
+            batch = []
+            for line in f:
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) >= self.batch_size:
+                    self._insert(collection, batch)
+                    self.stats["replayed"] += len(batch)
+                    batch = []
+            if batch:
+                self._insert(collection, batch)
+                self.stats["replayed"] += len(batch)
+
+
+# Global decision log instance
+decision_log = DecisionLog()
@@ -0,0 +1,229 @@
+"""
+Server-push chat channel behind /ws/chat.
+
+One `ChatChannel` per session_id holds the conversation state (context,
+loan intent, customer info) and a short buffer of sequenced events; every
+open WebSocket of that session receives each event as it is published:
+
+    {"seq": 12, "type": "agent_transition", "data": {"from": "verification", "to": "underwriting"}}
+
+Event types: `message` (an agent reply: text, agent, next_agent, metadata;
+the context stays on the server), `agent_transition`, `job`
+(`pdf_ready`, `salary_slip_verified`), `state` (snapshot sent on resume when
+the buffer no longer covers the gap) and `error`. Two frames are unsequenced:
+`hello` (first frame on every connection: session_id, resume_token and the
+current seq) and `ping`, the heartbeat, which clients answer with
+`{"type": "pong"}`. Client frames are not read while a turn of the socket
+runs, so the turn itself counts as activity (see `touch`).
+
+Idle sessions cost one awaiting receive per socket: a single hub task sends
+heartbeats and drops dead sockets for all sessions, and a channel without
+sockets is forgotten WS_RESUME_TTL seconds after its last one closed.
+
+The session_id alone is not a credential (it shows up in logs and traces):
+the hello frame carries a `resume_token`, an HMAC of the session_id under
+WS_RESUME_SECRET, and only `?session_id=...&resume_token=...` may attach to
+an existing session. Adding `&last_seq=N` within WS_RESUME_TTL replays the
+events after N. Without WS_RESUME_SECRET the key is random per process, so
+tokens only resume on the worker that issued them; set it when running
+several workers.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from collections import deque
+
+from services.metrics import REGISTRY, WS_EVENTS
+from services.session_guard import session_state
+
+logger = logging.getLogger(__name__)
+
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "20"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))  # no frame from the client for this long = dead
+WS_RESUME_TTL = float(os.getenv("WS_RESUME_TTL", "300"))
+WS_RESUME_BUFFER = int(os.getenv("WS_RESUME_BUFFER", "16"))
+WS_RESUME_SECRET = os.getenv("WS_RESUME_SECRET", "")
+
+def _encode(event):
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class ChatChannel:
+    __slots__ = ("session_id", "state", "events", "seq", "sockets", "last_seen", "detached_at")
+
+    def __init__(self, session_id, buffer_size=WS_RESUME_BUFFER):
+        self.session_id = session_id
+        self.state = {"context": {}, "loan_intent": None, "customer_info": None}
+        self.events = deque(maxlen=buffer_size)
+        self.seq = 0
+        self.sockets = set()
+        self.last_seen = {}  # socket -> monotonic time of its last frame
+        self.detached_at = time.monotonic()
+
+    def update_state(self, response):
+        self.state = session_state(response)
+
+    def events_after(self, last_seq):
+        """Buffered events after `last_seq`, or None if some of them were already evicted"""
+        if last_seq >= self.seq:
+            return []
+        if not self.events or self.events[0]["seq"] > last_seq + 1:
+            return None
+        return [event for event in self.events if event["seq"] > last_seq]
+
+
+class ChatHub:
+    def __init__(self, heartbeat_interval=WS_HEARTBEAT_INTERVAL, idle_timeout=WS_IDLE_TIMEOUT,
+                 resume_ttl=WS_RESUME_TTL, resume_secret=WS_RESUME_SECRET):
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.resume_ttl = resume_ttl
+        self._resume_key = resume_secret.encode() if resume_secret else secrets.token_bytes(32)
+        self._channels = {}
+        self._task = None
+
+    @property
+    def connections(self):
+        return sum(len(channel.sockets) for channel in self._channels.values())
+
+    @property
+    def sessions(self):
+        return len(self._channels)
+
+    def channel(self, session_id):
+        channel = self._channels.get(session_id)
+        if channel is None:
+            channel = self._channels[session_id] = ChatChannel(session_id)
+        return channel
+
+    # ------------------------------------------------------------------
+    # RESUME TOKENS
+    # ------------------------------------------------------------------
+    def resume_token(self, session_id):
+        return hmac.new(self._resume_key, session_id.encode(), hashlib.sha256).hexdigest()
+
+    def authorized(self, session_id, token):
+        return token is not None and hmac.compare_digest(token.encode(), self.resume_token(session_id).encode())
+
+    # ------------------------------------------------------------------
+    # CONNECTIONS
+    # ------------------------------------------------------------------
+    async def attach(self, session_id, websocket, last_seq=None):
+        """Register an accepted socket; replays missed events (or a state snapshot) on resume"""
+        channel = self.channel(session_id)
+        channel.sockets.add(websocket)
+        channel.last_seen[websocket] = time.monotonic()
+        channel.detached_at = None
+        if last_seq is not None:
+            missed = channel.events_after(last_seq)
+            if missed is None:
+                await self._send(channel, websocket, {"seq": channel.seq, "type": "state", "data": channel.state})
+            else:
+                for event in missed:
+                    await self._send(channel, websocket, event)
+        return channel
+
+    def detach(self, channel, websocket):
+        channel.sockets.discard(websocket)
+        channel.last_seen.pop(websocket, None)
+        if not channel.sockets:
+            channel.detached_at = time.monotonic()
+
+    def touch(self, channel, websocket):
+        channel.last_seen[websocket] = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # EVENTS
+    # ------------------------------------------------------------------
+    async def publish(self, session_id, event_type, data):
+        """Sequence, buffer and push an event to every socket of the session"""
+        channel = self.channel(session_id)
+        channel.seq += 1
+        event = {"seq": channel.seq, "type": event_type, "data": data}
+        channel.events.append(event)
+        WS_EVENTS.labels(event_type).inc()
+        for websocket in list(channel.sockets):
+            await self._send(channel, websocket, event)
+        return event
+
+    async def _send(self, channel, websocket, event):
+        try:
+            await websocket.send_text(_encode(event))
+        except Exception as e:
+            logger.debug("Dropping WebSocket after failed send: %s", e)
+            self.detach(channel, websocket)
+
+    # ------------------------------------------------------------------
+    # HEARTBEAT / EXPIRY (one task for every session)
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._heartbeat_loop(), name="ws-heartbeat")
+
+    async def _heartbeat_loop(self):
+        ping = _encode({"type": "ping"})
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.sweep(ping)
+            except Exception:
+                logger.exception("WebSocket heartbeat sweep failed")
+
+    async def sweep(self, ping=None):
+        now = time.monotonic()
+        for session_id, channel in list(self._channels.items()):
+            for websocket in list(channel.sockets):
+                if now - channel.last_seen.get(websocket, now) > self.idle_timeout:
+                    self.detach(channel, websocket)
+                    await self._close(websocket, 1001)
+                elif ping is not None:
+                    try:
+                        await websocket.send_text(ping)
+                    except Exception:
+                        self.detach(channel, websocket)
+            if not channel.sockets and channel.detached_at is not None and now - channel.detached_at > self.resume_ttl:
+                del self._channels[session_id]
+
+    async def close(self):
+        """Stop the heartbeat and close every socket (clients resume against the next process)"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for channel in list(self._channels.values()):
+            for websocket in list(channel.sockets):
+                self.detach(channel, websocket)
+                await self._close(websocket, 1012)  # service restart
+
+    @staticmethod
+    async def _close(websocket, code):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class _ChatHubGauge:
+    """Open WebSocket connections and live channels, read at scrape time"""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def render(self):
+        return [
+            "# HELP ws_connections Open /ws/chat connections",
+            "# TYPE ws_connections gauge",
+            f"ws_connections {self.hub.connections}",
+            "# HELP ws_sessions Chat channels held for connected or resumable sessions",
+            "# TYPE ws_sessions gauge",
+            f"ws_sessions {self.hub.sessions}",
+        ]
+
+
+# Global hub
+chat_hub = ChatHub()
+REGISTRY.register(_ChatHubGauge(chat_hub))
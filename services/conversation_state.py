@@ -0,0 +1,162 @@
+"""
+Bounded conversation state carried in `context` between turns.
+
+MasterAgent appends every turn to `context["conversation_history"]` and
+calls `compact()` on the way in and on the way out:
+
+- the last CONTEXT_HISTORY_TURNS turns stay verbatim; older turns are folded
+  into `context["conversation_summary"]` (rule-based, or LLM-generated when
+  CONTEXT_SUMMARY_MODE=llm and a model is available)
+- bulky derived objects are reduced to a stub once persisted elsewhere
+  (the full sanction letter once its PDF exists)
+- a hard CONTEXT_MAX_BYTES budget on the serialized context is enforced by
+  shrinking history, then the summary, then reducing `verification_result`
+  to what later turns read (verified, customer_id, name), then dropping
+  droppable keys
+"""
+import json
+import logging
+import os
+import re
+
+from services.metrics import CONTEXT_BYTES, CONTEXT_COMPACTIONS
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_HISTORY_TURNS = int(os.getenv("CONTEXT_HISTORY_TURNS", "3"))
+CONTEXT_SUMMARY_MAX_LINES = int(os.getenv("CONTEXT_SUMMARY_MAX_LINES", "20"))
+CONTEXT_SUMMARY_MODE = os.getenv("CONTEXT_SUMMARY_MODE", "rule")  # rule | llm
+CONTEXT_MAX_BYTES = int(os.getenv("CONTEXT_MAX_BYTES", "16384"))
+
+HISTORY_KEY = "conversation_history"
+SUMMARY_KEY = "conversation_summary"
+
+# Safe to drop under budget pressure: derived or re-computable on a later turn
+DROPPABLE_KEYS = ("sanction_letter", "loan_intent")
+# Never dropped: the sanction letter (name), the frontend badge and the WS hand-off read it
+VERIFICATION_KEY = "verification_result"
+
+_MARKDOWN_RE = re.compile(r"[*_`#]+")
+
+
+def context_size(context):
+    return len(json.dumps(context, ensure_ascii=False, separators=(",", ":"), default=str).encode())
+
+
+def record_turn(context, user_message, agent, agent_message):
+    # New list: the incoming request's context may share the old one
+    context[HISTORY_KEY] = (context.get(HISTORY_KEY) or []) + [
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "agent": agent, "content": agent_message},
+    ]
+
+
+def _headline(text, limit=80):
+    for line in text.splitlines():
+        line = _MARKDOWN_RE.sub("", line).strip()
+        if line:
+            return line if len(line) <= limit else line[:limit - 1] + "…"
+    return ""
+
+
+def rule_summary(messages):
+    """One line per folded turn: what the customer said, which agent answered and how"""
+    lines, user = [], None
+    for message in messages:
+        if message.get("role") == "user":
+            user = _headline(message.get("content", ""), 60)
+        else:
+            agent = message.get("agent") or "assistant"
+            lines.append(f"Customer: {user or '-'} → {agent}: {_headline(message.get('content', ''))}")
+            user = None
+    if user:
+        lines.append(f"Customer: {user}")
+    return lines
+
+
+def verification_stub(verification):
+    """The fields of a verification_result that later turns and the frontend read"""
+    details = verification.get("details") or {}
+    return {
+        "verified": verification.get("verified", False),
+        "customer_id": verification.get("customer_id"),
+        "details": {"name": details["name"]} if details.get("name") else {},
+    }
+
+
+class ConversationCompactor:
+    def __init__(self, history_turns=CONTEXT_HISTORY_TURNS, summary_max_lines=CONTEXT_SUMMARY_MAX_LINES,
+                 max_bytes=CONTEXT_MAX_BYTES, summary_mode=CONTEXT_SUMMARY_MODE, llm_model=None):
+        self.history_turns = history_turns
+        self.summary_max_lines = summary_max_lines
+        self.max_bytes = max_bytes
+        self.summary_mode = summary_mode
+        self.llm_model = llm_model
+
+    def _summarize(self, previous, folded, allow_llm=True):
+        if allow_llm and self.summary_mode == "llm" and self.llm_model is not None:
+            transcript = "\n".join(f"{m.get('agent') or m['role']}: {m.get('content', '')}" for m in folded)
+            prompt = (
+                "Summarize this loan-assistant conversation in at most 5 short bullet lines, keeping amounts, "
+                "tenure, customer identity, and decisions.\n\n"
+                f"Earlier summary:\n{previous}\n\nNew turns:\n{transcript}"
+            )
+            try:
+                text = self.llm_model.generate_content(prompt).text
+                return [line.strip() for line in text.splitlines() if line.strip()][:self.summary_max_lines]
+            except Exception as e:
+                logger.warning("LLM summary failed, using rule-based summary: %s", e)
+        lines = (previous.splitlines() if previous else []) + rule_summary(folded)
+        return lines[-self.summary_max_lines:]
+
+    def _fold(self, context, keep_messages, allow_llm=True):
+        history = context.get(HISTORY_KEY) or []
+        if len(history) <= keep_messages:
+            return False
+        cut = len(history) - keep_messages
+        folded, context[HISTORY_KEY] = history[:cut], history[cut:]
+        context[SUMMARY_KEY] = "\n".join(self._summarize(context.get(SUMMARY_KEY, ""), folded, allow_llm))
+        return True
+
+    def compact(self, context):
+        """Compact `context` in place; returns it for chaining"""
+        if self._fold(context, 2 * self.history_turns):
+            CONTEXT_COMPACTIONS.labels("history").inc()
+
+        letter = context.get("sanction_letter")
+        if context.get("pdf_path") and isinstance(letter, dict) and len(letter) > 1:
+            # The PDF (and the audit log) hold the full letter now
+            context["sanction_letter"] = {"reference_number": letter.get("reference_number")}
+            CONTEXT_COMPACTIONS.labels("persisted").inc()
+
+        size = context_size(context)
+        if size > self.max_bytes:
+            size = self._enforce_budget(context, size)
+        CONTEXT_BYTES.observe(size)
+        return context
+
+    def _enforce_budget(self, context, size):
+        CONTEXT_COMPACTIONS.labels("budget").inc()
+        keep = len(context.get(HISTORY_KEY) or [])
+        while size > self.max_bytes and keep > 0:
+            keep -= 2
+            self._fold(context, max(keep, 0), allow_llm=False)  # one LLM call per turn at most
+            size = context_size(context)
+        while size > self.max_bytes and context.get(SUMMARY_KEY):
+            lines = context[SUMMARY_KEY].splitlines()
+            context[SUMMARY_KEY] = "\n".join(lines[len(lines) // 2 + 1:]) if len(lines) > 1 else ""
+            size = context_size(context)
+        verification = context.get(VERIFICATION_KEY)
+        if size > self.max_bytes and isinstance(verification, dict):
+            context[VERIFICATION_KEY] = verification_stub(verification)
+            size = context_size(context)
+        for key in DROPPABLE_KEYS:
+            if size <= self.max_bytes:
+                break
+            if context.pop(key, None) is not None:
+                size = context_size(context)
+        if size > self.max_bytes:
+            logger.warning("Context still over budget after compaction",
+                           extra={"context_bytes": size, "budget_bytes": self.max_bytes,
+                                  "context_keys": list(context.keys())})
+        return size
@@ -0,0 +1,198 @@
+"""
+Synthetic customer-book generator for scale testing.
+
+Produces customers and pre-approved offers with the same schema as the
+built-in seed data, streamed in constant memory. A fixed seed always
+yields the same dataset.
+
+Usage:
+    python -m services.data_generator --count 1000000 --seed 42 --out data/seed
+    python -m services.data_generator --count 100000 --target db
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from itertools import islice
+
+CITIES = [
+    ("Mumbai", 14), ("Delhi", 14), ("Bangalore", 12), ("Hyderabad", 9),
+    ("Chennai", 8), ("Pune", 8), ("Kolkata", 7), ("Ahmedabad", 6),
+    ("Jaipur", 4), ("Lucknow", 4), ("Chandigarh", 3), ("Kochi", 3),
+    ("Indore", 3), ("Nagpur", 3), ("Surat", 2),
+]
+
+FIRST_NAMES = [
+    "Rahul", "Priya", "Amit", "Sneha", "Vikram", "Anjali", "Rajesh", "Meera",
+    "Karthik", "Divya", "Arjun", "Pooja", "Rohan", "Kavya", "Sanjay", "Neha",
+    "Aditya", "Ishita", "Manish", "Shreya", "Suresh", "Lakshmi", "Deepak", "Nisha",
+]
+
+LAST_NAMES = [
+    "Sharma", "Patel", "Kumar", "Reddy", "Singh", "Mehta", "Gupta", "Iyer",
+    "Shah", "Nair", "Joshi", "Verma", "Rao", "Das", "Banerjee", "Kulkarni",
+    "Menon", "Chopra", "Agarwal", "Pillai",
+]
+
+LOCALITIES = [
+    "Sector 12", "MG Road", "Station Road", "Civil Lines", "Park Street",
+    "Lake View", "Green Park", "Model Town", "Old City", "Tech Park",
+]
+
+TENURE_CHOICES = [[12, 24], [12, 24, 36], [24, 36, 48], [12, 24, 36, 48, 60]]
+
+# Phone numbers are derived from the row index so they are unique and never
+# collide with the built-in 98765432xx test customers.
+PHONE_BASE = 7000000000
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _clip(value, low, high):
+    return max(low, min(high, value))
+
+
+def _round_to(value, step):
+    return int(round(value / step) * step)
+
+
+class CustomerBookGenerator:
+    """
+    Deterministic generator of (customer, offer) pairs.
+
+    - Credit scores: normal around 730 (sd 60), clipped to 300-900
+    - Salaries: log-normal, median ~₹60,000/month
+    - Pre-approved limit: 2-8x salary, scaled by credit score
+    - KYC verified: ~92%
+    - ~60% of customers carry a pre-approved offer, priced off their score
+    """
+
+    def __init__(self, seed=42, offer_ratio=0.6, kyc_ratio=0.92, id_prefix="SYN"):
+        self.seed = seed
+        self.offer_ratio = offer_ratio
+        self.kyc_ratio = kyc_ratio
+        self.id_prefix = id_prefix
+        self._cities = [c for c, _ in CITIES]
+        self._city_weights = [w for _, w in CITIES]
+
+    def _customer(self, rng, index):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        city = rng.choices(self._cities, self._city_weights)[0]
+        age = int(_clip(rng.gauss(34, 8), 21, 65))
+        credit_score = int(_clip(rng.gauss(730, 60), 300, 900))
+        salary = _round_to(_clip(rng.lognormvariate(11.0, 0.45), 15000, 1000000), 1000)
+
+        score_factor = _clip((credit_score - 600) / 200, 0.0, 1.0)
+        limit_multiple = 2 + 6 * score_factor * rng.uniform(0.6, 1.0)
+        preapproved_limit = max(50000, _round_to(salary * limit_multiple, 10000))
+        existing_loans = _round_to(salary * rng.uniform(0, 5), 10000)
+
+        return {
+            "customer_id": f"{self.id_prefix}{index:08d}",
+            "name": f"{first} {last}",
+            "phone": str(PHONE_BASE + index),
+            "email": f"{first.lower()}.{last.lower()}{index}@example.com",
+            "city": city,
+            "age": age,
+            "credit_score": credit_score,
+            "preapproved_limit": preapproved_limit,
+            "salary": salary,
+            "existing_loans": existing_loans,
+            "address": f"{rng.randint(1, 999)}, {rng.choice(LOCALITIES)}, {city}",
+            "kyc_verified": rng.random() < self.kyc_ratio,
+        }
+
+    def _offer(self, rng, index, customer):
+        score = customer["credit_score"]
+        # Better scores get cheaper money: ~11% at 850+, ~16% near 650
+        base_rate = 11.0 + _clip((850 - score) / 40, 0, 5)
+        interest_rate = round(base_rate + rng.uniform(-0.5, 0.5), 1)
+        return {
+            "offer_id": f"OFFER{self.id_prefix}{index:08d}",
+            "customer_id": customer["customer_id"],
+            "loan_type": "personal",
+            "max_amount": customer["preapproved_limit"],
+            "interest_rate": interest_rate,
+            "tenure_options": rng.choice(TENURE_CHOICES),
+            "processing_fee": round(_clip(1.0 + (800 - score) / 100, 1.0, 3.0), 1),
+        }
+
+    def generate(self, count, start=0):
+        """Yield (customer, offer_or_None) pairs; deterministic for (seed, start)"""
+        rng = random.Random(f"{self.seed}:{start}")
+        for index in range(start, start + count):
+            customer = self._customer(rng, index)
+            offer = self._offer(rng, index, customer) if rng.random() < self.offer_ratio else None
+            yield customer, offer
+
+    def batches(self, count, batch_size=DEFAULT_BATCH_SIZE):
+        """Yield (customers, offers) lists of up to `batch_size` rows"""
+        pairs = self.generate(count)
+        while True:
+            chunk = list(islice(pairs, batch_size))
+            if not chunk:
+                return
+            yield [c for c, _ in chunk], [o for _, o in chunk if o is not None]
+
+
+def write_jsonl(generator, count, out_dir, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream the book to out_dir/customers.jsonl and out_dir/offers.jsonl"""
+    os.makedirs(out_dir, exist_ok=True)
+    customers_total = offers_total = 0
+    with open(os.path.join(out_dir, "customers.jsonl"), "w", encoding="utf-8") as cf, \
+            open(os.path.join(out_dir, "offers.jsonl"), "w", encoding="utf-8") as of:
+        for customers, offers in generator.batches(count, batch_size):
+            cf.write("".join(json.dumps(c, separators=(",", ":")) + "\n" for c in customers))
+            of.write("".join(json.dumps(o, separators=(",", ":")) + "\n" for o in offers))
+            customers_total += len(customers)
+            offers_total += len(offers)
+    return customers_total, offers_total
+
+
+def load_into_db(generator, count, database=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Bulk-load the book into MongoDB, or the in-memory store when Mongo is down"""
+    if database is None:
+        from services.database import db as database
+    customers_total = offers_total = 0
+    with database.bulk_load():
+        for customers, offers in generator.batches(count, batch_size):
+            customers_total += database.bulk_upsert("customers", customers, "customer_id", batch_size)
+            offers_total += database.bulk_upsert("offers", offers, "offer_id", batch_size)
+    return customers_total, offers_total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic customer book")
+    parser.add_argument("--count", type=int, default=100000, help="number of customers")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (same seed = same data)")
+    parser.add_argument("--target", choices=["jsonl", "db"], default="jsonl")
+    parser.add_argument("--out", default="data/seed", help="output directory for --target jsonl")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--offer-ratio", type=float, default=0.6)
+    parser.add_argument("--wait-mongo", type=float, default=10.0,
+                        help="seconds to wait for MongoDB before falling back to memory (--target db)")
+    args = parser.parse_args(argv)
+
+    generator = CustomerBookGenerator(seed=args.seed, offer_ratio=args.offer_ratio)
+    started = time.perf_counter()
+
+    if args.target == "jsonl":
+        customers, offers = write_jsonl(generator, args.count, args.out, args.batch_size)
+        destination = args.out
+    else:
+        from services.database import db
+        if not db.wait_connected(args.wait_mongo):
+            print("⚠️ MongoDB unavailable; loading into in-memory store", file=sys.stderr)
+        customers, offers = load_into_db(generator, args.count, db, args.batch_size)
+        destination = "mongodb" if db.is_connected else "memory"
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Generated {customers:,} customers and {offers:,} offers -> {destination} "
+          f"in {elapsed:.1f}s ({customers / max(elapsed, 1e-9):,.0f} customers/s)")
+
+
+if __name__ == "__main__":
+    main()
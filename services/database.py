@@ -1,261 +1,525 @@
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, ServerSelectionTimeoutError
 import os
+import json
+import logging
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from contextlib import contextmanager
+from itertools import islice
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Bump whenever SEED_CUSTOMERS / SEED_OFFERS change so existing databases re-seed
+SEED_VERSION = "2024.01.1"
+SEED_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", "1000"))
+SEED_LOCK_TTL_SECONDS = 300
+
+# 10 dummy customers as per challenge requirements
+SEED_CUSTOMERS = [
+    {
+        "customer_id": "CUST001",
+        "name": "Rahul Sharma",
+        "phone": "9876543210",
+        "email": "rahul.sharma@example.com",
+        "city": "Mumbai",
+        "age": 32,
+        "credit_score": 785,
+        "preapproved_limit": 500000,
+        "salary": 85000,
+        "existing_loans": 200000,
+        "address": "Flat 201, Sunrise Apartments, Andheri West, Mumbai",
+        "kyc_verified": True
+    },
+    {
+        "customer_id": "CUST002",
+        "name": "Priya Patel",
+        "phone": "9876543211",
+        "email": "priya.patel@example.com",
+        "city": "Delhi",
+        "age": 28,
+        "credit_score": 720,
+        "preapproved_limit": 300000,
+        "salary": 60000,
+        "existing_loans": 150000,
+        "address": "House No. 45, GK-2, New Delhi",
+        "kyc_verified": True
+    },
+    {
+        "customer_id": "CUST003",
+        "name": "Amit Kumar",
+        "phone": "9876543212",
+        "email": "amit.kumar@example.com",
+        "city": "Bangalore",
+        "age": 35,
+        "credit_score": 680,
+        "preapproved_limit": 200000,
+        "salary": 75000,
+        "existing_loans": 300000,
+        "address": "No. 123, Koramangala, Bangalore",
+        "kyc_verified": False
+    },
+    {
+        "customer_id": "CUST004",
+        "name": "Sneha Reddy",
+        "phone": "9876543213",
+        "email": "sneha.reddy@example.com",
+        "city": "Hyderabad",
+        "age": 29,
+        "credit_score": 810,
+        "preapproved_limit": 700000,
+        "salary": 95000,
+        "existing_loans": 100000,
+        "address": "Flat 301, Hitech City, Hyderabad",
+        "kyc_verified": True
+    },
+    {
+        "customer_id": "CUST005",
+        "name": "Vikram Singh",
+        "phone": "9876543214",
+        "email": "vikram.singh@example.com",
+        "city": "Pune",
+        "age": 41,
+        "credit_score": 650,
+        "preapproved_limit": 150000,
+        "salary": 55000,
+        "existing_loans": 250000,
+        "address": "Row House, Kothrud, Pune",
+        "kyc_verified": True
+    },
+    {
+        "customer_id": "CUST006",
+        "name": "Anjali Mehta",
+        "phone": "9876543215",
+        "email": "anjali.mehta@example.com",
+        "city": "Chennai",
+        "age": 31,
+        "credit_score": 750,
+        "preapproved_limit": 400000,
+        "salary": 80000,
+        "existing_loans": 180000,
+        "address": "Apartment 5B, T Nagar, Chennai",
+        "kyc_verified": True
+    },
+    {
+        "customer_id": "CUST007",
+        "name": "Rajesh Gupta",
+        "phone": "9876543216",
+        "email": "rajesh.gupta@example.com",
+        "city": "Kolkata",
+        "age": 38,
+        "credit_score": 695,
+        "preapproved_limit": 250000,
+        "salary": 70000,
+        "existing_loans": 200000,
+        "address": "Salt Lake, Sector V, Kolkata",
+        "kyc_verified": True
+    },
+    {
+        "customer_id": "CUST008",
+        "name": "Meera Iyer",
+        "phone": "9876543217",
+        "email": "meera.iyer@example.com",
+        "city": "Bangalore",
+        "age": 27,
+        "credit_score": 730,
+        "preapproved_limit": 350000,
+        "salary": 75000,
+        "existing_loans": 120000,
+        "address": "Whitefield, Bangalore",
+        "kyc_verified": True
+    },
+    {
+        "customer_id": "CUST009",
+        "name": "Karthik Reddy",
+        "phone": "9876543218",
+        "email": "karthik.reddy@example.com",
+        "city": "Mumbai",
+        "age": 33,
+        "credit_score": 770,
+        "preapproved_limit": 600000,
+        "salary": 90000,
+        "existing_loans": 150000,
+        "address": "Powai, Mumbai",
+        "kyc_verified": True
+    },
+    {
+        "customer_id": "CUST010",
+        "name": "Divya Shah",
+        "phone": "9876543219",
+        "email": "divya.shah@example.com",
+        "city": "Ahmedabad",
+        "age": 30,
+        "credit_score": 710,
+        "preapproved_limit": 320000,
+        "salary": 68000,
+        "existing_loans": 140000,
+        "address": "Satellite, Ahmedabad",
+        "kyc_verified": True
+    }
+]
+
+SEED_OFFERS = [
+    {
+        "offer_id": "OFFER001",
+        "customer_id": "CUST001",
+        "loan_type": "personal",
+        "max_amount": 500000,
+        "interest_rate": 12.5,  # Rahul gets 12.5% for TEST 1
+        "tenure_options": [12, 24, 36],
+        "processing_fee": 1.5
+    },
+    {
+        "offer_id": "OFFER002",
+        "customer_id": "CUST002",
+        "loan_type": "personal",
+        "max_amount": 300000,
+        "interest_rate": 13.5,
+        "tenure_options": [12, 24],
+        "processing_fee": 2.0
+    },
+    {
+        "offer_id": "OFFER003",
+        "customer_id": "CUST003",
+        "loan_type": "personal",
+        "max_amount": 200000,
+        "interest_rate": 14.0,  # Amit gets 14% for TEST 2
+        "tenure_options": [12, 24, 36],
+        "processing_fee": 2.5
+    },
+    {
+        "offer_id": "OFFER004",
+        "customer_id": "CUST004",
+        "loan_type": "personal",
+        "max_amount": 700000,
+        "interest_rate": 11.5,
+        "tenure_options": [24, 36, 48],
+        "processing_fee": 1.0
+    },
+    {
+        "offer_id": "OFFER005",
+        "customer_id": "CUST005",
+        "loan_type": "personal",
+        "max_amount": 150000,
+        "interest_rate": 15.0,  # Vikram gets 15% for TEST 3
+        "tenure_options": [12, 24],
+        "processing_fee": 3.0
+    },
+    {
+        "offer_id": "OFFER006",
+        "customer_id": "CUST006",
+        "loan_type": "personal",
+        "max_amount": 400000,
+        "interest_rate": 12.0,
+        "tenure_options": [12, 24, 36],
+        "processing_fee": 1.8
+    }
+]
+
+
+def _iter_jsonl(path):
+    """Stream documents from a JSONL file without loading it into memory"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
 class MongoDB:
+    """
+    MongoDB handle with lazy, non-blocking connection.
+
+    Nothing touches the network at construction time. The first call to
+    `get_collection` starts a background probe thread; until the probe
+    succeeds, callers are served from the in-memory fallback. Once MongoDB
+    becomes reachable the handle upgrades itself and notifies listeners
+    registered with `on_connect` (e.g. to re-seed data into Mongo).
+    """
     def __init__(self):
-        try:
-            mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-            self.client = MongoClient(
-                mongodb_uri,
-                serverSelectionTimeoutMS=5000,  # 5 second timeout
-                connectTimeoutMS=10000
+        self.mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+        self.database_name = os.getenv("DATABASE_NAME", "loan_assistant")
+        self.server_selection_timeout_ms = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+        self.probe_interval = float(os.getenv("MONGODB_PROBE_INTERVAL", "30"))
+        
+        self.client = None
+        self.db = None
+        self._in_memory_storage = {
+            "customers": {},
+            "offers": {}
+        }
+        
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._probe_thread = None
+        self._connect_listeners = []
+        self._update_listeners = []
+        self._bulk_load_listeners = []
+        self._bulk_load_depth = 0
+        self._bulk_load_lock = threading.Lock()
+        self._seed_pending = False
+        self._seed_lock = threading.Lock()
+        self._instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    
+    @property
+    def is_connected(self):
+        return self.db is not None
+    
+    def start(self):
+        """Start background health probing (idempotent, never blocks)"""
+        if self._probe_thread is not None or self._stop.is_set():
+            return
+        with self._lock:
+            if self._probe_thread is not None:
+                return
+            self._probe_thread = threading.Thread(
+                target=self._probe_loop,
+                name="mongodb-probe",
+                daemon=True
             )
-            # Test connection
-            self.client.admin.command('ismaster')
-            self.db = self.client[os.getenv("DATABASE_NAME", "loan_assistant")]
-            print("✅ MongoDB connected successfully")
+            self._probe_thread.start()
+    
+    def stop(self):
+        """Stop probing and close the client"""
+        self._stop.set()
+        if self.client is not None:
+            self.client.close()
+    
+    def wait_connected(self, timeout=None):
+        """Block up to `timeout` seconds for MongoDB; returns connection state"""
+        self.start()
+        return self._connected.wait(timeout)
+    
+    def on_connect(self, callback):
+        """Register a callback run (in the probe thread) after upgrading to MongoDB"""
+        self._connect_listeners.append(callback)
+        if self.is_connected:
+            callback()
+    
+    def on_profile_update(self, callback):
+        """Register a callback(collection_name, customer_ids, documents) run after `bulk_upsert` writes a batch"""
+        self._update_listeners.append(callback)
+    
+    def on_bulk_load(self, callback):
+        """Register a callback() run once after a `bulk_load()` block, instead of per-batch updates"""
+        self._bulk_load_listeners.append(callback)
+    
+    @contextmanager
+    def bulk_load(self):
+        """Suppress per-batch profile-update callbacks inside the block; `on_bulk_load` ones run once after it"""
+        with self._bulk_load_lock:
+            self._bulk_load_depth += 1
+        try:
+            yield
+        finally:
+            with self._bulk_load_lock:
+                self._bulk_load_depth -= 1
+                done = self._bulk_load_depth == 0
+            if done:
+                for callback in list(self._bulk_load_listeners):
+                    try:
+                        callback()
+                    except Exception as e:
+                        logger.exception("Bulk load callback failed")
+    
+    def _notify_update(self, collection_name, documents):
+        if self._bulk_load_depth:
+            return
+        customer_ids = {doc["customer_id"] for doc in documents if "customer_id" in doc}
+        for callback in list(self._update_listeners):
+            try:
+                callback(collection_name, customer_ids, documents)
+            except Exception as e:
+                logger.exception("Profile update callback failed")
+    
+    def _probe_loop(self):
+        while not self._stop.is_set():
+            if self._try_connect():
+                return
+            self._stop.wait(self.probe_interval)
+    
+    def _try_connect(self):
+        client = MongoClient(
+            self.mongodb_uri,
+            serverSelectionTimeoutMS=self.server_selection_timeout_ms,
+            connectTimeoutMS=10000
+        )
+        try:
+            client.admin.command('ping')
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
-            print(f"⚠️ MongoDB connection failed: {e}")
-            print("⚠️ Using in-memory fallback storage")
-            self.client = None
-            self.db = None
-            self._in_memory_storage = {
-                "customers": {},
-                "offers": {}
-            }
+            client.close()
+            logger.warning("MongoDB not reachable (%s); serving from in-memory fallback", type(e).__name__)
+            return False
+        
+        with self._lock:
+            self.client = client
+            self.db = client[self.database_name]
+        self._connected.set()
+        logger.info("MongoDB connected successfully")
+        
+        for callback in list(self._connect_listeners):
+            try:
+                callback()
+            except Exception as e:
+                logger.exception("MongoDB on_connect callback failed")
+        return True
     
     def get_collection(self, collection_name):
         """Get collection with fallback to in-memory storage"""
         if self.db is not None:
             return self.db[collection_name]
-        else:
-            # Return mock collection for in-memory storage
-            return InMemoryCollection(self._in_memory_storage, collection_name)
+        
+        self.start()
+        # Return mock collection for in-memory storage
+        return InMemoryCollection(self._in_memory_storage, collection_name)
     
-    def seed_initial_data(self):
-        """Seed 10 dummy customers as per challenge requirements"""
-        customers = [
-            {
-                "customer_id": "CUST001",
-                "name": "Rahul Sharma",
-                "phone": "9876543210",
-                "email": "rahul.sharma@example.com",
-                "city": "Mumbai",
-                "age": 32,
-                "credit_score": 785,
-                "preapproved_limit": 500000,
-                "salary": 85000,
-                "existing_loans": 200000,
-                "address": "Flat 201, Sunrise Apartments, Andheri West, Mumbai",
-                "kyc_verified": True
-            },
-            {
-                "customer_id": "CUST002",
-                "name": "Priya Patel",
-                "phone": "9876543211",
-                "email": "priya.patel@example.com",
-                "city": "Delhi",
-                "age": 28,
-                "credit_score": 720,
-                "preapproved_limit": 300000,
-                "salary": 60000,
-                "existing_loans": 150000,
-                "address": "House No. 45, GK-2, New Delhi",
-                "kyc_verified": True
-            },
-            {
-                "customer_id": "CUST003",
-                "name": "Amit Kumar",
-                "phone": "9876543212",
-                "email": "amit.kumar@example.com",
-                "city": "Bangalore",
-                "age": 35,
-                "credit_score": 680,
-                "preapproved_limit": 200000,
-                "salary": 75000,
-                "existing_loans": 300000,
-                "address": "No. 123, Koramangala, Bangalore",
-                "kyc_verified": False
-            },
-            {
-                "customer_id": "CUST004",
-                "name": "Sneha Reddy",
-                "phone": "9876543213",
-                "email": "sneha.reddy@example.com",
-                "city": "Hyderabad",
-                "age": 29,
-                "credit_score": 810,
-                "preapproved_limit": 700000,
-                "salary": 95000,
-                "existing_loans": 100000,
-                "address": "Flat 301, Hitech City, Hyderabad",
-                "kyc_verified": True
-            },
-            {
-                "customer_id": "CUST005",
-                "name": "Vikram Singh",
-                "phone": "9876543214",
-                "email": "vikram.singh@example.com",
-                "city": "Pune",
-                "age": 41,
-                "credit_score": 650,
-                "preapproved_limit": 150000,
-                "salary": 55000,
-                "existing_loans": 250000,
-                "address": "Row House, Kothrud, Pune",
-                "kyc_verified": True
-            },
-            {
-                "customer_id": "CUST006",
-                "name": "Anjali Mehta",
-                "phone": "9876543215",
-                "email": "anjali.mehta@example.com",
-                "city": "Chennai",
-                "age": 31,
-                "credit_score": 750,
-                "preapproved_limit": 400000,
-                "salary": 80000,
-                "existing_loans": 180000,
-                "address": "Apartment 5B, T Nagar, Chennai",
-                "kyc_verified": True
-            },
-            {
-                "customer_id": "CUST007",
-                "name": "Rajesh Gupta",
-                "phone": "9876543216",
-                "email": "rajesh.gupta@example.com",
-                "city": "Kolkata",
-                "age": 38,
-                "credit_score": 695,
-                "preapproved_limit": 250000,
-                "salary": 70000,
-                "existing_loans": 200000,
-                "address": "Salt Lake, Sector V, Kolkata",
-                "kyc_verified": True
-            },
-            {
-                "customer_id": "CUST008",
-                "name": "Meera Iyer",
-                "phone": "9876543217",
-                "email": "meera.iyer@example.com",
-                "city": "Bangalore",
-                "age": 27,
-                "credit_score": 730,
-                "preapproved_limit": 350000,
-                "salary": 75000,
-                "existing_loans": 120000,
-                "address": "Whitefield, Bangalore",
-                "kyc_verified": True
-            },
-            {
-                "customer_id": "CUST009",
-                "name": "Karthik Reddy",
-                "phone": "9876543218",
-                "email": "karthik.reddy@example.com",
-                "city": "Mumbai",
-                "age": 33,
-                "credit_score": 770,
-                "preapproved_limit": 600000,
-                "salary": 90000,
-                "existing_loans": 150000,
-                "address": "Powai, Mumbai",
-                "kyc_verified": True
-            },
-            {
-                "customer_id": "CUST010",
-                "name": "Divya Shah",
-                "phone": "9876543219",
-                "email": "divya.shah@example.com",
-                "city": "Ahmedabad",
-                "age": 30,
-                "credit_score": 710,
-                "preapproved_limit": 320000,
-                "salary": 68000,
-                "existing_loans": 140000,
-                "address": "Satellite, Ahmedabad",
-                "kyc_verified": True
-            }
-        ]
+    # ------------------------------------------------------------------
+    # SEEDING
+    # ------------------------------------------------------------------
+    def bulk_upsert(self, collection_name, documents, key_field, batch_size=SEED_BATCH_SIZE):
+        """Upsert an iterable of documents by `key_field` in batches; returns count"""
+        collection = self.get_collection(collection_name)
+        total = 0
+        for batch in _batched(documents, batch_size):
+            if isinstance(collection, InMemoryCollection):
+                collection.upsert_many(batch, key_field)
+            else:
+                collection.bulk_write(
+                    [
+                        UpdateOne(
+                            {key_field: doc[key_field]},
+                            {"$set": {k: v for k, v in doc.items() if k != "_id"}},
+                            upsert=True
+                        )
+                        for doc in batch
+                    ],
+                    ordered=False
+                )
+            self._notify_update(collection_name, batch)
+            total += len(batch)
+        return total
+    
+    def _seed_source(self, seed_dir):
+        """Return (version, customers_iter, offers_iter) for builtin data or a seed directory"""
+        if not seed_dir:
+            return SEED_VERSION, iter(SEED_CUSTOMERS), iter(SEED_OFFERS)
         
-        offers = [
-            {
-                "offer_id": "OFFER001",
-                "customer_id": "CUST001",
-                "loan_type": "personal",
-                "max_amount": 500000,
-                "interest_rate": 12.5,  # Rahul gets 12.5% for TEST 1
-                "tenure_options": [12, 24, 36],
-                "processing_fee": 1.5
-            },
-            {
-                "offer_id": "OFFER002",
-                "customer_id": "CUST002",
-                "loan_type": "personal",
-                "max_amount": 300000,
-                "interest_rate": 13.5,
-                "tenure_options": [12, 24],
-                "processing_fee": 2.0
-            },
-            {
-                "offer_id": "OFFER003",
-                "customer_id": "CUST003",
-                "loan_type": "personal",
-                "max_amount": 200000,
-                "interest_rate": 14.0,  # Amit gets 14% for TEST 2
-                "tenure_options": [12, 24, 36],
-                "processing_fee": 2.5
-            },
-            {
-                "offer_id": "OFFER004",
-                "customer_id": "CUST004",
-                "loan_type": "personal",
-                "max_amount": 700000,
-                "interest_rate": 11.5,
-                "tenure_options": [24, 36, 48],
-                "processing_fee": 1.0
-            },
-            {
-                "offer_id": "OFFER005",
-                "customer_id": "CUST005",
-                "loan_type": "personal",
-                "max_amount": 150000,
-                "interest_rate": 15.0,  # Vikram gets 15% for TEST 3
-                "tenure_options": [12, 24],
-                "processing_fee": 3.0
-            },
-            {
-                "offer_id": "OFFER006",
-                "customer_id": "CUST006",
-                "loan_type": "personal",
-                "max_amount": 400000,
-                "interest_rate": 12.0,
-                "tenure_options": [12, 24, 36],
-                "processing_fee": 1.8
-            }
-        ]
+        customers_path = os.path.join(seed_dir, "customers.jsonl")
+        offers_path = os.path.join(seed_dir, "offers.jsonl")
+        version = os.getenv("SEED_VERSION")
+        if not version:
+            # Cheap fingerprint: avoids hashing multi-GB files on every boot
+            parts = []
+            for path in (customers_path, offers_path):
+                if os.path.exists(path):
+                    stat = os.stat(path)
+                    parts.append(f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}")
+            version = "file:" + "|".join(parts)
+        
+        customers = _iter_jsonl(customers_path) if os.path.exists(customers_path) else iter(())
+        offers = _iter_jsonl(offers_path) if os.path.exists(offers_path) else iter(())
+        return version, customers, offers
+    
+    def _acquire_seed_lock(self):
+        """Cross-process lock document in `_meta`; in-memory mode only needs a thread lock"""
+        if not self.is_connected:
+            return self._seed_lock.acquire(blocking=False)
+        
+        now = datetime.now(timezone.utc)
+        try:
+            self.get_collection("_meta").find_one_and_update(
+                {
+                    "_id": "seed_lock",
+                    "$or": [{"expires_at": {"$lt": now}}, {"owner": self._instance_id}]
+                },
+                {"$set": {"owner": self._instance_id, "expires_at": now + timedelta(seconds=SEED_LOCK_TTL_SECONDS)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Another process holds an unexpired lock
+            return False
+    
+    def _release_seed_lock(self):
+        if not self.is_connected:
+            if self._seed_lock.locked():
+                self._seed_lock.release()
+            return
+        self.get_collection("_meta").delete_one({"_id": "seed_lock", "owner": self._instance_id})
+    
+    def seed_initial_data(self, seed_dir=None, force=False):
+        """
+        Idempotently seed customers and offers.
         
-        customers_col = self.get_collection("customers")
-        offers_col = self.get_collection("offers")
+        Documents are bulk-upserted by customer_id / offer_id, so live data is
+        never wiped. The seeded version is stored in `_meta`; a matching version
+        skips all work, and a lock document ensures only one process seeds.
+        `seed_dir` (or SEED_DIR) may point at customers.jsonl / offers.jsonl,
+        which are streamed from disk in batches.
+        """
+        seed_dir = seed_dir or os.getenv("SEED_DIR")
+        version, customers, offers = self._seed_source(seed_dir)
+        
+        if not self.is_connected and not self._seed_pending:
+            # Re-seed into MongoDB once the background probe upgrades us
+            self._seed_pending = True
+            self.on_connect(lambda: self.seed_initial_data(seed_dir=seed_dir))
+        
+        meta_col = self.get_collection("_meta")
         
         try:
-            # Clear and insert fresh data
-            customers_col.delete_many({})
-            offers_col.delete_many({})
+            stored = meta_col.find_one({"_id": "seed_version"})
+            if stored and stored.get("version") == version and not force:
+                logger.info("Seed data already at version %s; skipping", version)
+                return True
             
-            customers_col.insert_many(customers)
-            offers_col.insert_many(offers)
+            if not self._acquire_seed_lock():
+                logger.info("Another process is seeding; skipping")
+                return True
             
-            print(f"✅ Seeded {len(customers)} customers and {len(offers)} offers")
-            print(f"   TEST 1 Customer: Rahul Sharma (CUST001) - Interest: 12.5%")
-            print(f"   TEST 2 Customer: Amit Kumar (CUST003) - Interest: 14.0%")
-            print(f"   TEST 3 Customer: Vikram Singh (CUST005) - Interest: 15.0%")
+            try:
+                started = time.perf_counter()
+                if self.is_connected:
+                    self.get_collection("customers").create_index("customer_id", unique=True)
+                    self.get_collection("customers").create_index("phone")
+                    self.get_collection("offers").create_index("offer_id", unique=True)
+                    self.get_collection("offers").create_index("customer_id")
+                
+                with self.bulk_load():
+                    customer_count = self.bulk_upsert("customers", customers, "customer_id")
+                    offer_count = self.bulk_upsert("offers", offers, "offer_id")
+                
+                meta_col.update_one(
+                    {"_id": "seed_version"},
+                    {"$set": {"version": version, "seeded_at": datetime.now(timezone.utc)}},
+                    upsert=True
+                )
+            finally:
+                self._release_seed_lock()
+            
+            logger.info(
+                "Seeded %d customers and %d offers (version %s, %.2fs)",
+                customer_count, offer_count, version, time.perf_counter() - started
+            )
             return True
         except Exception as e:
-            print(f"⚠️ Error seeding data: {e}")
+            logger.exception("Error seeding data")
             return False
 
 
@@ -270,6 +534,8 @@ class InMemoryCollection:
     def find_one(self, query):
         """Find one document matching query"""
         collection = self.storage.get(self.collection_name, {})
+        if "_id" in query and len(query) == 1:
+            return collection.get(query["_id"])
         for key, doc in collection.items():
             match = True
             for field, value in query.items():
@@ -280,6 +546,24 @@ class InMemoryCollection:
                 return doc
         return None
     
+    def find(self, query=None):
+        """Iterate documents matching equality and `{"$in": [...]}` conditions"""
+        conditions = [
+            (field, set(value["$in"]) if isinstance(value, dict) and "$in" in value else {value})
+            for field, value in (query or {}).items()
+        ]
+        collection = self.storage.get(self.collection_name, {})
+        if len(conditions) == 1:
+            # Documents are stored under their key field (customer_id, offer_id, ...): look those up directly
+            field, values = conditions[0]
+            docs = [collection.get(value) for value in values]
+            if all(doc is not None and doc.get(field) == value for doc, value in zip(docs, values)):
+                yield from docs
+                return
+        for doc in list(collection.values()):
+            if all(doc.get(field) in values for field, values in conditions):
+                yield doc
+    
     def insert_many(self, documents):
         """Insert multiple documents"""
         collection = self.storage[self.collection_name]
@@ -289,6 +573,30 @@ class InMemoryCollection:
             collection[key] = doc
         return True
     
+    def upsert_many(self, documents, key_field):
+        """Insert or merge documents keyed by `key_field`"""
+        collection = self.storage[self.collection_name]
+        for doc in documents:
+            key = doc[key_field]
+            if key in collection:
+                collection[key].update(doc)
+            else:
+                collection[key] = dict(doc)
+        return True
+    
+    def update_one(self, query, update, upsert=False):
+        """Apply a `$set` update to the first match (query by `_id` only)"""
+        collection = self.storage[self.collection_name]
+        key = query.get("_id")
+        doc = collection.get(key) if key is not None else self.find_one(query)
+        if doc is None:
+            if not upsert:
+                return False
+            doc = dict(query)
+            collection[key if key is not None else str(len(collection))] = doc
+        doc.update(update.get("$set", {}))
+        return True
+    
     def delete_many(self, query):
         """Delete all documents (for reset)"""
         if not query or query == {}:
@@ -0,0 +1,106 @@
+"""
+Memoized underwriting decisions.
+
+While a customer sits in the pending salary-slip loop, every message re-runs
+underwriting with the same inputs. `decision_cache` maps (customer_id,
+amount, tenure, rate, salary-slip status, verified salary, rules version)
+to the RuleDecision, so those turns skip the rule chain and EMI maths; the
+customer's terms come from the offer book snapshot (services/offer_book.py)
+without a database round trip either way.
+
+Messages are still rendered per turn (locale and hot-reloaded templates
+stay live; a render is a few microseconds).
+
+Writes through `db.bulk_upsert` to customers, offers or the offer book drop
+the affected customers' entries, and a switch from the in-memory fallback to
+MongoDB drops everything. A lookup that raced an invalidation is not stored
+(see `token`). Writes made by other processes are not seen, so
+UNDERWRITING_CACHE_TTL_SECONDS bounds how stale an entry can get; 0 disables
+the cache. The hit ratio is exported as
+`cache_hit_ratio{cache="underwriting_decision"}`.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services.database import db
+from services.metrics import record_cache_lookup
+
+UNDERWRITING_CACHE_TTL_SECONDS = float(os.getenv("UNDERWRITING_CACHE_TTL_SECONDS", "300"))
+UNDERWRITING_CACHE_MAX_ENTRIES = int(os.getenv("UNDERWRITING_CACHE_MAX_ENTRIES", "10000"))
+
+
+class DecisionCache:
+    """Bounded TTL cache keyed by tuples whose first element is the customer_id"""
+
+    def __init__(self, name, ttl=UNDERWRITING_CACHE_TTL_SECONDS, max_entries=UNDERWRITING_CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def token(self):
+        """Take before reading the inputs of a value; `put` drops it if an invalidation happened since"""
+        return self._epoch
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] < time.monotonic():
+                    del self._entries[key]
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+        record_cache_lookup(self.name, entry is not None)
+        return entry[1] if entry is not None else None
+
+    def put(self, key, value, token):
+        if not self.enabled:
+            return
+        with self._lock:
+            if token != self._epoch:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, customer_ids):
+        """Drop every entry of `customer_ids`"""
+        customer_ids = set(customer_ids)
+        with self._lock:
+            self._epoch += 1
+            for key in [key for key in self._entries if key[0] in customer_ids]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Global cache
+decision_cache = DecisionCache("underwriting_decision")
+
+
+def _profiles_updated(collection_name, customer_ids, documents):
+    if collection_name in ("customers", "offers", "offer_book"):
+        decision_cache.invalidate(customer_ids)
+
+
+db.on_profile_update(_profiles_updated)
+db.on_connect(decision_cache.clear)
+db.on_bulk_load(decision_cache.clear)
@@ -0,0 +1,183 @@
+"""
+Worker startup and graceful shutdown.
+
+Before a worker takes traffic, `warmup` pays the one-off costs a first
+request would otherwise hit: compiling the message templates and the
+underwriting rules, running the routing and intent regexes, rendering a
+throwaway sanction letter (ReportLab fonts, styles and paragraph parser) and
+a first customer lookup (database client / connection pool).
+STARTUP_WARMUP=0 skips it.
+
+On SIGTERM the worker *drains* before uvicorn sees the signal: it is marked
+draining (/api/health answers 503 so the load balancer stops routing to it,
+new chat turns get 503 + Retry-After + `Connection: close` so clients retry
+on another worker), keeps accepting connections for DRAIN_DELAY seconds so
+the load balancer can notice, then waits up to DRAIN_TIMEOUT seconds for the
+chat turns already running - HTTP and WebSocket - to finish and commit their
+state. Only then is uvicorn's own exit handler run: it stops accepting,
+closes sockets and runs the lifespan shutdown, which flushes and closes the
+audit log, traffic recorder and database. (Left to itself, uvicorn stops
+accepting and waits for connections before the lifespan shutdown starts,
+so nobody would ever see the 503.) Other exits (Ctrl+C, a server without
+our signal handler) drain in the lifespan shutdown instead.
+
+Pair DRAIN_DELAY + DRAIN_TIMEOUT with the platform's stop grace period, and
+DRAIN_TIMEOUT with uvicorn's `--timeout-graceful-shutdown` (see the
+Procfile), each a little above.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from starlette.concurrency import run_in_threadpool
+
+from services import pdf_generator
+from services.database import db
+from services.message_templates import messages
+from services.shared_state import shared_state
+from services.underwriting_rules import underwriting_rules
+
+logger = logging.getLogger(__name__)
+
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "30"))
+DRAIN_DELAY = float(os.getenv("DRAIN_DELAY", "0"))
+SHARED_STATE_CONNECT_TIMEOUT = float(os.getenv("SHARED_STATE_CONNECT_TIMEOUT", "5"))
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") != "0"
+
+WARMUP_MESSAGES = ["I need 3 lakh for 2 years", "My phone is 9876543210", "check eligibility",
+                   "₹3.5 lakh for car", "Yes, generate sanction letter"]
+
+
+class InFlight:
+    """Chat turns currently running in this worker, by kind; lives on the event loop"""
+
+    def __init__(self):
+        self.draining = False
+        self._running = Counter()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def running(self):
+        return sum(self._running.values())
+
+    @contextmanager
+    def track(self, kind):
+        self._running[kind] += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._running[kind] -= 1
+            if not self.running:
+                self._idle.set()
+
+    async def wait_idle(self, timeout):
+        """True once nothing is running, False if `timeout` passed first"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def snapshot(self):
+        return {kind: count for kind, count in self._running.items() if count}
+
+
+def warmup(master_agent):
+    """Run each warmup step once (blocking; call from the threadpool); returns {step: ms}"""
+    def routing():
+        for message in WARMUP_MESSAGES:
+            master_agent.determine_next_agent(message, {}, None)
+            master_agent.extract_loan_intent(message, None)
+
+    steps = {
+        "templates": messages.reload,
+        "underwriting_rules": underwriting_rules.current,
+        "routing": routing,
+        "pdf": pdf_generator.warm_up,
+        "customer_lookup": lambda: db.get_collection("customers").find_one({"customer_id": "CUST001"}),
+    }
+    timings = {}
+    started = time.perf_counter()
+    for name, step in steps.items():
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            # A cold first request is better than a worker that never starts
+            logger.warning("Warmup step %s failed: %s", name, e)
+        timings[name] = round((time.perf_counter() - step_started) * 1000, 1)
+    logger.info("Warmup complete", extra={"duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                                          "steps_ms": timings})
+    return timings
+
+
+async def prepare_shared_state():
+    """
+    Multi-worker only: wait briefly for MongoDB and create the shared-state
+    indexes. Without MongoDB the workers would each keep their own session
+    ordering, idempotency and resume state, so the worker refuses to start.
+    """
+    if shared_state.workers <= 1:
+        return
+    if not await run_in_threadpool(db.wait_connected, SHARED_STATE_CONNECT_TIMEOUT):
+        supervisor = multiprocessing.parent_process()
+        if supervisor is not None:
+            # uvicorn's --workers supervisor never notices a worker that failed startup; stop it too
+            os.kill(supervisor.pid, signal.SIGTERM)
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={shared_state.workers} needs MongoDB for shared session state, but it is not "
+            f"reachable after {SHARED_STATE_CONNECT_TIMEOUT:g}s; fix MONGODB_URI or run a single worker"
+        )
+    await run_in_threadpool(shared_state.ensure_indexes)
+    logger.info("Shared session state enabled", extra={"workers": shared_state.workers})
+
+
+async def drain(timeout=DRAIN_TIMEOUT, delay=0):
+    """Stop taking chat turns, keep answering 503 for `delay` seconds and wait for the running ones to finish"""
+    in_flight.draining = True
+    started = time.perf_counter()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    running = in_flight.snapshot()
+    if running:
+        logger.info("Draining in-flight chat turns", extra={"in_flight": running, "timeout_s": timeout})
+    if await in_flight.wait_idle(timeout):
+        logger.info("Drained", extra={"duration_ms": round((time.perf_counter() - started) * 1000, 1)})
+    else:
+        logger.warning("Drain timed out; abandoning in-flight chat turns", extra={"in_flight": in_flight.snapshot()})
+
+
+def install_drain_on_sigterm():
+    """
+    Take over SIGTERM from uvicorn (call from the lifespan startup): drain first, while
+    still accepting connections, then exit through uvicorn's SIGINT handler.
+    No-op where the loop can't handle signals (not the main thread, e.g. TestClient; Windows).
+    """
+    loop = asyncio.get_running_loop()
+
+    async def drain_then_exit():
+        await drain(delay=DRAIN_DELAY)
+        # uvicorn keeps its handler for SIGINT; the first one is a graceful exit
+        os.kill(os.getpid(), signal.SIGINT)
+
+    def on_sigterm():
+        if not in_flight.draining:
+            logger.info("SIGTERM received, draining before shutdown", extra={"delay_s": DRAIN_DELAY})
+            loop.create_task(drain_then_exit())
+
+    try:
+        loop.add_signal_handler(signal.SIGTERM, on_sigterm)
+        return True
+    except (NotImplementedError, RuntimeError, ValueError):
+        return False
+
+
+# Global tracker
+in_flight = InFlight()
@@ -0,0 +1,37 @@
+"""
+Gemini model handles for the agents.
+
+`google.generativeai` (and the gRPC/protobuf stack under it) is the single
+most expensive import of the backend - about half of `import backend`.
+It is only imported, and configured once, when GEMINI_API_KEY is set;
+without a key every agent runs its deterministic path and the package is
+never loaded.
+"""
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-pro")
+
+_configure_lock = threading.Lock()
+_genai = None
+
+
+def _client():
+    global _genai
+    with _configure_lock:
+        if _genai is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            _genai = genai
+    return _genai
+
+
+def gemini_model(model_name=GEMINI_MODEL):
+    """A GenerativeModel, or None when no API key is configured"""
+    if not os.getenv("GEMINI_API_KEY"):
+        return None
+    return _client().GenerativeModel(model_name)
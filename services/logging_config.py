@@ -0,0 +1,122 @@
+"""
+Structured, leveled, non-blocking logging.
+
+- JSON (default) or plain-text output, chosen with LOG_FORMAT
+- Level from LOG_LEVEL (default INFO)
+- Records are handed to a QueueHandler; a QueueListener thread does the
+  actual formatting and I/O, so logging never blocks the event loop
+- Every record carries the current session_id / request_id (contextvars)
+- DEBUG records are sampled per request (LOG_DEBUG_SAMPLE_RATE)
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+session_id_var = contextvars.ContextVar("session_id", default=None)
+request_id_var = contextvars.ContextVar("request_id", default=None)
+debug_sampled_var = contextvars.ContextVar("debug_sampled", default=True)
+
+# Attributes present on every LogRecord; anything else came in via `extra=`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class ContextFilter(logging.Filter):
+    """Attach request context and drop unsampled DEBUG records"""
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and not debug_sampled_var.get():
+            return False
+        record.session_id = session_id_var.get()
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and value is not None:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(session_id)s/%(request_id)s] %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        extras = {k: v for k, v in record.__dict__.items()
+                  if k not in _RESERVED_ATTRS and k not in ("session_id", "request_id") and v is not None}
+        return f"{line} {extras}" if extras else line
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """Install the queue-backed root handler (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    sink = logging.StreamHandler(stream or sys.stderr)
+    sink.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    # Unbounded queue: enqueueing is O(1) and never waits on the sink
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, sink, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush pending records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def bind_request(session_id=None, request_id=None, sample_rate=None):
+    """
+    Bind session/request IDs for the current context and decide whether this
+    request's DEBUG logs are kept. Returns tokens for `unbind_request`.
+    """
+    rate = LOG_DEBUG_SAMPLE_RATE if sample_rate is None else sample_rate
+    return (
+        session_id_var.set(session_id),
+        request_id_var.set(request_id),
+        debug_sampled_var.set(random.random() < rate),
+    )
+
+
+def unbind_request(tokens):
+    session_token, request_token, sampled_token = tokens
+    session_id_var.reset(session_token)
+    request_id_var.reset(request_token)
+    debug_sampled_var.reset(sampled_token)
@@ -0,0 +1,154 @@
+"""
+Precompiled, locale-aware agent message templates.
+
+Templates live in `templates/messages/<locale>.json` (one key per message,
+stored as a list of lines) and use `str.format` placeholders. Each template
+is compiled once into a function that returns a single f-string, so
+rendering a message is one formatting pass instead of a chain of string
+concatenations.
+
+Locales fall back to MESSAGE_LOCALE and then to English for missing keys.
+The catalog re-checks the template files every TEMPLATE_RELOAD_INTERVAL
+seconds and swaps in a freshly compiled copy when they change; a broken
+edit is logged and the previous templates stay live.
+"""
+import glob
+import json
+import keyword
+import logging
+import os
+import string
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_TEMPLATE_DIR = os.getenv(
+    "MESSAGE_TEMPLATE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "messages"),
+)
+MESSAGE_LOCALE = os.getenv("MESSAGE_LOCALE", "en")
+TEMPLATE_RELOAD_INTERVAL = float(os.getenv("TEMPLATE_RELOAD_INTERVAL", "2.0"))  # 0 disables hot reload
+
+FALLBACK_LOCALE = "en"
+
+_formatter = string.Formatter()
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class MessageTemplate:
+    """One template compiled to `render(**values) -> str`"""
+
+    __slots__ = ("key", "text", "fields", "render")
+
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+        parts, fields = [], []
+        try:
+            parsed = list(_formatter.parse(text))
+        except ValueError as e:
+            raise TemplateError(f"{key}: {e}") from None
+        for literal, field, spec, conversion in parsed:
+            parts.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is None:
+                continue
+            if not field.isidentifier() or keyword.iskeyword(field):
+                raise TemplateError(f"{key}: placeholder {{{field}}} must be a plain name")
+            if conversion not in (None, "r", "s", "a"):
+                raise TemplateError(f"{key}: unsupported conversion !{conversion} for {{{field}}}")
+            if any(c in spec for c in "{}'\"\\"):
+                raise TemplateError(f"{key}: unsupported format spec {spec!r} for {{{field}}}")
+            parts.append("{" + field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}")
+            fields.append(field)
+
+        self.fields = frozenset(fields)
+        params = "".join(f"{name}, " for name in sorted(self.fields))
+        signature = f"*, {params}**_" if params else "**_"
+        source = f"def render({signature}):\n    return f{''.join(parts)!r}\n"
+        namespace = {}
+        exec(compile(source, f"<template {key}>", "exec"), {}, namespace)
+        self.render = namespace["render"]
+
+
+def compile_catalog(directory):
+    """{locale: {key: MessageTemplate}} for every <locale>.json in directory"""
+    catalog = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        locale = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        catalog[locale] = {
+            key: MessageTemplate(key, "\n".join(value) if isinstance(value, list) else value)
+            for key, value in raw.items() if not key.startswith("_")
+        }
+    return catalog
+
+
+class MessageCatalog:
+    def __init__(self, directory=MESSAGE_TEMPLATE_DIR, default_locale=MESSAGE_LOCALE,
+                 reload_interval=TEMPLATE_RELOAD_INTERVAL):
+        self.directory = directory
+        self.default_locale = default_locale
+        self.reload_interval = reload_interval
+        self._templates = None
+        self._signature = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _files_signature(self):
+        return tuple(
+            (path, os.stat(path).st_mtime_ns, os.stat(path).st_size)
+            for path in sorted(glob.glob(os.path.join(self.directory, "*.json")))
+        )
+
+    def reload(self, force=False):
+        """Recompile if the template files changed; the live catalog is swapped, never mutated"""
+        with self._reload_lock:
+            signature = self._files_signature()
+            if not force and signature == self._signature and self._templates is not None:
+                return False
+            try:
+                templates = compile_catalog(self.directory)
+            except (OSError, ValueError, SyntaxError) as e:  # SyntaxError: a template MessageTemplate failed to reject
+                if self._templates is None:
+                    raise
+                logger.warning("Message template reload failed, keeping previous templates: %s", e)
+                self._signature = signature  # don't retry the same broken edit every check
+                return False
+            self._templates = templates
+            self._signature = signature
+            logger.info("Message templates loaded", extra={"locales": sorted(templates)})
+            return True
+
+    def _catalog(self):
+        if self._templates is None:
+            self.reload()
+        elif self.reload_interval > 0:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.reload_interval
+                self.reload()
+        return self._templates
+
+    @property
+    def locales(self):
+        return sorted(self._catalog())
+
+    def get(self, key, locale=None):
+        catalog = self._catalog()
+        for candidate in (locale, self.default_locale, FALLBACK_LOCALE):
+            template = catalog.get(candidate, {}).get(key) if candidate else None
+            if template is not None:
+                return template
+        raise KeyError(f"No message template {key!r}")
+
+    def render(self, key, locale=None, **values):
+        return self.get(key, locale).render(**values)
+
+
+# Global message catalog
+messages = MessageCatalog()
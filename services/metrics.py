@@ -0,0 +1,230 @@
+"""
+Minimal, dependency-free Prometheus-style metrics.
+
+Counters and histograms keep per-label-set children; the hot path is a dict
+lookup, a bisect over the bucket bounds and an uncontended lock, i.e. about
+a microsecond per observation. `render()` produces the Prometheus text exposition
+format served at /metrics.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds: 100µs .. 10s
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def render(self, metric, values):
+        return [f"{metric.name}{_format_labels(metric.labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def render(self, metric, values):
+        with self._lock:
+            counts = list(self.counts)
+            total_sum = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(metric.labelnames, values, ("le", _format_value(bound)))
+            lines.append(f"{metric.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(metric.labelnames, values)
+        lines.append(f"{metric.name}_sum{labels} {_format_value(total_sum)}")
+        lines.append(f"{metric.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CHAT_REQUESTS = REGISTRY.counter(
+    "chat_requests_total", "Chat requests by HTTP outcome", ["status"])
+CHAT_LATENCY = REGISTRY.histogram(
+    "chat_request_duration_seconds", "End-to-end /api/chat latency")
+AGENT_REQUESTS = REGISTRY.counter(
+    "agent_requests_total", "Turns routed to each agent by MasterAgent", ["agent"])
+AGENT_LATENCY = REGISTRY.histogram(
+    "agent_request_duration_seconds", "Agent process() latency per routed agent", ["agent"])
+DB_LATENCY = REGISTRY.histogram(
+    "db_lookup_duration_seconds", "Database lookup latency", ["collection"])
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_call_duration_seconds", "LLM call latency", ["agent"])
+PDF_RENDER_LATENCY = REGISTRY.histogram(
+    "pdf_render_duration_seconds", "Sanction letter PDF render time")
+UNDERWRITING_DECISIONS = REGISTRY.counter(
+    "underwriting_decisions_total", "Underwriting outcomes", ["decision"])
+CONTEXT_COMPACTIONS = REGISTRY.counter(
+    "context_compactions_total", "Conversation context compactions by reason", ["reason"])
+CONTEXT_BYTES = REGISTRY.histogram(
+    "context_size_bytes", "Serialized conversation context size after compaction",
+    buckets=(512, 1024, 2048, 4096, 8192, 16384, 32768, 65536))
+SESSION_LOCK_WAIT = REGISTRY.histogram(
+    "session_lock_wait_seconds", "Time /api/chat waited for an in-flight turn of the same session")
+WS_EVENTS = REGISTRY.counter(
+    "ws_events_total", "Events pushed over /ws/chat by type", ["type"])
+CACHE_LOOKUPS = REGISTRY.counter(
+    "cache_lookups_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+
+
+class _CacheHitRatio:
+    """Gauge derived from CACHE_LOOKUPS at scrape time"""
+    name = "cache_hit_ratio"
+
+    def render(self):
+        lines = [f"# HELP {self.name} Cache hit ratio since process start", f"# TYPE {self.name} gauge"]
+        for cache, ratio in sorted(cache_hit_rates().items()):
+            lines.append(f"{self.name}{_format_labels(('cache',), (cache,))} {_format_value(ratio)}")
+        return lines
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def cache_hit_rates():
+    """{cache_name: hit_rate} computed from CACHE_LOOKUPS"""
+    totals = {}
+    for (cache, result), child in list(CACHE_LOOKUPS._children.items()):
+        hits, lookups = totals.get(cache, (0.0, 0.0))
+        totals[cache] = (hits + (child.value if result == "hit" else 0.0), lookups + child.value)
+    return {cache: (hits / lookups if lookups else 0.0) for cache, (hits, lookups) in totals.items()}
+
+
+REGISTRY.register(_CacheHitRatio())
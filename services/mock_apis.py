@@ -1,5 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from services.database import db
+from services.metrics import DB_LATENCY
+from services.offer_book import offer_book
 import random
 from typing import Dict, Any
 
@@ -9,7 +11,8 @@ router = APIRouter()
 async def get_customer_by_phone(phone: str) -> Dict[str, Any]:
     """Mock CRM API - Verify customer"""
     customers_col = db.get_collection("customers")
-    customer = customers_col.find_one({"phone": phone})
+    with DB_LATENCY.labels("customers").time():
+        customer = customers_col.find_one({"phone": phone})
     
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -27,7 +30,8 @@ async def get_customer_by_phone(phone: str) -> Dict[str, Any]:
 async def get_credit_score(customer_id: str) -> Dict[str, Any]:
     """Mock Credit Bureau API - Get credit score"""
     customers_col = db.get_collection("customers")
-    customer = customers_col.find_one({"customer_id": customer_id})
+    with DB_LATENCY.labels("customers").time():
+        customer = customers_col.find_one({"customer_id": customer_id})
     
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -46,28 +50,19 @@ async def get_credit_score(customer_id: str) -> Dict[str, Any]:
 
 @router.get("/offer/preapproved/{customer_id}")
 async def get_preapproved_offer(customer_id: str) -> Dict[str, Any]:
-    """Mock OfferMart API - Get pre-approved offers"""
-    offers_col = db.get_collection("offers")
-    offer = offers_col.find_one({"customer_id": customer_id})
+    """Mock OfferMart API - Get pre-approved offers (from the materialized offer book)"""
+    offer = offer_book.get(customer_id)
     
     if not offer:
-        # Return default offer
-        return {
-            "customer_id": customer_id,
-            "preapproved_limit": 100000,
-            "interest_rate": 15.0,
-            "tenure_options": [12, 24],
-            "processing_fee": 2.5,
-            "special_offer": False
-        }
+        raise HTTPException(status_code=404, detail="Customer not found")
     
     return {
         "customer_id": customer_id,
-        "preapproved_limit": offer["max_amount"],
+        "preapproved_limit": offer["preapproved_limit"],
         "interest_rate": offer["interest_rate"],
         "tenure_options": offer["tenure_options"],
         "processing_fee": offer["processing_fee"],
-        "special_offer": True
+        "special_offer": offer["special_offer"]
     }
 
 @router.post("/upload/salary-slip")
@@ -0,0 +1,218 @@
+"""
+Materialized pre-approved offers: one `offer_book` row per customer.
+
+`offers` only holds curated offers, and customers without one used to get
+whatever default the caller hardcoded. A book row carries everything
+underwriting and the OfferMart mock need, priced once:
+
+- credit score and salary from the customer
+- limit: the customer's own preapproved_limit, else the curated offer's
+  max_amount, else the pricing policy
+- rate, tenure options and processing fee: the curated offer, else the
+  pricing policy (`pricing` in rules/underwriting.json, the only source
+  of offer defaults)
+- special_offer (a curated offer exists) and the policy version used
+
+`build()` materializes every customer in batches of OFFER_BOOK_BATCH_SIZE
+with bulk upserts (`python -m services.offer_book`, and once after each
+`db.bulk_load()` such as seeding). Other writes through `db.bulk_upsert`
+to customers or offers re-price just those customers.
+Each worker serves from an in-memory snapshot keyed by customer_id. A
+customer missing from it, or priced by an older policy version, is
+re-priced on read. Every OFFER_BOOK_RELOAD_INTERVAL seconds the snapshot
+is reloaded from the collection, so workers see each other's refreshes.
+
+Usage:
+    python -m services.offer_book
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from itertools import islice
+
+from services.database import db
+from services.metrics import DB_LATENCY, record_cache_lookup
+from services.tracing import span
+from services.underwriting_rules import underwriting_rules
+
+logger = logging.getLogger(__name__)
+
+OFFER_BOOK_COLLECTION = "offer_book"
+OFFER_BOOK_BATCH_SIZE = int(os.getenv("OFFER_BOOK_BATCH_SIZE", "1000"))
+OFFER_BOOK_RELOAD_INTERVAL = float(os.getenv("OFFER_BOOK_RELOAD_INTERVAL", "300"))  # 0 disables
+
+
+def offer_row(customer, offer, ruleset):
+    """The book row of `customer` (with its curated `offer`, if any) under `ruleset`'s pricing"""
+    priced = ruleset.pricing.price(customer)
+    offer = offer or {}
+    return {
+        "customer_id": customer["customer_id"],
+        "credit_score": customer.get("credit_score", ruleset.defaults["credit_score"]),
+        "salary": customer.get("salary", ruleset.defaults["salary"]),
+        "preapproved_limit": customer.get("preapproved_limit") or offer.get("max_amount") or priced["preapproved_limit"],
+        "interest_rate": offer.get("interest_rate", priced["interest_rate"]),
+        "tenure_options": offer.get("tenure_options") or priced["tenure_options"],
+        "processing_fee": offer.get("processing_fee", priced["processing_fee"]),
+        "special_offer": bool(offer),
+        "offer_id": offer.get("offer_id"),
+        "pricing_version": ruleset.version,
+    }
+
+
+def _offers_by_customer(offers):
+    by_customer = {}
+    for offer in offers:
+        by_customer.setdefault(offer["customer_id"], offer)
+    return by_customer
+
+
+class OfferBook:
+    def __init__(self, database=db, rules=underwriting_rules, batch_size=OFFER_BOOK_BATCH_SIZE,
+                 reload_interval=OFFER_BOOK_RELOAD_INTERVAL):
+        self.database = database
+        self.rules = rules
+        self.batch_size = batch_size
+        self.reload_interval = reload_interval
+        self._rows = {}
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reloader = None
+
+    def get(self, customer_id, ruleset=None):
+        """The customer's row, re-priced first if missing or from another policy version; None if unknown"""
+        ruleset = ruleset or self.rules.current()
+        row = self._rows.get(customer_id)
+        hit = row is not None and row["pricing_version"] == ruleset.version
+        record_cache_lookup("offer_book", hit)
+        if not hit:
+            row = self.refresh([customer_id], ruleset).get(customer_id)
+        return row
+
+    def refresh(self, customer_ids, ruleset=None, offer_ids=()):
+        """
+        Re-price `customer_ids` into the snapshot and the collection; returns {customer_id: row}.
+        Offers are looked up by key (`offer_ids` just written plus those already in the snapshot)
+        when that covers every customer, by customer_id otherwise.
+        """
+        ruleset = ruleset or self.rules.current()
+        customer_ids = list(customer_ids)
+        query = {"customer_id": {"$in": customer_ids}}
+        with DB_LATENCY.labels("customers").time(), span("db.find", collection="customers"):
+            customers = list(self.database.get_collection("customers").find(query))
+        known = [self._rows.get(customer_id) for customer_id in customer_ids]
+        if offer_ids or all(row is not None for row in known):
+            offer_ids = set(offer_ids) | {row["offer_id"] for row in known if row and row.get("offer_id")}
+            query = {"offer_id": {"$in": sorted(offer_ids)}}
+        with DB_LATENCY.labels("offers").time(), span("db.find", collection="offers"):
+            offers = _offers_by_customer(self.database.get_collection("offers").find(query))
+        rows = {c["customer_id"]: offer_row(c, offers.get(c["customer_id"]), ruleset) for c in customers}
+        # Snapshot first: the write below is what invalidates memoized decisions
+        self._rows.update(rows)
+        for customer_id in set(customer_ids) - rows.keys():
+            self._rows.pop(customer_id, None)
+        self._write(list(rows.values()))
+        return rows
+
+    def build(self, ruleset=None):
+        """Materialize every customer in batches; returns the number of rows"""
+        ruleset = ruleset or self.rules.current()
+        with self._build_lock:
+            started = time.perf_counter()
+            offers = _offers_by_customer(self.database.get_collection("offers").find({}))
+            customers = iter(self.database.get_collection("customers").find({}))
+            seen = set()
+            while True:
+                batch = [offer_row(c, offers.get(c["customer_id"]), ruleset)
+                         for c in islice(customers, self.batch_size)]
+                if not batch:
+                    break
+                self._rows.update((row["customer_id"], row) for row in batch)
+                seen.update(row["customer_id"] for row in batch)
+                self._write(batch)
+            for customer_id in self._rows.keys() - seen:
+                self._rows.pop(customer_id, None)
+            logger.info("Offer book built", extra={"rows": len(seen), "pricing_version": ruleset.version,
+                                                   "duration_ms": round((time.perf_counter() - started) * 1000, 1)})
+            return len(seen)
+
+    def load(self, ruleset=None):
+        """Snapshot from the collection; rebuilds when it is empty or priced by another policy version"""
+        ruleset = ruleset or self.rules.current()
+        rows = {}
+        for row in self.database.get_collection(OFFER_BOOK_COLLECTION).find({}):
+            if row.get("pricing_version") != ruleset.version:
+                return self.build(ruleset)
+            rows[row["customer_id"]] = {k: v for k, v in row.items() if k != "_id"}
+        if not rows:
+            return self.build(ruleset)
+        self._rows = rows
+        return len(rows)
+
+    def _write(self, rows):
+        if not rows:
+            return
+        try:
+            self.database.bulk_upsert(OFFER_BOOK_COLLECTION, rows, "customer_id", self.batch_size)
+        except Exception as e:
+            # The snapshot already serves the new rows; the collection catches up on the next refresh
+            logger.warning("Offer book write failed: %s", e)
+
+    def start(self):
+        """Load (or build) the snapshot, then reload it in the background (blocking; call from the threadpool)"""
+        self.load()
+        if self.reload_interval > 0 and self._reloader is None:
+            self._reloader = threading.Thread(target=self._reload_loop, name="offer-book-reload", daemon=True)
+            self._reloader.start()
+
+    def _reload_loop(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.load()
+            except Exception:
+                logger.exception("Offer book reload failed")
+
+    def stop(self):
+        self._stop.set()
+
+    def __len__(self):
+        return len(self._rows)
+
+
+# Global offer book
+offer_book = OfferBook()
+
+
+def _profiles_updated(collection_name, customer_ids, documents):
+    if collection_name == "customers" and customer_ids:
+        offer_book.refresh(customer_ids)
+    elif collection_name == "offers" and customer_ids:
+        offer_book.refresh(customer_ids, offer_ids=[doc["offer_id"] for doc in documents if "offer_id" in doc])
+
+
+db.on_profile_update(_profiles_updated)
+db.on_bulk_load(lambda: offer_book.build())  # seeding / data_generator: one pass, not one refresh per batch
+db.on_connect(lambda: offer_book.load())  # the data source changed under the snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Materialize the pre-approved offer book")
+    parser.add_argument("--wait-mongo", type=float, default=10.0,
+                        help="seconds to wait for MongoDB before falling back to memory")
+    args = parser.parse_args(argv)
+
+    if not db.wait_connected(args.wait_mongo):
+        print("⚠️ MongoDB unavailable; building the in-memory book", file=sys.stderr)
+        db.seed_initial_data()
+    started = time.perf_counter()
+    rows = offer_book.build()
+    elapsed = time.perf_counter() - started
+    print(f"✅ Materialized {rows:,} offers (pricing {underwriting_rules.current().version}) "
+          f"in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} customers/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,21 +6,15 @@ from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 import os
 from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
 from models.schemas import SanctionLetter
 
-def generate_sanction_letter_pdf(letter: SanctionLetter, output_path: str = None) -> str:
-    """Generate sanction letter PDF"""
-    if not output_path:
-        os.makedirs("sanction_letters", exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_path = f"sanction_letters/sanction_{timestamp}.pdf"
-    
-    doc = SimpleDocTemplate(output_path, pagesize=A4)
-    story = []
-    
+@lru_cache(maxsize=1)
+def _paragraph_styles():
+    """Title, heading and body styles; built once per process, not per letter"""
     styles = getSampleStyleSheet()
     
-    # Custom styles
     title_style = ParagraphStyle(
         'TitleStyle',
         parent=styles['Heading1'],
@@ -44,6 +38,27 @@ def generate_sanction_letter_pdf(letter: SanctionLetter, output_path: str = None
         fontSize=11,
         spaceAfter=6
     )
+    return title_style, heading_style, normal_style
+
+def warm_up():
+    """Render a throwaway letter in memory so the first real one skips font/style/parser setup"""
+    generate_sanction_letter_pdf(SanctionLetter(
+        customer_name="Warmup", loan_amount=100000, tenure=12, interest_rate=12.0, emi=8884.88,
+        sanction_date="01-01-2024", validity_date="31-01-2024", reference_number="TC/WARMUP",
+    ), output_path=BytesIO())
+
+def generate_sanction_letter_pdf(letter: SanctionLetter, output_path: str = None) -> str:
+    """Generate sanction letter PDF (`output_path` may also be a file-like object)"""
+    if not output_path:
+        os.makedirs("sanction_letters", exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Reference suffix keeps concurrent sanctions in the same second from sharing a file
+        output_path = f"sanction_letters/sanction_{timestamp}_{letter.reference_number.rsplit('/', 1)[-1]}.pdf"
+    
+    doc = SimpleDocTemplate(output_path, pagesize=A4)
+    story = []
+    
+    title_style, heading_style, normal_style = _paragraph_styles()
     
     # Title
     story.append(Paragraph("TATA CAPITAL", title_style))
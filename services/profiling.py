@@ -0,0 +1,212 @@
+"""
+On-demand profiling of live /api/chat requests.
+
+Profiling is disabled unless PROFILING_TOKEN is set. A request carrying
+`X-Profile: <token>` (or `?profile=<token>`) runs `master_agent.process`
+under either:
+
+- "deterministic": cProfile; downloadable as a .pstats file or text report
+- "sampling": a background thread samples the request thread's stack every
+  PROFILING_SAMPLE_INTERVAL_MS; downloadable as a speedscope JSON file
+
+Profiles are kept in a bounded in-memory store under a profile ID, and can
+be aggregated across the last N requests.
+"""
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, Counter
+from contextlib import contextmanager
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", "50"))
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "1.0"))
+
+MODES = ("deterministic", "sampling")
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, target_thread_id, interval_s):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.target_thread_id = target_thread_id
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            frame = sys._current_frames().get(self.target_thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class ProfileRecord:
+    def __init__(self, mode, label):
+        self.profile_id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.label = label
+        self.created_at = time.time()
+        self.duration_ms = None
+        self.stats = None       # pstats.Stats (deterministic)
+        self.stacks = None      # Counter{stack tuple: samples} (sampling)
+        self.interval_ms = None
+
+    def summary(self):
+        return {
+            "profile_id": self.profile_id,
+            "mode": self.mode,
+            "label": self.label,
+            "created_at": self.created_at,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "samples": sum(self.stacks.values()) if self.stacks is not None else None,
+        }
+
+
+def _empty_stats():
+    stats = pstats.Stats(stream=io.StringIO())
+    stats.stats = {}
+    return stats
+
+
+def stats_to_text(stats, sort="cumulative", limit=40):
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def stats_to_pstats_bytes(stats):
+    """Same bytes `Stats.dump_stats` writes; loadable with `pstats.Stats(path)`"""
+    return marshal.dumps(stats.stats)
+
+
+def stacks_to_speedscope(stacks, interval_ms, name):
+    frames, frame_index, samples, weights = [], {}, [], []
+    for stack, count in stacks.items():
+        indices = []
+        for frame in stack:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            indices.append(frame_index[frame])
+        samples.append(indices)
+        weights.append(count * interval_ms)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "loan-assistant-profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+class Profiler:
+    def __init__(self, token=PROFILING_TOKEN, max_profiles=PROFILING_MAX_PROFILES,
+                 sample_interval_ms=PROFILING_SAMPLE_INTERVAL_MS):
+        self.token = token
+        self.max_profiles = max_profiles
+        self.sample_interval_ms = sample_interval_ms
+        self._profiles = OrderedDict()
+        self._store_lock = threading.Lock()
+        # cProfile can only have one active profiler per thread
+        self._active = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.token)
+
+    def authorized(self, supplied_token):
+        return self.enabled and supplied_token is not None and hmac.compare_digest(
+            supplied_token.encode(), self.token.encode())
+
+    @contextmanager
+    def profile(self, mode="deterministic", label=""):
+        """Profile the enclosed block; yields the ProfileRecord (None if busy)"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}; expected one of {MODES}")
+        if not self._active.acquire(blocking=False):
+            yield None
+            return
+
+        record = ProfileRecord(mode, label)
+        started = time.perf_counter()
+        try:
+            if mode == "deterministic":
+                prof = cProfile.Profile()
+                prof.enable()
+                try:
+                    yield record
+                finally:
+                    prof.disable()
+                    record.stats = pstats.Stats(prof, stream=io.StringIO())
+            else:
+                sampler = _StackSampler(threading.get_ident(), self.sample_interval_ms / 1000)
+                sampler.start()
+                try:
+                    yield record
+                finally:
+                    sampler.stop()
+                    record.stacks = sampler.stacks
+                    record.interval_ms = self.sample_interval_ms
+        finally:
+            record.duration_ms = (time.perf_counter() - started) * 1000
+            self._active.release()
+            self._store(record)
+
+    def _store(self, record):
+        with self._store_lock:
+            self._profiles[record.profile_id] = record
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id):
+        with self._store_lock:
+            return self._profiles.get(profile_id)
+
+    def recent(self, limit=20, mode=None):
+        with self._store_lock:
+            records = [r for r in self._profiles.values() if mode is None or r.mode == mode]
+        return records[-limit:][::-1]
+
+    def aggregate(self, last=10, mode="deterministic"):
+        """Merge the last N profiles of one mode into a single Stats / stack Counter"""
+        records = self.recent(last, mode)
+        if mode == "deterministic":
+            merged = _empty_stats()
+            for record in records:
+                merged.add(record.stats)
+            return records, merged
+        merged = Counter()
+        for record in records:
+            merged.update(record.stacks)
+        return records, merged
+
+
+# Global profiler
+profiler = Profiler()
@@ -0,0 +1,258 @@
+"""
+Per-session ordering and idempotency for /api/chat.
+
+Turns of one `session_id` run one at a time: a request that arrives while
+another turn of the same session is in flight waits on that session's lock
+(at most SESSION_MAX_WAITERS queued, each for at most SESSION_WAIT_TIMEOUT
+seconds) and then continues from the state the previous turn produced rather
+than from the stale copy it was sent with. Different sessions never wait on
+each other.
+
+Requests carrying an `Idempotency-Key` header get their successful response
+cached for IDEMPOTENCY_TTL_SECONDS; a retry with the same key (and body)
+returns the cached response instead of re-running the agents - including a
+retry that arrives while the original is still running, since it queues
+behind it.
+
+Both run on the event loop only, so neither needs a thread lock. With
+several workers (see services/shared_state.py) the session lock is backed by
+a MongoDB lease and the idempotency cache by a shared collection, so both
+hold across workers.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from pymongo.errors import PyMongoError
+from starlette.concurrency import run_in_threadpool
+
+from models.schemas import CustomerInfo, LoanIntent
+from services.metrics import SESSION_LOCK_WAIT, record_cache_lookup
+from services.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+SESSION_MAX_WAITERS = int(os.getenv("SESSION_MAX_WAITERS", "4"))
+SESSION_WAIT_TIMEOUT = float(os.getenv("SESSION_WAIT_TIMEOUT", "30"))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+
+class SessionBusy(Exception):
+    """Too many queued turns for the session, or the wait timed out"""
+
+
+class IdempotencyConflict(Exception):
+    """Idempotency key reused with a different request body"""
+
+
+def session_state(response):
+    """JSON-able state a turn leaves behind: what the session's next turn continues from"""
+    return {
+        "context": response.context or {},
+        "loan_intent": response.loan_intent.model_dump(mode="json") if response.loan_intent else None,
+        "customer_info": response.customer_info.model_dump(mode="json") if response.customer_info else None,
+    }
+
+
+class _SessionSlot:
+    __slots__ = ("lock", "pending", "turns", "last_state")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0  # the running turn plus everyone queued behind it
+        self.turns = 0
+        self.last_state = None
+
+
+class SessionTurn:
+    """Handle for the turn holding a session's lock"""
+
+    __slots__ = ("previous", "latest", "state")
+
+    def __init__(self, previous, latest=None):
+        # State of the turn this one queued behind (None if it didn't wait)
+        self.previous = previous
+        # Last state committed for the session by any worker (shared mode only)
+        self.latest = latest
+        self.state = None
+
+    def rebase(self, request, latest=False):
+        """Continue from the previous (or, with `latest`, last committed) state instead of `request`'s copy"""
+        state = (self.latest or self.previous) if latest else self.previous
+        if state is None:
+            return request
+        request.context = dict(state["context"])
+        if request.loan_intent is None and state["loan_intent"]:
+            request.loan_intent = LoanIntent.model_validate(state["loan_intent"])
+        if request.customer_info is None and state["customer_info"]:
+            request.customer_info = CustomerInfo.model_validate(state["customer_info"])
+        return request
+
+    def complete(self, response):
+        self.state = session_state(response)
+
+
+class SessionGuard:
+    def __init__(self, max_waiters=SESSION_MAX_WAITERS, wait_timeout=SESSION_WAIT_TIMEOUT, shared=shared_state):
+        self.max_waiters = max_waiters
+        self.wait_timeout = wait_timeout
+        self.shared = shared
+        self._slots = {}
+
+    @property
+    def active_sessions(self):
+        return len(self._slots)
+
+    @asynccontextmanager
+    async def turn(self, session_id):
+        """Hold `session_id` for one turn; raises SessionBusy instead of queueing forever"""
+        slot = self._slots.get(session_id)
+        if slot is None:
+            slot = self._slots[session_id] = _SessionSlot()
+        if slot.pending > self.max_waiters:
+            raise SessionBusy("too many queued requests for this session")
+
+        arrived_at_turn = local_arrived_at_turn = slot.turns
+        slot.pending += 1
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.wait_timeout
+        shared = self.shared is not None and self.shared.enabled
+        lease = None
+        try:
+            if shared:
+                # Turns other workers commit while this one waits count as "queued behind" too
+                arrived_at_turn = await self._shared_call(self.shared.session_turns, session_id)
+                shared = arrived_at_turn is not None
+            await asyncio.wait_for(slot.lock.acquire(), self.wait_timeout)
+            if shared:
+                try:
+                    lease = await self._acquire_lease(session_id, deadline)
+                except BaseException:
+                    slot.lock.release()
+                    raise
+        except asyncio.TimeoutError:
+            self._leave(session_id, slot)
+            raise SessionBusy("timed out waiting for the previous request of this session") from None
+        except BaseException:
+            self._leave(session_id, slot)
+            raise
+        finally:
+            SESSION_LOCK_WAIT.observe(time.perf_counter() - started)
+
+        if lease is not None:
+            owner, document = lease
+            turns, latest = document.get("turns", 0), document.get("last_state")
+        else:
+            # Per-worker ordering (no lease, or it failed): the shared turn count isn't comparable
+            owner, turns, latest = None, slot.turns, None
+            arrived_at_turn = local_arrived_at_turn
+        previous = (latest or slot.last_state) if turns != arrived_at_turn else None
+        if previous is not None:
+            logger.info("Request queued behind another turn of its session; continuing from that turn",
+                        extra={"queued_turns": turns - arrived_at_turn})
+        turn = SessionTurn(previous, latest)
+        try:
+            yield turn
+        finally:
+            slot.turns += 1
+            if turn.state is not None:
+                slot.last_state = turn.state
+            if owner is not None:
+                await self._shared_call(self.shared.release, session_id, owner, turn.state)
+            slot.lock.release()
+            self._leave(session_id, slot)
+
+    async def _acquire_lease(self, session_id, deadline):
+        """(owner, session document) once this worker holds the session's lease, None if MongoDB failed"""
+        owner = self.shared.new_owner()
+        delay = 0.02
+        while True:
+            document = await self._shared_call(self.shared.try_acquire, session_id, owner, default=False)
+            if document is False:
+                return None
+            if document is not None:
+                return owner, document
+            if time.monotonic() + delay > deadline:
+                raise asyncio.TimeoutError
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    @staticmethod
+    async def _shared_call(function, *args, default=None):
+        """Run a blocking MongoDB call off the loop; on failure order this turn within the worker only"""
+        try:
+            return await run_in_threadpool(function, *args)
+        except PyMongoError as e:
+            logger.warning("Shared session state unavailable, ordering within this worker only: %s", e)
+            return default
+
+    def _leave(self, session_id, slot):
+        slot.pending -= 1
+        if not slot.pending:
+            # Nobody left to rebase onto it; don't keep per-session state around
+            self._slots.pop(session_id, None)
+
+
+class IdempotencyCache:
+    """Bounded TTL cache of serialized responses keyed by (session_id, Idempotency-Key)"""
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL_SECONDS, max_entries=IDEMPOTENCY_MAX_ENTRIES, shared=shared_state):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def fingerprint(request):
+        return hashlib.blake2b(request.model_dump_json().encode(), digest_size=16).hexdigest()
+
+    async def get(self, session_id, key, fingerprint):
+        """Cached response body, or None; raises IdempotencyConflict on a body mismatch"""
+        entry = self._entries.get((session_id, key))
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[(session_id, key)]
+            entry = None
+        if entry is None and self._shared:
+            value = await self._shared_call(self.shared.cache_get, f"idempotency:{session_id}:{key}")
+            if value is not None:
+                entry = (None, *value)
+        record_cache_lookup("idempotency", entry is not None)
+        if entry is None:
+            return None
+        if entry[1] != fingerprint:
+            raise IdempotencyConflict(key)
+        return entry[2]
+
+    async def put(self, session_id, key, fingerprint, body):
+        self._entries[(session_id, key)] = (time.monotonic() + self.ttl, fingerprint, body)
+        self._entries.move_to_end((session_id, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self._shared:
+            await self._shared_call(self.shared.cache_set, f"idempotency:{session_id}:{key}",
+                                    [fingerprint, body], self.ttl)
+
+    @property
+    def _shared(self):
+        return self.shared is not None and self.shared.enabled
+
+    @staticmethod
+    async def _shared_call(function, *args):
+        try:
+            return await run_in_threadpool(function, *args)
+        except PyMongoError as e:
+            logger.warning("Shared idempotency cache unavailable, using this worker's only: %s", e)
+            return None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Global instances
+session_guard = SessionGuard()
+idempotency_cache = IdempotencyCache()
@@ -0,0 +1,132 @@
+"""
+State shared by every worker process when the API runs with WEB_CONCURRENCY > 1.
+
+Per-session ordering, the idempotency cache and the WebSocket resume state
+are kept in process memory by default. With several workers, a session's
+requests land on any of them, so that state moves into MongoDB:
+
+- `session_leases`: one document per session - a lease (owner + expiry,
+  the same find_one_and_update/DuplicateKeyError pattern as the seed lock),
+  a turn counter and the state the last turn committed
+- `shared_cache`: small TTL'd values such as cached idempotent responses
+
+Both collections carry an `expires_at` TTL index, so abandoned sessions and
+leases of crashed workers clean themselves up. A multi-worker API refuses
+to start without MongoDB (see `lifecycle.prepare_shared_state`); if it
+becomes unreachable later, every worker falls back to its own memory until
+it is back: requests still work, but ordering and idempotency only hold per
+worker in the meantime.
+
+All methods block on MongoDB; call them from the threadpool.
+"""
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from services.database import db
+
+logger = logging.getLogger(__name__)
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+SESSION_LEASE_SECONDS = float(os.getenv("SESSION_LEASE_SECONDS", "60"))  # > the slowest turn
+SESSION_STATE_TTL_SECONDS = float(os.getenv("SESSION_STATE_TTL_SECONDS", "86400"))
+
+LEASES_COLLECTION = "session_leases"
+CACHE_COLLECTION = "shared_cache"
+
+
+def per_worker_path(path, workers=WEB_CONCURRENCY):
+    """`traffic/chat.jsonl.gz` -> `traffic/chat.w<pid>.jsonl.gz` when several workers would append to it"""
+    if workers <= 1:
+        return path
+    directory, name = os.path.split(path)
+    stem, dot, extensions = name.partition(".")
+    return os.path.join(directory, f"{stem}.w{os.getpid()}{dot}{extensions}")
+
+
+class SharedState:
+    def __init__(self, database=db, workers=WEB_CONCURRENCY, lease_seconds=SESSION_LEASE_SECONDS,
+                 state_ttl_seconds=SESSION_STATE_TTL_SECONDS):
+        self.database = database
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.state_ttl_seconds = state_ttl_seconds
+
+    @property
+    def enabled(self):
+        """Shared only when there is more than one worker and MongoDB to share through"""
+        return self.workers > 1 and self.database.is_connected
+
+    def ensure_indexes(self):
+        for name in (LEASES_COLLECTION, CACHE_COLLECTION):
+            self.database.get_collection(name).create_index(
+                [("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl")
+
+    def _expiry(self, now=None):
+        return (now or datetime.now(timezone.utc)) + timedelta(seconds=self.state_ttl_seconds)
+
+    # ------------------------------------------------------------------
+    # SESSION LEASES
+    # ------------------------------------------------------------------
+    def new_owner(self):
+        return f"{self.database._instance_id}:{uuid.uuid4().hex[:8]}"
+
+    def session_turns(self, session_id):
+        doc = self.database.get_collection(LEASES_COLLECTION).find_one({"_id": session_id}, {"turns": 1})
+        return (doc or {}).get("turns", 0)
+
+    def try_acquire(self, session_id, owner):
+        """The session document if the lease was taken, None while another worker holds it"""
+        now = datetime.now(timezone.utc)
+        try:
+            return self.database.get_collection(LEASES_COLLECTION).find_one_and_update(
+                {"_id": session_id, "$or": [{"owner": None}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"owner": owner, "lease_until": now + timedelta(seconds=self.lease_seconds),
+                          "expires_at": self._expiry(now)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            return None
+
+    def release(self, session_id, owner, state=None):
+        """Free the lease; `state` (if given) becomes the session's last committed state"""
+        update = {"$set": {"owner": None, "expires_at": self._expiry()}}
+        if state is not None:
+            update["$set"]["last_state"] = state
+            update["$inc"] = {"turns": 1}
+        result = self.database.get_collection(LEASES_COLLECTION).update_one(
+            {"_id": session_id, "owner": owner}, update)
+        if not result.matched_count:
+            logger.warning("Session lease expired before the turn finished; raise SESSION_LEASE_SECONDS",
+                           extra={"lease_seconds": self.lease_seconds})
+
+    def last_state(self, session_id):
+        doc = self.database.get_collection(LEASES_COLLECTION).find_one({"_id": session_id}, {"last_state": 1})
+        return (doc or {}).get("last_state")
+
+    # ------------------------------------------------------------------
+    # CACHE
+    # ------------------------------------------------------------------
+    def cache_get(self, key):
+        doc = self.database.get_collection(CACHE_COLLECTION).find_one({"_id": key})
+        # The TTL monitor runs once a minute; don't serve what it hasn't removed yet
+        if doc is None or doc["expires_at"].replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
+            return None
+        return doc["value"]
+
+    def cache_set(self, key, value, ttl_seconds):
+        self.database.get_collection(CACHE_COLLECTION).update_one(
+            {"_id": key},
+            {"$set": {"value": value,
+                      "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)}},
+            upsert=True,
+        )
+
+
+# Global shared state
+shared_state = SharedState()
@@ -0,0 +1,195 @@
+"""
+Lightweight request tracing.
+
+Each sampled /api/chat request becomes a root span; `span(...)` opens child
+spans around routing, agents, database and LLM calls. When no sampled trace
+is active `span` is a no-op costing one contextvar lookup.
+
+Finished traces go to pluggable exporters:
+- RingBufferExporter: last N traces in memory, served by /api/debug/traces
+- JsonlFileExporter: one JSON line per span, written by a background thread
+"""
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.0"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_FILE = os.getenv("TRACE_FILE")  # e.g. traces/spans.jsonl; unset disables file export
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start", "end", "status")
+
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()
+        self.end = None
+        self.status = "ok"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_offset_ms": round((self.start - self.trace.root_start) * 1000, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.started_at = time.time()
+        self.root_start = time.perf_counter()
+        self.spans = []
+
+    def to_dict(self):
+        root = self.spans[0] if self.spans else None
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "name": root.name if root else None,
+            "duration_ms": round(root.duration_ms, 3) if root else None,
+            "spans": [s.to_dict() for s in self.spans],
+        }
+
+
+class RingBufferExporter:
+    """Keeps the most recent traces in memory for the debug endpoint"""
+
+    def __init__(self, maxlen=TRACE_BUFFER_SIZE):
+        self.maxlen = maxlen
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            while len(self._traces) > self.maxlen:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id):
+        with self._lock:
+            trace = self._traces.get(trace_id)
+        return trace.to_dict() if trace else None
+
+    def recent(self, limit=20):
+        with self._lock:
+            traces = list(self._traces.values())[-limit:]
+        return [
+            {"trace_id": t.trace_id, "started_at": t.started_at, "name": t.spans[0].name,
+             "duration_ms": round(t.spans[0].duration_ms, 3), "span_count": len(t.spans)}
+            for t in reversed(traces)
+        ]
+
+
+class JsonlFileExporter:
+    """Appends spans as JSON lines from a background thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-file-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace):
+        self._queue.put(trace)
+
+    def _run(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        while True:
+            trace = self._queue.get()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(s.to_dict(), default=str) + "\n" for s in trace.spans))
+
+
+class Tracer:
+    def __init__(self, sample_rate=TRACE_SAMPLE_RATE, exporters=None):
+        self.sample_rate = sample_rate
+        self.exporters = list(exporters or [])
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    def should_sample(self, header_value=None):
+        """X-Trace: 1 forces sampling, X-Trace: 0 disables it; otherwise TRACE_SAMPLE_RATE"""
+        if header_value is not None:
+            return header_value.strip().lower() in ("1", "true", "yes")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def start_trace(self, name, sampled=True, **attributes):
+        """Open a root span; yields the Trace (or None when not sampled)"""
+        if not sampled:
+            yield None
+            return
+        trace = Trace()
+        root = Span(trace, name, attributes=attributes)
+        trace.spans.append(root)
+        token = _current_span.set(root)
+        try:
+            yield trace
+        except BaseException:
+            root.status = "error"
+            raise
+        finally:
+            root.end = time.perf_counter()
+            _current_span.reset(token)
+            for exporter in self.exporters:
+                exporter.export(trace)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Child span of the current span; no-op outside a sampled trace"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent_id=parent.span_id, attributes=attributes)
+    parent.trace.spans.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException:
+        child.status = "error"
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def current_span():
+    return _current_span.get()
+
+
+# Global tracer
+trace_buffer = RingBufferExporter()
+tracer = Tracer(exporters=[trace_buffer])
+if TRACE_FILE:
+    tracer.add_exporter(JsonlFileExporter(TRACE_FILE))
@@ -0,0 +1,179 @@
+"""
+Sampled recorder of /api/chat traffic for offline replay.
+
+Sampling is per session (a stable hash of the session ID against
+TRAFFIC_RECORD_RATE) so recorded conversations are complete. The request
+path only snapshots the request/response and enqueues them; a background
+thread redacts phone numbers and appends one compact JSON line per turn to
+TRAFFIC_RECORD_PATH (gzip-compressed when the path ends in .gz).
+
+Phone numbers are replaced with `<phone:HASH>` tokens (keyed by
+TRAFFIC_REDACTION_KEY); together with the customer_id of the turn that
+verified them, `benchmarks/replay.py` can map them back onto seeded data.
+There is no default key: without one, recording stays off (a public key
+would let anyone reverse the hashes by brute-forcing 10-digit numbers).
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+
+from services.shared_state import per_worker_path
+
+logger = logging.getLogger(__name__)
+
+TRAFFIC_RECORD_RATE = float(os.getenv("TRAFFIC_RECORD_RATE", "0.0"))
+TRAFFIC_RECORD_PATH = os.getenv("TRAFFIC_RECORD_PATH", "traffic/chat.jsonl.gz")
+TRAFFIC_REDACTION_KEY = os.getenv("TRAFFIC_REDACTION_KEY", "")
+TRAFFIC_QUEUE_SIZE = int(os.getenv("TRAFFIC_QUEUE_SIZE", "5000"))
+
+RECORD_VERSION = 1
+PHONE_RE = re.compile(r"(?:\+91[\s-]?)?\b\d{10}\b")
+PHONE_TOKEN_RE = re.compile(r"<phone:([0-9a-f]{10})>")
+
+
+def open_log(path, mode):
+    """Open a traffic log, transparently gzip-compressed for *.gz paths"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def read_log(path):
+    """Yield recorded turns in file order"""
+    with open_log(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class TrafficRecorder:
+    def __init__(self, sample_rate=TRAFFIC_RECORD_RATE, path=TRAFFIC_RECORD_PATH,
+                 redaction_key=TRAFFIC_REDACTION_KEY, max_queue=TRAFFIC_QUEUE_SIZE):
+        if sample_rate > 0 and not redaction_key:
+            logger.warning("TRAFFIC_RECORD_RATE is set but TRAFFIC_REDACTION_KEY is not; traffic recording is disabled")
+            sample_rate = 0.0
+        self.sample_rate = sample_rate
+        self.path = path
+        self._key = redaction_key.encode()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0}
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def should_record(self, session_id):
+        """Stable per-session decision so whole conversations are captured"""
+        if self.sample_rate <= 0:
+            return False
+        if self.sample_rate >= 1:
+            return True
+        return zlib.crc32(session_id.encode()) / 0xFFFFFFFF < self.sample_rate
+
+    # ------------------------------------------------------------------
+    # PRODUCER SIDE (request path)
+    # ------------------------------------------------------------------
+    def record(self, request_snapshot, response, latency_ms):
+        """Enqueue one turn; `request_snapshot` is the request dict taken before processing"""
+        entry = (time.time(), request_snapshot, response.model_dump(mode="json"), latency_ms)
+        self.stats["recorded"] += 1
+        self.start()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    # ------------------------------------------------------------------
+    # CONSUMER SIDE (background thread)
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="traffic-recorder", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=5.0):
+        """Write out everything still queued"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = [self._encode(*entry) for entry in batch if entry is not None]
+            if lines:
+                try:
+                    with open_log(self.path, "a") as f:
+                        f.write("".join(lines))
+                    self.stats["written"] += len(lines)
+                except OSError as e:
+                    logger.warning("Traffic log write failed, dropping %d turns: %s", len(lines), e)
+                    self.stats["dropped"] += len(lines)
+            if stop:
+                return
+
+    def _encode(self, timestamp, request, response, latency_ms):
+        context = response.get("context") or {}
+        underwriting = context.get("underwriting_result") or {}
+        turn = {
+            "v": RECORD_VERSION,
+            "ts": round(timestamp, 3),
+            "sid": request.get("session_id"),
+            "ms": round(latency_ms, 3),
+            "req": self.redact(request),
+            "out": {
+                "next_agent": response.get("next_agent"),
+                "agent": context.get("agent"),
+                "customer_id": context.get("customer_id"),
+                "decision": underwriting.get("decision"),
+                "digest": message_digest(response.get("message", "")),
+            },
+        }
+        return json.dumps(turn, separators=(",", ":"), ensure_ascii=False, default=str) + "\n"
+
+    # ------------------------------------------------------------------
+    # REDACTION
+    # ------------------------------------------------------------------
+    def phone_token(self, phone):
+        digits = re.sub(r"\D", "", phone)[-10:]
+        return "<phone:" + hmac.new(self._key, digits.encode(), hashlib.sha256).hexdigest()[:10] + ">"
+
+    def redact(self, value):
+        if isinstance(value, str):
+            return PHONE_RE.sub(lambda m: self.phone_token(m.group()), value)
+        if isinstance(value, dict):
+            return {k: self.redact(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.redact(v) for v in value]
+        return value
+
+
+def message_digest(message):
+    return hashlib.blake2b(message.encode(), digest_size=8).hexdigest()
+
+
+# Global traffic recorder (one file per worker: appended gzip members must not interleave)
+traffic_recorder = TrafficRecorder(path=per_worker_path(TRAFFIC_RECORD_PATH))
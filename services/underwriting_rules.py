@@ -0,0 +1,365 @@
+"""
+Declarative underwriting policy compiled to a single Python function.
+
+The policy lives in `rules/underwriting.json` (UNDERWRITING_RULES_PATH): a
+version, default customer values, parameters (score threshold, limit
+multiple, EMI-to-salary ratio), derived values and an ordered rule list.
+Each rule has a `when` expression over the facts of a request, a decision
+and a reason template; the first rule that holds decides.
+
+At load time the expressions are parsed (only comparisons, arithmetic,
+and/or/not, numbers and known names are accepted), reason templates are
+checked to use only facts, parameters and derived values, parameters are inlined
+as constants and the whole list is generated into one `evaluate` function,
+so a decision is a handful of comparisons rather than an interpreter walk.
+Every `RuleDecision` carries the rule that fired, the rules checked before
+it and the policy version.
+
+The same file holds the offer `pricing` (`PricingPolicy`): the limit, rate,
+tenures and fee a customer without a curated offer gets, by credit-score
+band. It is the only source of offer defaults; see services/offer_book.py.
+
+Like the message templates, the file is re-checked every
+RULES_RELOAD_INTERVAL seconds. A changed file is compiled into a new
+immutable `CompiledRuleset` and swapped in; an evaluation holds the
+ruleset it started with, so a reload never changes a decision halfway. A
+broken edit is logged and the previous policy stays live.
+"""
+import ast
+import copy
+import json
+import keyword
+import logging
+import os
+import threading
+import time
+
+from services.message_templates import MessageTemplate, TemplateError
+
+logger = logging.getLogger(__name__)
+
+UNDERWRITING_RULES_PATH = os.getenv(
+    "UNDERWRITING_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules", "underwriting.json"),
+)
+RULES_RELOAD_INTERVAL = float(os.getenv("RULES_RELOAD_INTERVAL", "2.0"))  # 0 disables hot reload
+
+# Inputs of every evaluation, in the generated function's argument order
+FACTS = ("loan_amount", "tenure", "credit_score", "preapproved_limit", "salary", "verified_salary",
+         "salary_slip_verified", "interest_rate", "emi")
+DECISIONS = frozenset({"approved", "rejected", "pending"})
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.UnaryOp, ast.Compare, ast.BinOp, ast.Load,
+    ast.And, ast.Or, ast.Not, ast.USub,
+    ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+    ast.Add, ast.Sub, ast.Mult, ast.Div,
+)
+_LITERALS = {"true": True, "false": False}
+
+
+class RuleError(ValueError):
+    pass
+
+
+class _Inline(ast.NodeTransformer):
+    """Validate an expression and replace parameters / true / false with constants"""
+
+    def __init__(self, label, names, constants):
+        self.label = label
+        self.names = names
+        self.constants = constants
+
+    def generic_visit(self, node):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float, bool):
+            return node
+        if not isinstance(node, _ALLOWED_NODES):
+            raise RuleError(f"{self.label}: unsupported expression {ast.unparse(node) or type(node).__name__!r}")
+        return super().generic_visit(node)
+
+    def visit_Name(self, node):
+        if node.id in self.constants:
+            return ast.copy_location(ast.Constant(self.constants[node.id]), node)
+        if node.id not in self.names:
+            raise RuleError(f"{self.label}: unknown name {node.id!r}")
+        return node
+
+
+class _Vectorize(ast.NodeTransformer):
+    """Rewrite a validated expression for numpy arrays: and/or/not -> & | ~, a < b < c -> (a < b) & (b < c)"""
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        result = node.values[0]
+        for value in node.values[1:]:
+            result = ast.BinOp(result, op, value)
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(ast.Invert(), node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        operands = [node.left, *node.comparators]
+        parts = [ast.Compare(operands[i], [op], [operands[i + 1]]) for i, op in enumerate(node.ops)]
+        result = parts[0]
+        for part in parts[1:]:
+            result = ast.BinOp(result, ast.BitAnd(), part)
+        return result
+
+
+def _plain_name(name):
+    return isinstance(name, str) and name.isidentifier() and not keyword.iskeyword(name)
+
+
+def _expression(label, text, names, constants):
+    """Validated expression tree with parameters inlined"""
+    try:
+        tree = ast.parse(str(text), mode="eval")
+    except SyntaxError as e:
+        raise RuleError(f"{label}: {e.msg}") from None
+    return _Inline(label, names, constants).visit(tree)
+
+
+def _vectorized(tree):
+    return ast.unparse(ast.fix_missing_locations(_Vectorize().visit(copy.deepcopy(tree))))
+
+
+def emi_array(principal, annual_rate, months):
+    """UnderwritingAgent.calculate_emi over numpy arrays (broadcasting)"""
+    import numpy as np
+
+    principal, months = np.asarray(principal, dtype=float), np.asarray(months, dtype=float)
+    monthly_rate = np.asarray(annual_rate, dtype=float) / 12 / 100
+    growth = (1 + monthly_rate) ** months
+    with np.errstate(divide="ignore", invalid="ignore"):
+        emi = np.where(monthly_rate == 0, principal / months,
+                       principal * monthly_rate * growth / (growth - 1))
+    return np.round(emi, 2)
+
+
+class Rule:
+    __slots__ = ("id", "when", "decision", "reason", "conditions")
+
+    def __init__(self, raw, index):
+        if not isinstance(raw, dict):
+            raise RuleError(f"rule {index}: must be an object, got {raw!r}")
+        self.id = raw.get("id") or f"rule_{index}"
+        self.when = raw.get("when", "true")
+        self.decision = raw.get("decision")
+        if self.decision not in DECISIONS:
+            raise RuleError(f"{self.id}: decision must be one of {sorted(DECISIONS)}")
+        try:
+            self.reason = MessageTemplate(self.id, raw.get("reason", ""))
+        except TemplateError as e:
+            raise RuleError(str(e)) from None
+        self.conditions = tuple(raw.get("conditions", ()))
+
+
+class RuleDecision:
+    """Outcome of one evaluation, with the trace of rules checked to reach it"""
+
+    __slots__ = ("decision", "rule", "reason", "conditions", "trace", "version", "values")
+
+    def __init__(self, decision, rule, reason, conditions, trace, version, values):
+        self.decision = decision
+        self.rule = rule
+        self.reason = reason
+        self.conditions = conditions
+        self.trace = trace  # rule ids in evaluation order; the last one fired
+        self.version = version
+        self.values = values  # facts, parameters and derived values the rules saw
+
+
+class PricingPolicy:
+    """Offer terms from a customer profile; the first band whose min_score the score reaches applies"""
+
+    BAND_FIELDS = ("min_score", "limit_multiple", "interest_rate", "tenure_options", "processing_fee")
+
+    def __init__(self, raw, defaults):
+        self.defaults = defaults
+        self.min_limit = raw.get("min_limit", 0)
+        self.max_limit = raw.get("max_limit", float("inf"))
+        self.limit_step = raw.get("limit_step", 1000)
+        bands = [dict(band) for band in raw.get("bands", ())]
+        if not bands:
+            raise RuleError("pricing: no bands defined")
+        for band in bands:
+            missing = [field for field in self.BAND_FIELDS if field not in band]
+            if missing:
+                raise RuleError(f"pricing band {band.get('min_score')!r}: missing {', '.join(missing)}")
+            if not band["tenure_options"]:
+                raise RuleError(f"pricing band {band['min_score']!r}: no tenure_options")
+        self.bands = sorted(bands, key=lambda band: -band["min_score"])
+
+    def band(self, credit_score):
+        for band in self.bands:
+            if credit_score >= band["min_score"]:
+                return band
+        return self.bands[-1]
+
+    def price(self, customer):
+        """preapproved_limit, interest_rate, tenure_options, processing_fee for a customer document"""
+        credit_score = customer.get("credit_score", self.defaults["credit_score"])
+        band = self.band(credit_score)
+        limit = customer.get("preapproved_limit")
+        if not limit:
+            salary = customer.get("salary", self.defaults["salary"])
+            limit = round(salary * band["limit_multiple"] / self.limit_step) * self.limit_step
+            limit = max(self.min_limit, min(self.max_limit, limit))
+        return {
+            "preapproved_limit": limit,
+            "interest_rate": band["interest_rate"],
+            "tenure_options": list(band["tenure_options"]),
+            "processing_fee": band["processing_fee"],
+        }
+
+
+class CompiledRuleset:
+    """One immutable version of the policy"""
+
+    def __init__(self, config, source=None):
+        self.source = source
+        self.version = str(config.get("version", "unversioned"))
+        self.defaults = dict(config.get("defaults", {}))
+        self.parameters = dict(config.get("parameters", {}))
+        self.salary_slip_keywords = tuple(config.get("salary_slip_keywords", ()))
+        missing = [name for name in ("credit_score", "salary", "tenure") if name not in self.defaults]
+        if missing:
+            raise RuleError(f"defaults: missing {', '.join(missing)}")
+        self.pricing = PricingPolicy(config.get("pricing", {}), self.defaults)
+        for name, value in self.parameters.items():
+            if not _plain_name(name) or type(value) not in (int, float):
+                raise RuleError(f"parameter {name!r} must be a number")
+        self.rules = [Rule(raw, index) for index, raw in enumerate(config.get("rules", []), 1)]
+        if not self.rules:
+            raise RuleError("no rules defined")
+
+        constants = dict(self.parameters, **_LITERALS)
+        names = set(FACTS)
+        self._derived_trees = {}
+        for name, text in config.get("derived", {}).items():
+            if not _plain_name(name) or name in names or name in constants:
+                raise RuleError(f"derived value {name!r} must be a new plain name")
+            self._derived_trees[name] = _expression(name, text, names, constants)
+            names.add(name)
+        self.derived = list(self._derived_trees)
+        self._rule_trees = [_expression(rule.id, rule.when, names, constants) for rule in self.rules]
+        for rule in self.rules:
+            unknown = rule.reason.fields - names - self.parameters.keys()
+            if unknown:
+                raise RuleError(f"{rule.id}: reason uses unknown name(s) {', '.join(sorted(unknown))}")
+
+        lines = [f"def evaluate({', '.join(FACTS)}):"]
+        lines += [f"    {name} = {ast.unparse(tree)}" for name, tree in self._derived_trees.items()]
+        derived = f"({', '.join(self.derived)}{',' if self.derived else ''})"
+        for index, tree in enumerate(self._rule_trees):
+            lines.append(f"    if {ast.unparse(tree)}:")
+            lines.append(f"        return {index}, {derived}")
+        lines.append(f"    return None, {derived}")
+        self.code = "\n".join(lines) + "\n"
+        self._traces = [tuple(rule.id for rule in self.rules[:index + 1]) for index in range(len(self.rules))]
+        namespace = {}
+        exec(compile(self.code, f"<underwriting rules {self.version}>", "exec"), {}, namespace)
+        self._evaluate = namespace["evaluate"]
+        self._evaluate_grid = None  # generated on first use; numpy is only imported then
+
+    def evaluate(self, **facts):
+        """First matching rule for `facts` (every name in FACTS) as a RuleDecision"""
+        index, derived = self._evaluate(**facts)
+        values = dict(facts, **self.parameters)
+        values.update(zip(self.derived, derived))
+        if index is None:
+            return RuleDecision("pending", None, "Additional review required", [], self._traces[-1],
+                                self.version, values)
+        rule = self.rules[index]
+        return RuleDecision(rule.decision, rule.id, rule.reason.render(**values), list(rule.conditions),
+                            self._traces[index], self.version, values)
+
+    def evaluate_grid(self, **facts):
+        """Index of the deciding rule (-1: none) for every cell of broadcast numpy `facts`, in one call"""
+        if self._evaluate_grid is None:
+            self._evaluate_grid = self._compile_grid()
+        return self._evaluate_grid(**facts)
+
+    def _compile_grid(self):
+        import numpy as np
+
+        lines = [f"def evaluate_grid({', '.join(FACTS)}):"]
+        lines += [f"    {name} = asarray({name})" for name in FACTS]
+        lines.append(f"    shape = broadcast_shapes({', '.join(f'{name}.shape' for name in FACTS)})")
+        lines += [f"    {name} = {_vectorized(tree)}" for name, tree in self._derived_trees.items()]
+        conditions = ", ".join(f"broadcast_to({_vectorized(tree)}, shape)" for tree in self._rule_trees)
+        lines.append(f"    return select([{conditions}], {list(range(len(self.rules)))}, -1)")
+        namespace = {}
+        globals_ = {"asarray": np.asarray, "broadcast_shapes": np.broadcast_shapes,
+                    "broadcast_to": np.broadcast_to, "select": np.select}
+        exec(compile("\n".join(lines) + "\n", f"<underwriting grid {self.version}>", "exec"), globals_, namespace)
+        return namespace["evaluate_grid"]
+
+
+def load_ruleset(path):
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise RuleError(f"{path}: expected a JSON object")
+    try:
+        return CompiledRuleset(config, source=path)
+    except RuleError:
+        raise
+    except (AttributeError, TypeError, KeyError, SyntaxError) as e:
+        # A shape the checks above didn't anticipate (e.g. a list where an object belongs)
+        raise RuleError(f"{path}: {type(e).__name__}: {e}") from None
+
+
+class UnderwritingRules:
+    def __init__(self, path=UNDERWRITING_RULES_PATH, reload_interval=RULES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._ruleset = None
+        self._signature = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _file_signature(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self, force=False):
+        """Recompile if the rules file changed; the live ruleset is replaced, never mutated"""
+        with self._reload_lock:
+            signature = None
+            try:
+                signature = self._file_signature()
+                if not force and signature == self._signature and self._ruleset is not None:
+                    return False
+                ruleset = load_ruleset(self.path)
+            except (OSError, ValueError) as e:
+                if self._ruleset is None:
+                    raise
+                logger.warning("Underwriting rules reload failed, keeping version %s: %s", self._ruleset.version, e)
+                self._signature = signature  # don't retry the same broken edit every check
+                return False
+            self._ruleset = ruleset
+            self._signature = signature
+            logger.info("Underwriting rules loaded", extra={"version": ruleset.version, "rules": len(ruleset.rules)})
+            return True
+
+    def current(self):
+        """The live ruleset; hold on to it for the whole evaluation"""
+        if self._ruleset is None:
+            self.reload()
+        elif self.reload_interval > 0:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.reload_interval
+                self.reload()
+        return self._ruleset
+
+
+# Global rules
+underwriting_rules = UnderwritingRules()
@@ -0,0 +1,70 @@
+import time
+
+from services import audit_log
+from services.audit_log import DecisionLog
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+
+class FakeDatabase:
+    is_connected = True
+
+    def __init__(self):
+        self.collection = FakeCollection()
+
+    def get_collection(self, name):
+        return self.collection
+
+
+def test_close_flushes_every_queued_batch(tmp_path):
+    database = FakeDatabase()
+    log = DecisionLog(database=database, batch_size=10, spool_path=str(tmp_path / "spool.jsonl"))
+    for i in range(35):
+        # Bypass record() so the writer thread never starts and everything is still queued at close()
+        log._queue.put_nowait({"decision_id": str(i)})
+
+    log.close()
+
+    assert [doc["decision_id"] for doc in database.collection.docs] == [str(i) for i in range(35)]
+    assert log.stats["written"] == 35
+    assert log._queue.empty()
+
+
+def test_replay_skips_files_another_worker_claimed(tmp_path, monkeypatch):
+    spool_path = str(tmp_path / "decisions.jsonl")
+    with open(f"{spool_path}.aaaa.replay", "w", encoding="utf-8") as f:
+        f.write('{"decision_id": "1"}\n{"decision_id": "2"}\n')
+    real_glob = audit_log.glob.glob
+    # The first file was listed here but renamed away by another worker before we claimed it
+    monkeypatch.setattr(audit_log.glob, "glob", lambda pattern: [f"{spool_path}.gone.replay", *real_glob(pattern)])
+    database = FakeDatabase()
+    log = DecisionLog(database=database, spool_path=spool_path)
+
+    log._replay_spool()
+
+    assert [doc["decision_id"] for doc in database.collection.docs] == ["1", "2"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_writer_survives_spool_errors(tmp_path):
+    database = FakeDatabase()
+    database.is_connected = False
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    log = DecisionLog(database=database, flush_interval=0.01, spool_path=str(blocker / "decisions.jsonl"))
+
+    log.start()
+    log._queue.put_nowait({"decision_id": "1"})  # spooling it fails: the spool directory is a file
+    time.sleep(0.1)
+    assert log._thread.is_alive()
+
+    database.is_connected = True
+    log._queue.put_nowait({"decision_id": "2"})
+    log.close()
+    assert [doc["decision_id"] for doc in database.collection.docs] == ["2"]
@@ -0,0 +1,71 @@
+import json
+import logging
+
+import pytest
+
+from benchmarks.backtest import _file_tasks, candidate_config, run_backtest
+from benchmarks.load_test import percentile
+from services.underwriting_rules import UNDERWRITING_RULES_PATH
+
+
+@pytest.mark.parametrize("values, pct, expected", [
+    (list(range(1, 101)), 50, 50),
+    (list(range(1, 101)), 95, 95),
+    (list(range(1, 101)), 99, 99),
+    (list(range(1, 101)), 100, 100),
+    (list(range(1, 21)), 95, 19),
+    (list(range(1, 21)), 50, 10),
+    ([7], 99, 7),
+    ([1, 2], 0, 1),
+])
+def test_percentile_is_nearest_rank(values, pct, expected):
+    assert percentile(values, pct) == expected
+
+
+def test_percentile_of_nothing():
+    assert percentile([], 95) is None
+
+
+def _underwriting_entry(session_id, amount, slip, decision_id):
+    return {
+        "decision_id": decision_id, "agent": "underwriting", "session_id": session_id,
+        "inputs": {"customer_id": "CUST001", "loan_intent": {"amount": amount, "tenure": 24}},
+        "outcome": {"decision": "pending", "credit_score": 780, "preapproved_limit": 500000, "salary": 80000,
+                    "interest_rate": 12.0, "salary_slip_verified": slip, "verified_salary": 80000 if slip else None},
+    }
+
+
+def test_backtest_keeps_the_last_underwriting_entry_per_application(tmp_path):
+    path = tmp_path / "decision_log.jsonl"
+    entries = [
+        _underwriting_entry("S1", 800000, False, "a"),
+        _underwriting_entry("S1", 800000, False, "b"),  # pending loop: same application again
+        {"decision_id": "c", "agent": "verification", "session_id": "S1", "inputs": {}, "outcome": {}},
+        _underwriting_entry("S1", 800000, True, "d"),  # slip uploaded: the application's final state
+        _underwriting_entry("S2", 800000, False, "e"),
+    ]
+    path.write_text("".join(json.dumps(e) + "\n" for e in entries), encoding="utf-8")
+    with open(UNDERWRITING_RULES_PATH, encoding="utf-8") as f:
+        current = json.load(f)
+
+    report = run_backtest(_file_tasks(str(path), chunk_size=2), current,
+                          candidate_config(current, overrides=["min_credit_score=700"]), workers=1)
+
+    assert report["applications"] == 2
+    assert report["superseded"] == 2
+    assert report["skipped"] == 1
+    # S1 decided with its verified slip (approved), S2 still waiting for one (pending)
+    assert report["decisions"]["current"] == [1, 1, 0]
+
+
+def test_microbench_cases_restore_patched_globals():
+    import agents.verification_agent as verification_module
+    from benchmarks import microbench
+
+    original = verification_module.db
+    try:
+        microbench.main(["-k", "verification.process[memory]", "--rounds", "1", "--warmup-rounds", "0",
+                         "--round-time", "0.001"])
+    finally:
+        logging.disable(logging.NOTSET)  # main() silences warnings for its table
+    assert verification_module.db is original
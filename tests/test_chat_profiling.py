@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+
+import backend
+
+
+def test_unknown_profile_mode_is_a_400(monkeypatch):
+    monkeypatch.setattr(backend.profiler, "token", "secret")
+    client = TestClient(backend.app)
+
+    response = client.post("/api/chat", json={"message": "hi", "session_id": "S1"},
+                           headers={"X-Profile": "secret", "X-Profile-Mode": "bogus"})
+
+    assert response.status_code == 400
+    assert "X-Profile-Mode" in response.json()["detail"]
+    assert backend.session_guard.active_sessions == 0
+
+
+def test_trace_endpoints_need_the_token(monkeypatch):
+    monkeypatch.setattr(backend.profiler, "token", "secret")
+    client = TestClient(backend.app)
+
+    assert client.get("/api/debug/traces").status_code == 403
+    assert client.get("/api/debug/traces/abc", headers={"X-Debug-Token": "wrong"}).status_code == 403
+    assert client.get("/api/debug/traces", headers={"X-Debug-Token": "secret"}).status_code == 200
+
+
+def test_x_trace_is_only_honoured_with_the_token(monkeypatch):
+    monkeypatch.setattr(backend.profiler, "token", "secret")
+    monkeypatch.setattr(backend.tracer, "sample_rate", 0.0)
+    client = TestClient(backend.app)
+    body = {"message": "hi", "session_id": "S-trace"}
+
+    untrusted = client.post("/api/chat", json=body, headers={"X-Trace": "1"})
+    trusted = client.post("/api/chat", json=body, headers={"X-Trace": "1", "X-Debug-Token": "secret"})
+
+    assert untrusted.status_code == 200 and "X-Trace-ID" not in untrusted.headers
+    assert trusted.status_code == 200 and "X-Trace-ID" in trusted.headers
+    assert "X-Profile-ID" not in trusted.headers
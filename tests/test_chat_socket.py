@@ -0,0 +1,54 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import backend
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as client:
+        yield client
+
+
+def _receive_until(ws, predicate):
+    while True:
+        frame = ws.receive_json()
+        if frame.get("type") != "ping" and predicate(frame):
+            return frame
+
+
+def test_attaching_to_a_session_needs_its_resume_token(client):
+    with client.websocket_connect("/ws/chat") as ws:
+        hello = ws.receive_json()
+        session_id = hello["data"]["session_id"]
+        ws.send_json({"type": "chat", "message": "I need 3 lakh for 2 years"})
+        _receive_until(ws, lambda frame: frame["type"] == "message")
+
+    for query in (f"session_id={session_id}&last_seq=0",
+                  f"session_id={session_id}&resume_token=forged&last_seq=0"):
+        with client.websocket_connect(f"/ws/chat?{query}") as ws:
+            with pytest.raises(WebSocketDisconnect) as closed:
+                ws.receive_json()
+        assert closed.value.code == 1008
+
+
+def test_verification_hands_off_to_underwriting_and_resume_replays_missed_events(client):
+    with client.websocket_connect("/ws/chat") as ws:
+        hello = ws.receive_json()["data"]
+        ws.send_json({"type": "chat", "message": "I need 3 lakh for 2 years"})
+        first = _receive_until(ws, lambda frame: frame["type"] == "message")
+        ws.send_json({"type": "chat", "message": "My phone is 9876543210"})
+        # No client auto-trigger: the server runs the underwriting turn itself
+        handoff = _receive_until(ws, lambda frame: frame["type"] == "agent_transition"
+                                 and frame["data"]["to"] == "underwriting")
+        underwriting = _receive_until(ws, lambda frame: frame["type"] == "message")
+        assert underwriting["data"]["agent"] == "underwriting"
+        assert handoff["seq"] < underwriting["seq"]
+
+    query = f"session_id={hello['session_id']}&resume_token={hello['resume_token']}&last_seq={first['seq']}"
+    with client.websocket_connect(f"/ws/chat?{query}") as ws:
+        assert ws.receive_json()["data"]["seq"] == underwriting["seq"]
+        replayed = [ws.receive_json() for _ in range(underwriting["seq"] - first["seq"])]
+    assert [frame["seq"] for frame in replayed] == list(range(first["seq"] + 1, underwriting["seq"] + 1))
+    assert replayed[-1] == underwriting
@@ -0,0 +1,28 @@
+from services.conversation_state import ConversationCompactor, context_size
+
+VERIFICATION = {"verified": True, "customer_id": "CUST001",
+                "details": {"name": "Rahul Sharma", "address": "x" * 400, "city": "Mumbai"}}
+
+
+def test_budget_keeps_what_readers_need_from_verification_result():
+    context = {
+        "customer_id": "CUST001",
+        "verification_result": dict(VERIFICATION),
+        "sanction_letter": {"reference_number": "TC1", "body": "y" * 2000},
+        "loan_intent": {"amount": 300000, "tenure": 24},
+        "conversation_history": [{"role": "user", "content": "z" * 500}],
+    }
+    compactor = ConversationCompactor(max_bytes=300)
+
+    compactor.compact(context)
+
+    assert context["verification_result"] == {"verified": True, "customer_id": "CUST001",
+                                              "details": {"name": "Rahul Sharma"}}
+    assert "sanction_letter" not in context
+    assert context_size(context) <= 300
+
+
+def test_verification_result_is_untouched_within_budget():
+    context = {"verification_result": dict(VERIFICATION)}
+    ConversationCompactor(max_bytes=16384).compact(context)
+    assert context["verification_result"] == VERIFICATION
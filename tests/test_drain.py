@@ -0,0 +1,74 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _health(port):
+    """(status code, body) of /api/health, None when nothing accepts the connection"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=2) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+    except (urllib.error.URLError, ConnectionError):
+        return None
+
+
+def test_sigterm_drains_while_still_accepting(tmp_path):
+    port = _free_port()
+    env = dict(os.environ, STARTUP_WARMUP="0", DRAIN_DELAY="2", DRAIN_TIMEOUT="5",
+               MONGODB_URI="mongodb://127.0.0.1:1", MONGODB_SERVER_SELECTION_TIMEOUT_MS="200",
+               AUDIT_SPOOL_PATH=str(tmp_path / "audit.jsonl"), TRAFFIC_RECORD_RATE="0")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "backend:app", "--port", str(port)],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while (health := _health(port)) is None or health[0] != 200:
+            assert server.poll() is None and time.monotonic() < deadline, "server did not start"
+            time.sleep(0.2)
+
+        server.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + 1.5
+        while (health := _health(port)) is not None and health[0] == 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        # Still accepting, and telling the load balancer to go away
+        assert health is not None
+        assert health[0] == 503 and health[1]["status"] == "draining"
+        assert server.wait(15) == 0
+    finally:
+        if server.poll() is None:
+            server.kill()
+
+
+def test_several_workers_refuse_to_start_without_shared_state(tmp_path):
+    env = dict(os.environ, STARTUP_WARMUP="0", WEB_CONCURRENCY="2", SHARED_STATE_CONNECT_TIMEOUT="0.5",
+               MONGODB_URI="mongodb://127.0.0.1:1", MONGODB_SERVER_SELECTION_TIMEOUT_MS="200",
+               AUDIT_SPOOL_PATH=str(tmp_path / "audit.jsonl"), TRAFFIC_RECORD_RATE="0", PORT=str(_free_port()))
+    # run.py exits before forking the workers
+    launcher = subprocess.run([sys.executable, "run.py"], cwd=ROOT, env=env, capture_output=True, text=True,
+                              timeout=30)
+    assert launcher.returncode != 0
+    assert "needs MongoDB" in launcher.stderr
+
+    # uvicorn's CLI reads WEB_CONCURRENCY too: the workers fail startup and take the supervisor down with them
+    workers = subprocess.run([sys.executable, "-m", "uvicorn", "backend:app", "--port", env["PORT"]],
+                             cwd=ROOT, env=env, capture_output=True, text=True, timeout=30)
+    assert "Started parent process" in workers.stderr
+    assert "Application startup failed" in workers.stderr
+    assert "needs MongoDB" in workers.stderr
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from services.message_templates import MessageCatalog, MessageTemplate, TemplateError
+
+
+def test_render_with_conversion_and_spec():
+    template = MessageTemplate("greeting", "Hi {name!r}, EMI ₹{emi:,.2f}")
+    assert template.render(name="Asha", emi=12345.678) == "Hi 'Asha', EMI ₹12,345.68"
+
+
+@pytest.mark.parametrize("text", ["{name!x}", "{name!}", "{name!rr}", "{name.upper}", "{name:{width}}"])
+def test_invalid_placeholders_raise_template_error(text):
+    with pytest.raises(TemplateError):
+        MessageTemplate("broken", text)
+
+
+def test_broken_reload_keeps_previous_templates(tmp_path):
+    path = tmp_path / "en.json"
+    path.write_text(json.dumps({"greeting": ["Hi {name}"]}), encoding="utf-8")
+    catalog = MessageCatalog(directory=str(tmp_path), reload_interval=0)
+    assert catalog.reload()
+
+    path.write_text(json.dumps({"greeting": ["Hi {name!x}"]}), encoding="utf-8")
+    assert not catalog.reload(force=True)
+    assert catalog.get("greeting").render(name="Asha") == "Hi Asha"
@@ -0,0 +1,23 @@
+import pytest
+from pydantic import ValidationError
+
+from models.schemas import WhatIfRequest
+
+
+@pytest.mark.parametrize("field, value", [
+    ("tenures", [0]),
+    ("tenures", [100000]),
+    ("tenures", [12] * 61),
+    ("amounts", [-5]),
+    ("amounts", [1e300]),
+    ("amounts", [100000.0] * 201),
+    ("verified_salary", 0),
+])
+def test_what_if_request_rejects_out_of_range_input(field, value):
+    with pytest.raises(ValidationError):
+        WhatIfRequest(customer_id="CUST001", **{field: value})
+
+
+def test_what_if_request_accepts_defaults_and_bounds():
+    WhatIfRequest(customer_id="CUST001")
+    WhatIfRequest(customer_id="CUST001", amounts=[1, 1e9], tenures=[1, 360], verified_salary=50000)
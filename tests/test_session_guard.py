@@ -0,0 +1,54 @@
+import asyncio
+
+from pymongo.errors import PyMongoError
+
+from services.session_guard import SessionGuard
+
+
+class LeaseDownSharedState:
+    """Shared mode whose turn count still answers but whose leases fail"""
+    enabled = True
+
+    def session_turns(self, session_id):
+        return 1
+
+    def new_owner(self):
+        return "owner"
+
+    def try_acquire(self, session_id, owner):
+        raise PyMongoError("lease store unavailable")
+
+
+def test_lease_fallback_rebases_onto_the_turn_it_queued_behind():
+    guard = SessionGuard(shared=LeaseDownSharedState())
+    first_state = {"context": {"stage": "verified"}, "loan_intent": None, "customer_info": None}
+
+    async def scenario():
+        first_holds = asyncio.Event()
+        release_first = asyncio.Event()
+
+        async def first():
+            async with guard.turn("S1") as turn:
+                first_holds.set()
+                await release_first.wait()
+                turn.state = first_state
+            return turn.previous
+
+        async def second():
+            await first_holds.wait()
+            waiting = asyncio.ensure_future(_enter())
+            await asyncio.sleep(0.05)  # queued behind the first turn
+            release_first.set()
+            return await waiting
+
+        async def _enter():
+            async with guard.turn("S1") as turn:
+                return turn.previous
+
+        return await asyncio.gather(first(), second())
+
+    first_previous, second_previous = asyncio.run(scenario())
+
+    assert first_previous is None
+    assert second_previous == first_state
+    assert guard.active_sessions == 0
@@ -0,0 +1,16 @@
+from services.traffic_recorder import TrafficRecorder
+
+
+def test_recording_needs_a_redaction_key(tmp_path):
+    recorder = TrafficRecorder(sample_rate=1.0, path=str(tmp_path / "chat.jsonl"), redaction_key="")
+    assert not recorder.enabled
+    assert not recorder.should_record("S1")
+
+
+def test_phone_tokens_depend_on_the_key(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    first = TrafficRecorder(sample_rate=1.0, path=path, redaction_key="k1")
+    second = TrafficRecorder(sample_rate=1.0, path=path, redaction_key="k2")
+    assert first.enabled and first.should_record("S1")
+    assert first.redact("call 9876543210") != second.redact("call 9876543210")
+    assert "9876543210" not in first.redact("call 9876543210")
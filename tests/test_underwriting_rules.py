@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+
+from services.underwriting_rules import (
+    UNDERWRITING_RULES_PATH, CompiledRuleset, RuleError, UnderwritingRules, emi_array, load_ruleset,
+)
+
+with open(UNDERWRITING_RULES_PATH, encoding="utf-8") as f:
+    CONFIG = json.load(f)
+
+FACTS = dict(loan_amount=300000, tenure=24, credit_score=780, preapproved_limit=500000, salary=80000,
+             verified_salary=80000, salary_slip_verified=False, interest_rate=12.0, emi=14122.06)
+
+
+@pytest.fixture(scope="module")
+def ruleset():
+    return load_ruleset(UNDERWRITING_RULES_PATH)
+
+
+@pytest.mark.parametrize("changes, decision, rule", [
+    ({}, "approved", "rule_2_within_limit"),
+    ({"credit_score": 650}, "rejected", "rule_1_credit_score"),
+    ({"loan_amount": 1200000}, "rejected", "rule_4_over_2x_limit"),
+    ({"loan_amount": 800000}, "pending", "rule_3_salary_slip_required"),
+    ({"loan_amount": 800000, "salary_slip_verified": True}, "approved", "rule_3_emi_within_50pct_salary"),
+    ({"loan_amount": 800000, "salary_slip_verified": True, "emi": 45000}, "rejected", "rule_3_emi_over_50pct_salary"),
+])
+def test_evaluate_first_matching_rule_decides(ruleset, changes, decision, rule):
+    result = ruleset.evaluate(**dict(FACTS, **changes))
+    assert (result.decision, result.rule) == (decision, rule)
+    assert result.trace[-1] == rule
+    assert result.version == ruleset.version
+    assert result.reason  # rendered without missing names
+
+
+def test_evaluate_grid_matches_scalar_evaluate(ruleset):
+    amounts = np.array([100000, 500000, 800000, 1200000], dtype=float)[:, None]
+    tenures = np.array([12, 36, 60])[None, :]
+    emi = emi_array(amounts, FACTS["interest_rate"], tenures)
+    facts = dict(FACTS, loan_amount=amounts, tenure=tenures, emi=emi, salary_slip_verified=True)
+    grid = ruleset.evaluate_grid(**facts)
+    for i, amount in enumerate(amounts[:, 0]):
+        for j, tenure in enumerate(tenures[0]):
+            scalar = ruleset.evaluate(**dict(facts, loan_amount=amount, tenure=tenure, emi=emi[i, j]))
+            assert ruleset.rules[grid[i, j]].id == scalar.rule
+
+
+def _broken(edit):
+    config = json.loads(json.dumps(CONFIG))
+    edit(config)
+    return config
+
+
+BROKEN_EDITS = {
+    "keyword derived name": lambda c: c["derived"].update({"if": "salary * 2"}),
+    "rule not an object": lambda c: c["rules"].insert(0, "oops"),
+    "unknown reason placeholder": lambda c: c["rules"][0].update(reason="{nope}"),
+    "unknown name in when": lambda c: c["rules"][0].update(when="loan_amount > nope"),
+    "unsupported expression": lambda c: c["rules"][0].update(when="__import__('os')"),
+    "keyword parameter": lambda c: c["parameters"].update({"class": 1}),
+}
+
+
+@pytest.mark.parametrize("edit", BROKEN_EDITS.values(), ids=BROKEN_EDITS.keys())
+def test_broken_edits_raise_rule_error(edit):
+    with pytest.raises(RuleError):
+        CompiledRuleset(_broken(edit))
+
+
+@pytest.mark.parametrize("edit", BROKEN_EDITS.values(), ids=BROKEN_EDITS.keys())
+def test_broken_reload_keeps_previous_policy(tmp_path, edit):
+    path = tmp_path / "underwriting.json"
+    path.write_text(json.dumps(CONFIG), encoding="utf-8")
+    rules = UnderwritingRules(path=str(path), reload_interval=0)
+    live = rules.current()
+
+    path.write_text(json.dumps(_broken(edit)), encoding="utf-8")
+    assert not rules.reload(force=True)
+    assert rules.current() is live
+    assert live.evaluate(**FACTS).decision == "approved"